@@ -0,0 +1,58 @@
+import os
+import time
+import zipfile
+import argparse
+import tempfile
+import cbz_to_pdf
+from conversion_fixtures import comic_page
+
+def make_cbz(path, pages, size):
+    with zipfile.ZipFile(path, "w") as archive:
+        for i in range(pages):
+            archive.writestr(f"page_{i:03d}.jpg", comic_page(size, i))
+    return path
+
+def measure(cbz_path, directory, preset, **options):
+    """One conversion: wall time, pages per second and output size."""
+    pdf_path = os.path.join(directory, f"{preset}.pdf")
+    stats = {}
+    started = time.perf_counter()
+    cbz_to_pdf.convert_cbz_to_pdf(cbz_path, pdf_path, stats=stats, preset=preset, **options)
+    elapsed = time.perf_counter() - started
+    output_bytes = os.path.getsize(pdf_path)
+    os.remove(pdf_path)
+    return {'seconds': elapsed, 'pages_per_second': stats['pages'] / elapsed, 'output_bytes': output_bytes}
+
+def run_benchmark(pages=20, width=1600, height=2400, presets=None):
+    """
+    Converts the same synthetic book with each preset, once with compress
+    (quality 75) and once with a size limit that forces every page to be
+    resized. Returns {mode: {preset: result}}.
+    """
+    presets = presets or list(cbz_to_pdf.ENCODER_PRESETS)
+    with tempfile.TemporaryDirectory() as directory:
+        cbz_path = make_cbz(os.path.join(directory, "book.cbz"), pages, (width, height))
+        # Half the pages' size, so the max_size path resizes everything
+        limit_mb = max(1, os.path.getsize(cbz_path) // (2 * 1024 * 1024))
+        modes = {'compress': {'compress': True}, 'max_size': {'max_size_mb': limit_mb}}
+        return {mode: {preset: measure(cbz_path, directory, preset, **options) for preset in presets}
+                for mode, options in modes.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the encoder presets' speed and output size.")
+    parser.add_argument("--pages", type=int, default=20, help="Pages in the synthetic book")
+    parser.add_argument("--width", type=int, default=1600, help="Page width in pixels")
+    parser.add_argument("--height", type=int, default=2400, help="Page height in pixels")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.pages, args.width, args.height)
+    for mode, by_preset in results.items():
+        baseline = by_preset.get(cbz_to_pdf.DEFAULT_PRESET)
+        print(f"{mode}:")
+        for preset, result in by_preset.items():
+            relative = f" ({result['output_bytes'] / baseline['output_bytes']:.0%} of {cbz_to_pdf.DEFAULT_PRESET})" if baseline else ""
+            print(f"  {preset:<9} {result['seconds']:6.2f}s  {result['pages_per_second']:6.1f} pages/s  "
+                  f"{result['output_bytes'] / 1024 / 1024:7.2f} MB{relative}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+from unittest.mock import patch
+import email_sender
+import outbox
+from smtp_sink import SMTPSink
+
+SENDER = "sender@example.com"
+RECIPIENT = "kindle@kindle.com"
+
+def make_file(directory, name, size):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining:
+            block = min(remaining, 1024 * 1024)
+            f.write(os.urandom(block))
+            remaining -= block
+    return path
+
+def make_pool(sink, size=2):
+    return email_sender.DeliveryPool(sink.host, sink.port, SENDER, "password", size=size, use_tls=False)
+
+def measure_large_send(directory, size_mb, latency):
+    """One big attachment over a fresh connection: throughput and peak Python memory."""
+    path = make_file(directory, "large.pdf", size_mb * 1024 * 1024)
+    with SMTPSink(latency=latency, keep_messages=False) as sink:
+        session = email_sender.SMTPSession(sink.host, sink.port, SENDER, "password", use_tls=False)
+        started = time.perf_counter()
+        session.send_files([path], RECIPIENT)
+        elapsed = time.perf_counter() - started
+        wire_bytes = sink.stats['bytes']
+        # Tracing slows everything down, so memory gets a second, untimed send
+        tracemalloc.start()
+        session.send_files([path], RECIPIENT)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        session.close()
+    os.remove(path)
+    return {'seconds': elapsed, 'mb_per_second': wire_bytes / elapsed / 1024 / 1024,
+            'peak_memory_bytes': peak, 'wire_bytes': wire_bytes}
+
+def measure_many_sends(directory, count, size_kb, latency, pool_size):
+    """count small messages, one per file, across a pool: messages per second and connections used."""
+    paths = [make_file(directory, f"part_{i:03d}.pdf", size_kb * 1024) for i in range(count)]
+    with SMTPSink(latency=latency, keep_messages=False) as sink:
+        pool = make_pool(sink, pool_size)
+        started = time.perf_counter()
+        results = pool.send_parallel(paths, RECIPIENT)
+        elapsed = time.perf_counter() - started
+        pool.close()
+        connections = sink.stats['connections']
+    for path in paths:
+        os.remove(path)
+    return {'seconds': elapsed, 'messages_per_second': count / elapsed,
+            'failures': sum(not ok for ok, _ in results), 'connections': connections}
+
+def measure_retries(directory, failures, latency):
+    """End to end through the outbox: the first `failures` sends get a 421, then delivery succeeds."""
+    path = make_file(directory, "retry.pdf", 64 * 1024)
+    with SMTPSink(latency=latency, keep_messages=False) as sink:
+        sink.inject(".", 421, "Try again later", times=failures)
+        pool = make_pool(sink)
+        box = outbox.Outbox(os.path.join(directory, "outbox.sqlite3"),
+                            lambda: {'sender': SENDER, 'password': "password",
+                                     'smtp_server': sink.host, 'smtp_port': sink.port},
+                            base_delay=0.01)
+        with patch('email_sender.get_pool', return_value=pool):
+            box.start()
+            started = time.perf_counter()
+            item_id = box.enqueue(path, RECIPIENT)
+            item = box.get(item_id)
+            while item['status'] not in ('sent', 'failed'):
+                time.sleep(0.005)
+                item = box.get(item_id)
+            elapsed = time.perf_counter() - started
+            box.stop()
+        pool.close()
+    os.remove(path)
+    return {'seconds': elapsed, 'status': item['status'], 'attempts': item['attempts']}
+
+def run_benchmark(size_mb=20, count=50, size_kb=256, latency=0.0, pool_size=2, failures=3):
+    with tempfile.TemporaryDirectory() as directory:
+        return {
+            'large': measure_large_send(directory, size_mb, latency),
+            'many': measure_many_sends(directory, count, size_kb, latency, pool_size),
+            'retry': measure_retries(directory, failures, latency),
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures email delivery against a local SMTP sink.")
+    parser.add_argument("--size-mb", type=int, default=20, help="Size of the large attachment")
+    parser.add_argument("--count", type=int, default=50, help="Number of small messages")
+    parser.add_argument("--size-kb", type=int, default=256, help="Size of each small attachment")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the sink waits before each reply")
+    parser.add_argument("--pool-size", type=int, default=2, help="Connections in the delivery pool")
+    parser.add_argument("--failures", type=int, default=3, help="Transient failures before the retried send succeeds")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.size_mb, args.count, args.size_kb, args.latency, args.pool_size, args.failures)
+    large, many, retry = results['large'], results['many'], results['retry']
+    print(f"Large send ({args.size_mb} MB): {large['seconds']:.2f}s, {large['mb_per_second']:.1f} MB/s, "
+          f"peak memory {large['peak_memory_bytes'] / 1024:.0f} KB")
+    print(f"{args.count} x {args.size_kb} KB over {args.pool_size} connections: {many['seconds']:.2f}s, "
+          f"{many['messages_per_second']:.1f} msg/s, {many['connections']} connections, {many['failures']} failed")
+    print(f"Retry after {args.failures} failures: {retry['status']} in {retry['attempts']} attempts, "
+          f"{retry['seconds']:.2f}s")
+
+if __name__ == "__main__":
+    main()
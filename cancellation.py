@@ -0,0 +1,25 @@
+import threading
+
+class ConversionCancelled(Exception):
+    """Raised inside a conversion once its CancelToken has been cancelled."""
+
+class CancelToken:
+    """
+    Flag a frontend sets to stop a running conversion. The engine calls
+    check() between units of work (archive members, pages, output parts),
+    so a cancel takes effect within one page.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def check(self):
+        if self.event.is_set():
+            raise ConversionCancelled("Conversion cancelled.")
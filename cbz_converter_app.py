@@ -3,14 +3,29 @@ import os
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QLabel, QListWidget, QProgressBar, QMessageBox, 
                              QCheckBox, QSpinBox, QHBoxLayout, QPushButton, 
-                             QFileDialog, QComboBox, QListWidgetItem)
-from PySide6.QtGui import QIcon
-from PySide6.QtCore import QSettings, Qt
-
-from worker import ConversionThread
-from ui_components import DropZone, EmailConfigDialog
+                             QFileDialog, QComboBox, QListWidgetItem, QMenu)
+from PySide6.QtGui import QColor, QIcon, QKeySequence, QPixmap, QShortcut
+from PySide6.QtCore import QObject, QSize, Qt, Signal
+
+import outbox
+import thumbnails
+from scheduler import get_scheduler
+from worker import ConversionJob
+from ui_components import DropZone, EmailConfigDialog, QueueItemWidget
 from styles import COMIC_STYLE
-from utils import resource_path
+from utils import resource_path, load_email_config
+
+class OutboxNotifier(QObject):
+    # Outbox listeners run on its sender threads; this hops to the GUI thread
+    item_changed = Signal(dict)
+
+class ThumbnailNotifier(QObject):
+    # Same for thumbnails, which are made on the thumbnail service's pool
+    ready = Signal(str, bytes)
+
+# Item data role holding the archive path for the whole life of a queue item
+# (UserRole is cleared once an item starts converting)
+SOURCE_ROLE = Qt.UserRole + 1
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -36,6 +51,32 @@ class MainWindow(QMainWindow):
         self.compress_checkbox = QCheckBox("Compress Output (Simple)")
         options_layout.addWidget(self.compress_checkbox)
 
+        # Margin Trimming Option
+        self.auto_crop_checkbox = QCheckBox("Trim Page Margins")
+        self.auto_crop_checkbox.setToolTip("Cut off plain white or black borders around scanned pages")
+        options_layout.addWidget(self.auto_crop_checkbox)
+
+        # Fast Web View Option
+        self.linearize_checkbox = QCheckBox("Fast Web View")
+        self.linearize_checkbox.setToolTip("Linearize the PDF so readers show page 1 before the whole file has loaded")
+        options_layout.addWidget(self.linearize_checkbox)
+
+        # Compact Structure Option
+        self.compact_checkbox = QCheckBox("Compact PDF Structure")
+        self.compact_checkbox.setToolTip("Use compressed object streams: smaller and faster to open for long books")
+        options_layout.addWidget(self.compact_checkbox)
+
+        # Encoder Preset
+        preset_layout = QHBoxLayout()
+        preset_layout.addWidget(QLabel("Encoder:"))
+        self.preset_combo = QComboBox()
+        self.preset_combo.addItems(["Fast", "Balanced", "Smallest"])
+        self.preset_combo.setCurrentText("Balanced")
+        self.preset_combo.setToolTip("How re-encoded pages trade speed for file size")
+        preset_layout.addWidget(self.preset_combo)
+        preset_layout.addStretch()
+        options_layout.addLayout(preset_layout)
+
         # Max Size Option
         size_layout = QHBoxLayout()
         self.limit_size_checkbox = QCheckBox("Limit Output Size:")
@@ -58,6 +99,11 @@ class MainWindow(QMainWindow):
         size_layout.addWidget(self.limit_size_checkbox)
         size_layout.addWidget(self.size_preset_combo)
         size_layout.addWidget(self.size_spinbox)
+
+        self.jpeg2000_checkbox = QCheckBox("JPEG 2000")
+        self.jpeg2000_checkbox.setToolTip("Meet the size limit with JPEG 2000 pages at full resolution "
+                                          "instead of smaller JPEGs (better quality, slower)")
+        size_layout.addWidget(self.jpeg2000_checkbox)
         options_layout.addLayout(size_layout)
 
         # Kindle Option
@@ -128,6 +174,10 @@ class MainWindow(QMainWindow):
         layout.addWidget(list_label)
         
         self.list_widget = QListWidget()
+        self.list_widget.setIconSize(QSize(32, 48))
+        self.list_widget.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.list_widget.customContextMenuRequested.connect(self.show_queue_menu)
+        QShortcut(QKeySequence.Delete, self.list_widget, self.remove_selected)
         layout.addWidget(self.list_widget)
 
         # Action Buttons
@@ -137,6 +187,11 @@ class MainWindow(QMainWindow):
         self.start_btn.clicked.connect(self.start_conversion)
         action_layout.addWidget(self.start_btn)
 
+        self.stop_btn = QPushButton("Stop")
+        self.stop_btn.setToolTip("Cancel running conversions and leave the rest of the queue")
+        self.stop_btn.clicked.connect(self.stop_conversion)
+        action_layout.addWidget(self.stop_btn)
+
         # Clear Button
         self.clear_btn = QPushButton("Clear Completed")
         self.clear_btn.clicked.connect(self.clear_completed)
@@ -144,13 +199,25 @@ class MainWindow(QMainWindow):
         
         layout.addLayout(action_layout)
 
+        # Items convert concurrently on the process-wide pool, sharing it
+        # fairly with uploads to the embedded web server
+        self.scheduler = get_scheduler()
+        self.jobs = {}
         self.is_processing = False
-        self.current_thread = None
+        self.run_started = self.run_finished = self.run_errors = self.run_cancelled = 0
         self.output_dir = None
         
         self.server_thread = None
         self.server_url = None
 
+        # Starting the outbox here also resumes deliveries left from the last session
+        self.outbox_notifier = OutboxNotifier()
+        self.outbox_notifier.item_changed.connect(self.on_outbox_item)
+        outbox.get_outbox(load_email_config).add_listener(self.outbox_notifier.item_changed.emit)
+
+        self.thumbnail_notifier = ThumbnailNotifier()
+        self.thumbnail_notifier.ready.connect(self.on_thumbnail)
+
     def toggle_server(self):
         if self.server_thread and self.server_thread.is_running:
             # Stop Server
@@ -217,121 +284,212 @@ class MainWindow(QMainWindow):
         # Make editable
         item.setFlags(item.flags() | Qt.ItemIsEditable)
         item.setToolTip("Double-click to rename output file")
+        item.setData(SOURCE_ROLE, file_path)
         
         self.list_widget.addItem(item)
+        thumbnails.get_service().request(file_path, self.send_thumbnail)
+
+    def send_thumbnail(self, file_path, data):
+        if data:
+            self.thumbnail_notifier.ready.emit(file_path, data)
+
+    def on_thumbnail(self, file_path, data):
+        pixmap = QPixmap()
+        if not pixmap.loadFromData(data):
+            return
+        for i in range(self.list_widget.count()):
+            item = self.list_widget.item(i)
+            if item.data(SOURCE_ROLE) == file_path:
+                item.setIcon(QIcon(pixmap))
+                job = self.job_for_item(item)
+                if job is not None:
+                    self.jobs[job][1].set_thumbnail(pixmap)
 
     def start_conversion(self):
+        if self.kindle_checkbox.isChecked() and load_email_config() is None:
+            QMessageBox.warning(self, "Missing Configuration", "Please configure email settings to use Send to Kindle.")
+            return
+        if not self.is_processing and not self.jobs:
+            self.run_started = self.run_finished = self.run_errors = self.run_cancelled = 0
+        self.is_processing = True
         self.process_next()
 
+    def stop_conversion(self):
+        # Running jobs stop at their next page; nothing new is started
+        self.is_processing = False
+        for job in self.jobs:
+            job.cancel()
+
+    def job_for_item(self, item):
+        for job, (queue_item, _, _) in self.jobs.items():
+            if queue_item is item:
+                return job
+        return None
+
+    def show_queue_menu(self, position):
+        item = self.list_widget.itemAt(position)
+        if item is None:
+            return
+        menu = QMenu(self)
+        job = self.job_for_item(item)
+        if job is not None:
+            menu.addAction("Cancel", job.cancel)
+        else:
+            menu.addAction("Remove", lambda: self.list_widget.takeItem(self.list_widget.row(item)))
+        menu.exec(self.list_widget.mapToGlobal(position))
+
+    def remove_selected(self):
+        for item in self.list_widget.selectedItems():
+            job = self.job_for_item(item)
+            if job is not None:
+                # The row is replaced by a "Cancelled:" entry once the job stops
+                job.cancel()
+            else:
+                self.list_widget.takeItem(self.list_widget.row(item))
+
+    def closeEvent(self, event):
+        # Don't leave conversions running on pool threads after the window is gone.
+        # This is the app exiting, so web uploads and watched files queued or
+        # mid-conversion on the shared pool are stopped too.
+        self.stop_conversion()
+        self.scheduler.cancel_all()
+        self.scheduler.shutdown(wait=False)
+        super().closeEvent(event)
+
     def clear_completed(self):
-        # Remove items that start with "Done:" or "Error:"
+        # Remove items that start with "Done:", "Error:" or "Cancelled:"
         # Iterate backwards to avoid index issues
         for i in range(self.list_widget.count() - 1, -1, -1):
             item = self.list_widget.item(i)
-            if item.text().startswith("Done:") or item.text().startswith("Error:"):
+            if item.text().startswith(("Done:", "Error:", "Cancelled:")):
                 self.list_widget.takeItem(i)
 
-    def process_next(self):
-        if self.is_processing:
-            return
-
-        # Find next item to process
-        # We look for items that have UserRole data (file path) and are not marked done/error
-        # We can identify done/error items by their background color or disabled state, 
-        # OR we can simply look for items that are valid file paths in UserRole and haven't been modified to say "Done:"?
-        # A cleaner way: The "Done:" items are NEW items added by conversion_finished.
-        # The original Queue items are still there? NO, previously we didn't remove them.
-        # Let's iterate and find the first item that is editable (which means it's a queue item)
-        # AND likely needs processing.
-        # BETTER: We pop the item from the list? No, user might want to keep history.
-        # Let's use a custom role to mark status? Or just remove it from queue and add a log item?
-        # Removing from queue and adding log item is closest to previous behavior (queue list + log items).
-        
-        # Iterate to find first Queue Item
-        queue_item = None
-        queue_index = -1
-        
+    def next_queue_item(self):
+        # Queue items carry their file path in UserRole; started and finished items don't
         for i in range(self.list_widget.count()):
             item = self.list_widget.item(i)
-            # Check if it's a queue item (has file path in UserRole)
-            file_path = item.data(Qt.UserRole)
-            if file_path:
-                queue_item = item
-                queue_index = i
+            if item.data(Qt.UserRole):
+                return item
+        return None
+
+    def process_next(self):
+        """Starts queued items until every scheduler slot is busy."""
+        while self.is_processing and len(self.jobs) < self.scheduler.max_workers:
+            queue_item = self.next_queue_item()
+            if queue_item is None:
                 break
-        
-        if not queue_item:
+            self.start_item(queue_item)
+
+        if self.jobs:
+            self.update_overall_progress()
             return
 
-        self.is_processing = True
-        
-        # Get data
+        self.is_processing = False
+        if self.run_errors:
+            self.status_label.setText(f"Finished with {self.run_errors} error(s)")
+        elif self.run_cancelled:
+            self.status_label.setText(f"Stopped ({self.run_cancelled} cancelled)")
+        else:
+            self.status_label.setText("Ready")
+            self.progress_bar.setValue(100 if self.run_started else 0)
+
+    def start_item(self, queue_item):
         file_path = queue_item.data(Qt.UserRole)
-        # Output Name comes from the ITEM TEXT (which might have been edited)
-        output_name = queue_item.text()
-        # Remove extension if user typed it, to be safe, or just pass it as stem?
-        # Worker expects stem or full name? Worker uses `output_name if ... else input.stem`.
-        # So we should pass the name without extension if we want worker to add .pdf, 
-        # OR just pass what the user typed?
-        # If user typed "MyComic.pdf", stem is "MyComic".
-        # Let's strip extension just in case user got confused.
-        output_stem = os.path.splitext(output_name)[0]
-        
-        # Remove item from queue (visual + logical)
-        self.list_widget.takeItem(queue_index)
-        
-        self.status_label.setText(f"Processing: {output_stem}")
-        self.progress_bar.setValue(0)
+        # Output name comes from the item text, which the user may have edited.
+        # Strip the extension in case they typed one.
+        output_stem = os.path.splitext(queue_item.text())[0]
+        queue_item.setData(Qt.UserRole, None)
+        queue_item.setFlags(queue_item.flags() & ~Qt.ItemIsEditable)
+        self.run_started += 1
 
         compress = self.compress_checkbox.isChecked()
         max_size_mb = self.size_spinbox.value() if self.limit_size_checkbox.isChecked() else None
-        
         send_to_kindle = self.kindle_checkbox.isChecked()
-        email_config = None
-        if send_to_kindle:
-            settings = QSettings("Antigravity", "CBZtoPDF")
-            email_config = {
-                'sender': settings.value("sender_email", ""),
-                'password': settings.value("sender_password", ""),
-                'kindle_email': settings.value("kindle_email", ""),
-                'smtp_server': settings.value("smtp_server", "smtp.gmail.com"),
-                'smtp_port': settings.value("smtp_port", "587")
-            }
-            
-            if not email_config['sender'] or not email_config['password'] or not email_config['kindle_email']:
-                QMessageBox.warning(self, "Missing Configuration", "Please configure email settings to use Send to Kindle.")
-                self.is_processing = False
-                return
-
-        self.current_thread = ConversionThread(file_path, compress=compress, max_size_mb=max_size_mb, 
-                                             output_dir=self.output_dir, send_to_kindle=send_to_kindle, 
-                                             email_config=email_config, output_name=output_stem)
-        self.current_thread.progress_signal.connect(self.update_progress)
-        self.current_thread.finished_signal.connect(lambda success, msg: self.conversion_finished(success, msg))
-        self.current_thread.start()
+        preset = self.preset_combo.currentText().lower()
+        jpeg2000 = max_size_mb is not None and self.jpeg2000_checkbox.isChecked()
+        auto_crop = self.auto_crop_checkbox.isChecked()
+        linearize = self.linearize_checkbox.isChecked()
+        compact = self.compact_checkbox.isChecked()
+        email_config = load_email_config() if send_to_kindle else None
+        if send_to_kindle and email_config is None:
+            # Settings were cleared after Start
+            self.mark_finished(queue_item, False, "Please configure email settings to use Send to Kindle.")
+            return
+
+        # The queue item stays in place and becomes the job's progress row
+        queue_item.setText("")
+        row = QueueItemWidget(output_stem)
+        if not queue_item.icon().isNull():
+            row.set_thumbnail(queue_item.icon().pixmap(self.list_widget.iconSize()))
+        queue_item.setSizeHint(row.sizeHint())
+        self.list_widget.setItemWidget(queue_item, row)
+
+        job = ConversionJob(file_path, compress=compress, max_size_mb=max_size_mb,
+                            output_dir=self.output_dir, send_to_kindle=send_to_kindle,
+                            email_config=email_config, output_name=output_stem, preset=preset,
+                            jpeg2000=jpeg2000, auto_crop=auto_crop, linearize=linearize,
+                            compact=compact)
+        # Bound methods (not lambdas) so the slots run on the GUI thread
+        job.progress_signal.connect(self.update_progress)
+        job.finished_signal.connect(self.conversion_finished)
+        self.jobs[job] = (queue_item, row, 0)
+        self.scheduler.submit(job.run, client="desktop", cancel_token=job.cancel_token)
+
+    def on_outbox_item(self, item):
+        name = item['attachment_name'] or os.path.basename(item['file_path'])
+        if item['status'] == 'sent':
+            self.list_widget.addItem(f"Done: Sent {name} to Kindle")
+        elif item['status'] == 'failed':
+            self.list_widget.addItem(f"Error: Could not send {name} to Kindle: {item['last_error']}")
+        elif item['status'] == 'pending' and item['last_error']:
+            self.status_label.setText(f"Email for {name} failed, retrying (attempt {item['attempts']})")
 
     def update_progress(self, percentage, message):
-        self.progress_bar.setValue(percentage)
-        self.status_label.setText(message)
+        job = self.sender()
+        if job not in self.jobs:
+            return
+        queue_item, row, _ = self.jobs[job]
+        self.jobs[job] = (queue_item, row, percentage)
+        row.set_progress(percentage, message)
+        self.update_overall_progress()
+
+    def update_overall_progress(self):
+        if not self.run_started:
+            return
+        active = sum(percentage for _, _, percentage in self.jobs.values())
+        self.progress_bar.setValue((self.run_finished * 100 + active) // self.run_started)
+        self.status_label.setText(f"Converting {len(self.jobs)} at once "
+                                  f"({self.run_finished} of {self.run_started} done)")
 
     def conversion_finished(self, success, message):
-        self.is_processing = False
-        self.current_thread = None
-        
-        if success:
-            self.list_widget.addItem(f"Done: {message}")
-            self.status_label.setText("Ready")
-            self.progress_bar.setValue(100)
+        job = self.sender()
+        queue_item, row, _ = self.jobs.pop(job)
+        self.list_widget.removeItemWidget(queue_item)
+        queue_item.setSizeHint(QSize())
+        if not success and job.cancel_token.cancelled:
+            self.run_finished += 1
+            self.run_cancelled += 1
+            queue_item.setText(f"Cancelled: {row.name_label.text()}")
+            queue_item.setForeground(QColor("#888"))
         else:
-            self.list_widget.addItem(f"Error: {message}")
-            self.status_label.setText("Error occurred")
-            self.progress_bar.setValue(0)
-            QMessageBox.critical(self, "Conversion Error", message)
-        
+            self.mark_finished(queue_item, success, message)
         self.process_next()
 
+    def mark_finished(self, queue_item, success, message):
+        self.run_finished += 1
+        if success:
+            queue_item.setText(f"Done: {message}")
+        else:
+            # Marked on the item instead of a modal dialog, so the rest of the
+            # queue keeps converting while nobody is at the screen
+            self.run_errors += 1
+            queue_item.setText(f"Error: {message}")
+            queue_item.setToolTip(message)
+            queue_item.setForeground(QColor("#F87171"))
+
     def toggle_size_options(self, checked):
         self.size_preset_combo.setEnabled(checked)
+        self.jpeg2000_checkbox.setEnabled(checked)
         if checked and self.size_preset_combo.currentText() == "Custom":
             self.size_spinbox.setVisible(True)
             self.size_spinbox.setEnabled(True)
@@ -1,9 +1,16 @@
 import os
+import json
 import zipfile
+import hashlib
+import datetime
 import tempfile
 import math
-from typing import Optional, Callable, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Union, Dict
 from pathlib import Path
+from progress import ProgressThrottle
+from cancellation import CancelToken, ConversionCancelled
+from email_sender import MESSAGE_OVERHEAD, encoded_size
 
 # Safe imports for Android (Lazy loaded)
 # try:
@@ -17,10 +24,453 @@ def is_image(filename: str) -> bool:
     """Checks if a file represents an image based on extension."""
     return filename.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.gif'))
 
+# Allowance for PDF structure around the image data: per page (page, image and
+# xref entries) and per file (catalog, trailer)
+PAGE_OVERHEAD = 1024
+PDF_OVERHEAD = 4096
+
+# libjpeg's luminance quantization table at quality 50, in natural (row) order
+STANDARD_LUMINANCE_TABLE = (
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99,
+)
+
+def jpeg_quality(img) -> Optional[int]:
+    """Estimates the quality an opened JPEG was saved at, without decoding it.
+
+    Returns the libjpeg quality (1-100) whose scaled standard table is closest
+    to the image's luminance table, or None if it is not a JPEG. Encoders
+    with their own tables get the nearest equivalent.
+    """
+    tables = getattr(img, "quantization", None)
+    if img.format != "JPEG" or not tables or len(tables.get(0, ())) != 64:
+        return None
+    table = tables[0]
+    best_quality, best_error = None, None
+    for quality in range(1, 101):
+        scale = 5000 // quality if quality < 50 else 200 - quality * 2
+        error = sum(abs(min(255, max(1, (standard * scale + 50) // 100)) - actual)
+                    for standard, actual in zip(STANDARD_LUMINANCE_TABLE, table))
+        if best_error is None or error < best_error:
+            best_quality, best_error = quality, error
+    return best_quality
+
+# Typical JPEG size at a quality, relative to quality 75 (libjpeg, 4:2:0, optimized
+# Huffman tables; measured on scanned and drawn comic pages)
+RELATIVE_JPEG_SIZE = ((10, 0.30), (20, 0.42), (30, 0.54), (40, 0.61), (50, 0.69), (60, 0.78),
+                      (70, 0.92), (75, 1.00), (80, 1.14), (85, 1.30), (90, 1.60), (95, 2.20), (100, 4.00))
+# Re-encoding a JPEG costs a generation of loss; below this saving it is kept as it is
+MIN_REENCODE_GAIN = 0.10
+
+def relative_jpeg_size(quality: int) -> float:
+    """RELATIVE_JPEG_SIZE interpolated (and clamped) at quality."""
+    points = RELATIVE_JPEG_SIZE
+    if quality <= points[0][0]:
+        return points[0][1]
+    for (low, low_size), (high, high_size) in zip(points, points[1:]):
+        if quality <= high:
+            return low_size + (high_size - low_size) * (quality - low) / (high - low)
+    return points[-1][1]
+
+def reencode_gain(from_quality: int, to_quality: int) -> float:
+    """Expected fraction of its size a JPEG saved at from_quality loses when
+    re-encoded at to_quality (zero or less when it would not shrink)."""
+    return 1 - relative_jpeg_size(to_quality) / relative_jpeg_size(from_quality)
+
+# How pages are re-encoded, from quickest to smallest output. 'resample' names a
+# PIL.Image.Resampling filter; 'draft' lets JPEGs decode at a reduced scale
+# before resizing; 'optimize' computes Huffman tables per image; 'png_level' is
+# the zlib level of lossless pages. 'balanced' is the original Lanczos path.
+ENCODER_PRESETS = {
+    'fast': {'resample': 'BILINEAR', 'draft': True, 'optimize': False, 'progressive': False, 'png_level': 1},
+    'balanced': {'resample': 'LANCZOS', 'draft': False, 'optimize': True, 'progressive': False, 'png_level': 6},
+    'smallest': {'resample': 'LANCZOS', 'draft': False, 'optimize': True, 'progressive': True, 'png_level': 9},
+}
+# Chroma subsampling of every re-encoded JPEG (Pillow's 2 = 4:2:0). Not a preset
+# setting: 4:2:0 is both the quickest and the smallest, so no preset would differ.
+JPEG_SUBSAMPLING = 2
+DEFAULT_PRESET = 'balanced'
+
+def encoder_settings(preset: str) -> Dict:
+    """The settings of a named preset; raises ValueError for unknown names."""
+    try:
+        return ENCODER_PRESETS[preset]
+    except KeyError:
+        raise ValueError(f"Unknown encoder preset: {preset}") from None
+
+def jpeg_options(settings: Dict) -> Dict:
+    """Keyword arguments for Image.save(..., "JPEG") under a preset."""
+    return {'optimize': settings['optimize'], 'progressive': settings['progressive'],
+            'subsampling': JPEG_SUBSAMPLING}
+
+# What img2pdf embeds as it is; anything else is transcoded page by page first
+NATIVE_FORMATS = ('JPEG', 'PNG', 'GIF', 'TIFF', 'JPEG2000', 'BMP')
+NATIVE_MODES = ('1', 'L', 'RGB', 'CMYK', 'P')
+# 16-bit greyscale, which img2pdf embeds as it is from PNG only
+WIDE_GREY_MODES = ('I;16', 'I;16B', 'I;16L', 'I')
+
+def needs_normalizing(img) -> bool:
+    """True if img2pdf can't take an opened page as it is: alpha, animation, or an unusual mode or format."""
+    wide_png = img.format == 'PNG' and img.mode in WIDE_GREY_MODES
+    if img.format not in NATIVE_FORMATS or (img.mode not in NATIVE_MODES and not wide_png):
+        return True
+    if 'transparency' in img.info:
+        return True
+    # Every frame of an animated GIF would become a page of its own
+    return getattr(img, 'n_frames', 1) > 1
+
+def normalize_page(path: str, preset: str = DEFAULT_PRESET):
+    """Rewrites a page in place as its first frame, flattened onto white.
+
+    JPEG sources stay JPEG (quality 95); everything else becomes a lossless
+    PNG. The file keeps its name so page order is unchanged.
+    """
+    settings = encoder_settings(preset)
+    from PIL import Image
+
+    with Image.open(path) as img:
+        img.seek(0)
+        source_format = img.format
+        transparent = 'transparency' in img.info
+        if img.mode in WIDE_GREY_MODES:
+            # Converting straight to L or RGB clips 16-bit values to white; scale them down
+            img = img.convert('I').point(lambda v: v * (1 / 257)).convert('L')
+        if img.mode in ('RGBA', 'LA', 'PA') or transparent:
+            rgba = img.convert('RGBA')
+            page = Image.new('RGB', img.size, (255, 255, 255))
+            page.paste(rgba, mask=rgba.getchannel('A'))
+        elif img.mode in ('1', 'L'):
+            page = img.convert('L')
+        else:
+            page = img.convert('RGB')
+    if source_format in ('JPEG', 'MPO'):
+        page.save(path, "JPEG", quality=95, **jpeg_options(settings))
+    else:
+        page.save(path, "PNG", compress_level=settings['png_level'])
+
+def plan_parts(page_sizes, max_attachment_bytes: int, ratio: float = 1.0):
+    """Groups consecutive pages so each part, emailed as an attachment, fits in max_attachment_bytes.
+
+    page_sizes are the encoded image sizes; ratio scales the estimate when a
+    previous plan came out larger than predicted. Returns lists of page indexes.
+    """
+    # Inverse of encoded_size: 57 file bytes per 76-character base64 line and its CRLF
+    budget = (max_attachment_bytes - MESSAGE_OVERHEAD) * 57 // 78 - PDF_OVERHEAD
+    parts, current, current_size = [], [], 0
+    for index, size in enumerate(page_sizes):
+        cost = int((size + PAGE_OVERHEAD) * ratio)
+        if current and current_size + cost > budget:
+            parts.append(current)
+            current, current_size = [], 0
+        current.append(index)
+        current_size += cost
+    if current:
+        parts.append(current)
+    return parts
+
+# Smallest byte budget given to one JPEG 2000 page, however tight the limit
+MIN_PAGE_BUDGET = 4096
+# Allowance for the JP2 container boxes around a page's codestream
+JP2_HEADER_BYTES = 128
+
+def page_budgets(page_sizes, target_bytes: int):
+    """Splits target_bytes of PDF between pages in proportion to their current sizes."""
+    available = target_bytes - PDF_OVERHEAD - PAGE_OVERHEAD * len(page_sizes)
+    total = sum(page_sizes) or 1
+    return [max(MIN_PAGE_BUDGET, available * size // total) for size in page_sizes]
+
+def encode_jpeg2000(path: str, budget: int, box: Optional[tuple] = None):
+    """Rewrites a page in place as JPEG 2000 of at most about budget bytes.
+
+    OpenJPEG's rate control is given the compression ratio that budget
+    implies, so the size comes out right from a single encode. box crops
+    the page first.
+    """
+    from PIL import Image
+
+    with Image.open(path) as img:
+        img.seek(0)
+        page = img.crop(box) if box else img
+        page = page.convert('L' if img.mode in ('1', 'L') else 'RGB')
+    raw_bytes = page.width * page.height * len(page.getbands())
+    # Rate control sizes the codestream; the JP2 boxes around it come on top
+    ratio = raw_bytes / max(1, budget - JP2_HEADER_BYTES)
+    page.save(path, "JPEG2000", quality_mode="rates", quality_layers=[max(1.0, ratio)], irreversible=True)
+
+# Auto-crop: the border colour is the median of the page's outermost pixels
+# and must be near white or black. Pixels further than CROP_TOLERANCE from it
+# are content; a row or column needs CROP_MIN_FRACTION of them, so scan
+# specks don't count. Content keeps CROP_PADDING of the page around it, and
+# crops that would remove less than CROP_MIN_GAIN of the area are skipped.
+CROP_SAMPLE_SIZE = 256
+CROP_LIGHT = 200
+CROP_DARK = 55
+CROP_TOLERANCE = 48
+CROP_MIN_FRACTION = 0.005
+CROP_PADDING = 0.01
+CROP_MIN_GAIN = 0.02
+
+def content_box(img) -> Optional[tuple]:
+    """The (left, top, right, bottom) box inside an opened page's white or black margins.
+
+    Works on a greyscale copy at most CROP_SAMPLE_SIZE pixels across (JPEGs
+    are decoded straight at reduced scale), so it costs a few milliseconds.
+    Returns None when there is no margin worth trimming or the page is blank.
+    """
+    import numpy as np
+    from PIL import Image
+
+    width, height = img.size
+    img.draft('L', (CROP_SAMPLE_SIZE, CROP_SAMPLE_SIZE))
+    sample = img.convert('L')
+    sample.thumbnail((CROP_SAMPLE_SIZE, CROP_SAMPLE_SIZE), Image.Resampling.BOX)
+    pixels = np.asarray(sample, dtype=np.int16)
+
+    border = np.concatenate((pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]))
+    background = int(np.median(border))
+    if CROP_DARK < background < CROP_LIGHT:
+        return None
+    content = np.abs(pixels - background) > CROP_TOLERANCE
+    rows = np.flatnonzero(content.mean(axis=1) > CROP_MIN_FRACTION)
+    columns = np.flatnonzero(content.mean(axis=0) > CROP_MIN_FRACTION)
+    if not rows.size or not columns.size:
+        return None
+
+    scale_x, scale_y = width / sample.width, height / sample.height
+    pad_x, pad_y = width * CROP_PADDING, height * CROP_PADDING
+    box = (max(0, int(columns[0] * scale_x - pad_x)),
+           max(0, int(rows[0] * scale_y - pad_y)),
+           min(width, math.ceil((columns[-1] + 1) * scale_x + pad_x)),
+           min(height, math.ceil((rows[-1] + 1) * scale_y + pad_y)))
+    if (box[2] - box[0]) * (box[3] - box[1]) > width * height * (1 - CROP_MIN_GAIN):
+        return None
+    return box
+
+def crop_page(path: str, box: tuple, preset: str = DEFAULT_PRESET):
+    """Crops a page in place, keeping it JPEG (at its own quality) or lossless PNG."""
+    from PIL import Image
+
+    settings = encoder_settings(preset)
+    with Image.open(path) as img:
+        quality = jpeg_quality(img)
+        page = img.crop(box)
+    if quality is not None:
+        page.save(path, "JPEG", quality=quality, **jpeg_options(settings))
+    else:
+        page.save(path, "PNG", compress_level=settings['png_level'])
+
+# Difference hash side: HASH_SIZE**2 bits per page
+HASH_SIZE = 16
+# Bits two hashes may differ by and still count as the same page
+NEAR_DUPLICATE_DISTANCE = 12
+
+def perceptual_hash(img) -> int:
+    """Difference hash of an opened page: whether each pixel of a tiny greyscale
+    copy is brighter than its right-hand neighbour, packed into an int."""
+    from PIL import Image
+
+    img.draft('L', (HASH_SIZE * 4, HASH_SIZE * 4))
+    pixels = img.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX).tobytes()
+    bits = 0
+    for y in range(HASH_SIZE):
+        row = pixels[y * (HASH_SIZE + 1):(y + 1) * (HASH_SIZE + 1)]
+        for left, right in zip(row, row[1:]):
+            bits = bits << 1 | (left > right)
+    return bits
+
+def find_duplicates(paths, similar: bool = False) -> Dict[str, str]:
+    """Maps every page that repeats an earlier one to that earlier page.
+
+    Pages repeat when their bytes are identical or, if similar is set, when
+    they have the same dimensions and perceptual hashes no more than
+    NEAR_DUPLICATE_DISTANCE bits apart (e.g. the same banner saved twice).
+    """
+    from PIL import Image
+
+    duplicates = {}
+    by_digest = {}
+    fingerprints = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).digest()
+        if digest in by_digest:
+            duplicates[path] = by_digest[digest]
+            continue
+        by_digest[digest] = path
+        if not similar:
+            continue
+        try:
+            with Image.open(path) as img:
+                size = img.size
+                fingerprint = perceptual_hash(img)
+        except OSError:
+            continue
+        match = next((original for other_size, other, original in fingerprints
+                      if other_size == size and (other ^ fingerprint).bit_count() <= NEAR_DUPLICATE_DISTANCE), None)
+        if match:
+            duplicates[path] = match
+        else:
+            fingerprints.append((size, fingerprint, path))
+    return duplicates
+
+def share_repeated_images(pdf, page_files):
+    """Points pages of an open pikepdf.Pdf that were made from the same file at
+    the first such page's resource dictionary (and so its image XObjects); the
+    copies are dropped on save."""
+    # The Pillow fallback skips pages it cannot open
+    if len(pdf.pages) != len(page_files):
+        return
+    first_pages = {}
+    for page, path in zip(pdf.pages, page_files):
+        if path not in first_pages:
+            first_pages[path] = page
+            continue
+        original = first_pages[path].obj
+        if not original.Resources.is_indirect:
+            original.Resources = pdf.make_indirect(original.Resources)
+        page.obj.Resources = original.Resources
+
+def share_page_contents(pdf):
+    """Points pages with identical content streams at one of them. Both writers
+    draw a page as one image filling it, so pages of the same size share."""
+    import pikepdf
+
+    streams = {}
+    for page in pdf.pages:
+        contents = page.obj.get('/Contents')
+        if not isinstance(contents, pikepdf.Stream):
+            continue
+        key = contents.read_bytes()
+        if key in streams:
+            page.obj.Contents = streams[key]
+        else:
+            streams[key] = contents
+
+def document_id(input_path: str, options: Dict) -> bytes:
+    """The permanent half of a PDF's /ID: a hash of the input file and the
+    options it was converted with, so reconverting it names the same document."""
+    digest = hashlib.sha256()
+    with open(input_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    digest.update(json.dumps(options, sort_keys=True).encode())
+    return digest.digest()[:16]
+
+def archive_date(archive) -> datetime.datetime:
+    """The newest timestamp stored in an open ZipFile, used as the PDF's dates
+    instead of the time of conversion. DOS timestamps can be zeroed (month and
+    day 0) or have seconds up to 62; those entries are clamped or skipped, and
+    an archive without a usable one gives 1980-01-01."""
+    dates = []
+    for member in archive.infolist():
+        year, month, day, hour, minute, second = member.date_time
+        try:
+            dates.append(datetime.datetime(year, month, day, min(hour, 23), min(minute, 59), min(second, 59)))
+        except ValueError:
+            continue
+    return max(dates, default=datetime.datetime(1980, 1, 1))
+
+def finish_pdf(pdf_path: str, page_files, linearize: bool = False, compact: bool = False,
+               file_id: Optional[bytes] = None):
+    """Rewrites a written PDF in place with pikepdf: repeated pages share one
+    image, and with linearize the file is saved for fast web view (first page
+    and hint tables up front, so readers can show page 1 from a partial
+    download). A file that is already linearized stays linearized.
+
+    compact shares identical page content streams and packs every object that
+    is not a stream into compressed object streams, indexed by an xref stream
+    (PDF 1.5). The /ID is then derived from the content, so the same input
+    always gives the same bytes.
+
+    file_id, if given, becomes the first (permanent) half of the /ID and the
+    second half is derived from the content instead of the clock.
+    """
+    import pikepdf
+
+    with pikepdf.open(pdf_path, allow_overwriting_input=True) as pdf:
+        # img2pdf linearizes by itself when it writes through pikepdf
+        linearize = linearize or pdf.is_linearized
+        share_repeated_images(pdf, page_files)
+        options = {}
+        if compact:
+            share_page_contents(pdf)
+            options = {'object_stream_mode': pikepdf.ObjectStreamMode.generate,
+                       'compress_streams': True, 'deterministic_id': True}
+        if file_id:
+            pdf.trailer.ID = pikepdf.Array([pikepdf.String(file_id), pikepdf.String(file_id)])
+            options['deterministic_id'] = True
+        pdf.save(pdf_path, linearize=linearize, **options)
+
+def part_path(pdf_path: str, number: int, count: int) -> str:
+    stem, ext = os.path.splitext(pdf_path)
+    return f"{stem} (Part {number} of {count}){ext}"
+
 def convert_cbz_to_pdf(input_path: Union[str, Path], pdf_path: Union[str, Path], 
                        progress_callback: Optional[Callable[[int, str], None]] = None, 
-                       compress: bool = False, quality: int = 75, max_size_mb: Optional[int] = None) -> bool:
-    """Converts a CBZ file to a PDF file."""
+                       compress: bool = False, quality: int = 75, max_size_mb: Optional[int] = None,
+                       stats: Optional[Dict] = None, split_max_bytes: Optional[int] = None,
+                       verbose: bool = False, cancel_token: Optional[CancelToken] = None,
+                       preset: str = DEFAULT_PRESET, jpeg2000: bool = False,
+                       auto_crop: bool = False, near_duplicates: bool = False,
+                       linearize: bool = False, compact: bool = False,
+                       deterministic: bool = False) -> bool:
+    """Converts a CBZ file to a PDF file.
+
+    preset names one of ENCODER_PRESETS ('fast', 'balanced', 'smallest'),
+    which decides how pages that are re-encoded get resampled and encoded.
+
+    progress_callback is called at most progress.MAX_RATE times a second and
+    only with changed values; nothing is printed unless verbose is set.
+
+    If jpeg2000 is set and max_size_mb has to shrink the book, pages keep
+    their resolution and are re-encoded as JPEG 2000 (embedded as JPXDecode)
+    with a byte budget each, instead of being resized to JPEG. This needs
+    Pillow built with OpenJPEG; without it the JPEG path is used.
+
+    If auto_crop is set, uniform white or black margins are found on a small
+    greyscale copy of each page (NumPy) and cut off before the page is
+    resized or encoded. Without NumPy the pages are left as they are.
+
+    Pages whose bytes repeat an earlier page's (credit pages, banners, covers
+    in merged omnibuses) are processed once, and the PDF stores their image
+    once as an XObject shared by every page showing it (needs pikepdf). With
+    near_duplicates set, pages that only look the same (perceptual hash) are
+    treated as repeats too.
+
+    If linearize is set, the PDF (and any email parts) is rewritten for fast
+    web view, so a reader fetching it over HTTP ranges or a slow link can
+    render page 1 before the rest arrives (needs pikepdf).
+
+    If compact is set, the PDF is rewritten with compressed object streams, an
+    xref stream and page content streams shared between pages of the same
+    size, which cuts the per-page structure of long books (needs pikepdf).
+
+    If deterministic is set, the same archive converted with the same options
+    always gives the same bytes: the PDF dates are the archive's newest entry
+    date and the /ID is derived from the input hash and options (with pikepdf;
+    without it img2pdf's own writer omits the /ID).
+
+    If cancel_token is cancelled the conversion stops at the next page,
+    removes any PDFs it already wrote and raises ConversionCancelled.
+
+    If a stats dict is given it is filled with 'pages', 'input_bytes',
+    'output_bytes', 'passthrough_pages' (JPEGs compress left untouched
+    because they were already at, below or close to quality) and 'normalized_pages'
+    (pages transcoded because img2pdf could not embed them), 'cropped_pages'
+    and 'duplicate_pages' (pages sharing an earlier page's image) for
+    callers that record metrics.
+
+    If split_max_bytes is set and the book would not fit in an email
+    attachment of that size, it is also written as "<name> (Part i of n).pdf"
+    files that each fit, split by the page sizes already on disk. Their paths
+    are stored in stats['parts'] (empty when no split was needed).
+    """
     
     # Lazy Imports to prevent startup freeze
     try:
@@ -30,7 +480,13 @@ def convert_cbz_to_pdf(input_path: Union[str, Path], pdf_path: Union[str, Path],
         HAS_IMG2PDF = False
         
     try:
-        from PIL import Image
+        import pikepdf
+        HAS_PIKEPDF = True
+    except ImportError:
+        HAS_PIKEPDF = False
+
+    try:
+        from PIL import Image, features
     except ImportError:
         if progress_callback:
             progress_callback(0, "Error: Pillow library not found.")
@@ -38,19 +494,38 @@ def convert_cbz_to_pdf(input_path: Union[str, Path], pdf_path: Union[str, Path],
     
     input_path = str(input_path)
     pdf_path = str(pdf_path)
+    encoder = encoder_settings(preset)
+    resample = Image.Resampling[encoder['resample']]
 
-    def report_progress(percentage: int, message: str):
-        if progress_callback:
-            progress_callback(percentage, message)
-        print(f"[{percentage}%] {message}")
+    report_progress = ProgressThrottle(progress_callback, echo=verbose)
+
+    def log(message: str):
+        if verbose:
+            print(message)
+
+    def check_cancelled():
+        if cancel_token is not None:
+            cancel_token.check()
+
+    # Output files this run has written, removed again if it is cancelled
+    written = []
+    # Pages compress=True left as they were because they already met quality
+    passthrough_pages = 0
+    # Pages transcoded because img2pdf could not embed them as they were
+    normalized_pages = 0
+    # Page path -> content box, for pages auto_crop trims
+    crop_boxes = {}
+    # With deterministic: /ID of the book and the date written into it
+    file_id = None
+    source_date = None
 
     if not os.path.exists(input_path):
         report_progress(0, f"Error: File not found: {input_path}")
         return False
 
-    report_progress(5, f"Processing: {os.path.basename(input_path)}")
-
     try:
+        check_cancelled()
+        report_progress(5, f"Processing: {os.path.basename(input_path)}")
         with tempfile.TemporaryDirectory() as temp_dir:
             # Extract contents based on file extension
             report_progress(10, "Extracting archive...")
@@ -58,7 +533,12 @@ def convert_cbz_to_pdf(input_path: Union[str, Path], pdf_path: Union[str, Path],
             if input_path.lower().endswith('.cbz'):
                 try:
                     with zipfile.ZipFile(input_path, 'r') as zip_ref:
-                        zip_ref.extractall(temp_dir)
+                        if deterministic:
+                            source_date = archive_date(zip_ref)
+                        # Member by member so a cancel doesn't wait for the whole archive
+                        for member in zip_ref.infolist():
+                            check_cancelled()
+                            zip_ref.extract(member, temp_dir)
                 except zipfile.BadZipFile:
                     raise ValueError("Invalid CBZ file.")
             elif input_path.lower().endswith('.cbr'):
@@ -79,68 +559,200 @@ def convert_cbz_to_pdf(input_path: Union[str, Path], pdf_path: Union[str, Path],
 
             # Sort images
             image_files.sort()
+
+            # Repeated pages are processed once; page_files is the book in reading order
+            report_progress(32, "Looking for repeated pages...")
+            duplicates = find_duplicates(image_files, near_duplicates)
+            page_files = [duplicates.get(f, f) for f in image_files]
+            image_files = [f for f in image_files if f not in duplicates]
+
+            if auto_crop:
+                try:
+                    import numpy
+                except ImportError:
+                    log("NumPy not found. Skipping margin trimming...")
+                else:
+                    report_progress(35, "Finding page margins...")
+                    for img_path in image_files:
+                        check_cancelled()
+                        try:
+                            with Image.open(img_path) as img:
+                                box = content_box(img)
+                            if box:
+                                crop_boxes[img_path] = box
+                        except Exception as e:
+                            log(f"Warning: Could not measure margins of {img_path}: {e}")
+            # Crops still to apply; each stage below that re-encodes a page crops it on the way
+            pending_crops = dict(crop_boxes)
             
             # Check total size if max_size_mb is set
             if max_size_mb:
                 total_size = sum(os.path.getsize(f) for f in image_files)
                 target_size = max_size_mb * 1024 * 1024
                 
-                if total_size > target_size:
+                if total_size > target_size and jpeg2000 and not features.check_codec('jpg_2000'):
+                    log("Pillow has no JPEG 2000 support. Resizing instead...")
+                    jpeg2000 = False
+
+                if total_size > target_size and jpeg2000:
+                    report_progress(40, f"Encoding JPEG 2000 (Limit: {max_size_mb}MB)...")
+                    budgets = page_budgets([os.path.getsize(f) for f in image_files], target_size)
+
+                    def encode(img_path, budget):
+                        check_cancelled()
+                        try:
+                            encode_jpeg2000(img_path, budget, pending_crops.pop(img_path, None))
+                        except Exception as e:
+                            log(f"Warning: Could not encode {img_path}: {e}")
+
+                    # OpenJPEG is slow but releases the GIL, so pages encode side by side
+                    with ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1)) as pool:
+                        for i, _ in enumerate(pool.map(encode, image_files, budgets)):
+                            prog = 40 + int(((i + 1) / len(image_files)) * 40)
+                            report_progress(prog, f"Encoding {i+1}/{len(image_files)}...")
+
+                elif total_size > target_size:
                     report_progress(40, f"Resizing (Limit: {max_size_mb}MB)...")
                     ratio = target_size / total_size
                     scale_factor = math.sqrt(ratio) * 0.95
                     
                     for i, img_path in enumerate(image_files):
+                        check_cancelled()
                         try:
                             prog = 40 + int((i / len(image_files)) * 40)
-                            if i % 10 == 0:
-                                report_progress(prog, f"Resizing {i+1}/{len(image_files)}...")
+                            report_progress(prog, f"Resizing {i+1}/{len(image_files)}...")
                             
+                            box = pending_crops.pop(img_path, None)
                             with Image.open(img_path) as img:
-                                img = img.convert('RGB')
+                                if box:
+                                    img = img.crop(box)
                                 new_width = int(img.width * scale_factor)
                                 new_height = int(img.height * scale_factor)
-                                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                                img.save(img_path, "JPEG", quality=85, optimize=True)
+                                if encoder['draft'] and not box:
+                                    # JPEGs decode straight at 1/2, 1/4 or 1/8 scale
+                                    img.draft('RGB', (new_width, new_height))
+                                img = img.convert('RGB')
+                                img = img.resize((new_width, new_height), resample)
+                                img.save(img_path, "JPEG", quality=85, **jpeg_options(encoder))
                         except Exception as e:
-                            print(f"Warning: Could not resize {img_path}: {e}")
+                            log(f"Warning: Could not resize {img_path}: {e}")
                 else:
                     report_progress(40, "Size OK. Skipping resize.")
 
             elif compress:
                 report_progress(40, f"Compressing {len(image_files)} images...")
                 for i, img_path in enumerate(image_files):
+                    check_cancelled()
                     try:
                         prog = 40 + int((i / len(image_files)) * 40)
-                        if i % 10 == 0:
-                             report_progress(prog, f"Compressing {i+1}/{len(image_files)}...")
+                        report_progress(prog, f"Compressing {i+1}/{len(image_files)}...")
                         
                         with Image.open(img_path) as img:
+                            # Opening reads only the header. JPEGs whose estimated quality is at
+                            # or below the target, or so close that re-encoding would save less
+                            # than MIN_REENCODE_GAIN of their size, are embedded as they are
+                            # (img2pdf copies JPEG data byte for byte); re-encoding would
+                            # mostly add loss.
+                            estimated = jpeg_quality(img)
+                            box = pending_crops.pop(img_path, None)
+                            if (estimated is not None and img.mode in ('RGB', 'L') and box is None
+                                    and reencode_gain(estimated, quality) < MIN_REENCODE_GAIN):
+                                passthrough_pages += 1
+                                continue
+                            if box:
+                                img = img.crop(box)
                             img = img.convert('RGB')
-                            img.save(img_path, "JPEG", quality=quality, optimize=True)
+                            img.save(img_path, "JPEG", quality=quality, **jpeg_options(encoder))
                     except Exception as e:
-                        print(f"Warning: Could not compress {img_path}: {e}")
+                        log(f"Warning: Could not compress {img_path}: {e}")
 
-            report_progress(80, f"Found {len(image_files)} images. Generating PDF...")
-
-            # Convert to PDF
-            if HAS_IMG2PDF:
+            # Pages no stage re-encoded (lossless mode, or already under the size limit)
+            for img_path, box in pending_crops.items():
+                check_cancelled()
                 try:
-                    pdf_bytes = img2pdf.convert(image_files)
-                    report_progress(95, "Saving PDF...")
-                    with open(pdf_path, "wb") as f:
-                        f.write(pdf_bytes)
+                    crop_page(img_path, box, preset)
                 except Exception as e:
-                    # Fallback if img2pdf fails runtime
-                     print(f"img2pdf failed: {e}. Trying Pillow...")
-                     HAS_IMG2PDF = False # Force fallback logic
-            
-            if not HAS_IMG2PDF:
+                    log(f"Warning: Could not crop {img_path}: {e}")
+
+            if HAS_IMG2PDF:
+                # Only pages img2pdf can't embed are transcoded, so one odd page
+                # doesn't send the whole book down the Pillow fallback
+                unsupported = []
+                # Pages Pillow can't read would fail img2pdf for the whole book; they are left out
+                unreadable = set()
+                for img_path in image_files:
+                    check_cancelled()
+                    try:
+                        with Image.open(img_path) as img:
+                            if needs_normalizing(img):
+                                unsupported.append(img_path)
+                    except Exception as e:
+                        log(f"Warning: Could not read {img_path}: {e}. Skipping page...")
+                        unreadable.add(img_path)
+
+                if unsupported:
+                    report_progress(80, f"Converting {len(unsupported)} pages for PDF...")
+
+                    def normalize(img_path):
+                        check_cancelled()
+                        try:
+                            normalize_page(img_path, preset)
+                            return True
+                        except Exception as e:
+                            log(f"Warning: Could not convert {img_path}: {e}. Skipping page...")
+                            return False
+
+                    # Pillow releases the GIL while decoding and encoding
+                    with ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1)) as pool:
+                        for img_path, converted in zip(unsupported, pool.map(normalize, unsupported)):
+                            if not converted:
+                                unreadable.add(img_path)
+                normalized_pages = len(unsupported) - len(unreadable.intersection(unsupported))
+
+                if unreadable:
+                    image_files = [f for f in image_files if f not in unreadable]
+                    page_files = [f for f in page_files if f not in unreadable]
+                    if not image_files:
+                        raise ValueError("No readable images found in the archive.")
+
+            report_progress(80, f"Found {len(page_files)} images. Generating PDF...")
+
+            if deterministic:
+                file_id = document_id(input_path, {
+                    'compress': compress, 'quality': quality, 'max_size_mb': max_size_mb, 'preset': preset,
+                    'jpeg2000': jpeg2000, 'auto_crop': auto_crop, 'near_duplicates': near_duplicates,
+                    'linearize': linearize, 'compact': compact})
+
+            def finish(files, path, pdf_id):
+                if len(set(files)) == len(files) and not (linearize or compact or pdf_id):
+                    return
+                if not HAS_PIKEPDF:
+                    log("pikepdf not found. Writing the PDF as it is...")
+                    return
+                finish_pdf(path, files, linearize, compact, pdf_id)
+
+            def write_pdf(files, path, pdf_id):
+                nonlocal HAS_IMG2PDF
+                check_cancelled()
+                written.append(path)
+                if HAS_IMG2PDF:
+                    try:
+                        dates = {'creationdate': source_date, 'moddate': source_date} if source_date else {}
+                        pdf_bytes = img2pdf.convert(files, **dates)
+                        with open(path, "wb") as f:
+                            f.write(pdf_bytes)
+                        finish(files, path, pdf_id)
+                        return
+                    except Exception as e:
+                        # Fallback if img2pdf fails runtime
+                        log(f"img2pdf failed: {e}. Trying Pillow...")
+                        HAS_IMG2PDF = False # Force fallback logic
+
                 # Fallback to Pillow
-                report_progress(95, "Saving PDF (Internal Engine)...")
                 images = []
                 first_image = None
-                for img_path in image_files:
+                for img_path in files:
+                    check_cancelled()
                     try:
                         img = Image.open(img_path).convert("RGB")
                         if first_image is None:
@@ -148,16 +760,68 @@ def convert_cbz_to_pdf(input_path: Union[str, Path], pdf_path: Union[str, Path],
                         else:
                             images.append(img)
                     except Exception as e:
-                         print(f"Warning: Could not open {img_path}: {e}")
+                         log(f"Warning: Could not open {img_path}: {e}")
                 
                 if first_image:
-                    first_image.save(pdf_path, "PDF", resolution=100.0, save_all=True, append_images=images)
+                    info = {}
+                    if source_date:
+                        # Pillow would title the book after the output file name
+                        info = {'title': None, 'creationDate': source_date.timetuple(),
+                                'modDate': source_date.timetuple()}
+                    first_image.save(path, "PDF", resolution=100.0, save_all=True, append_images=images, **info)
+                    finish(files, path, pdf_id)
                 else:
                     raise ValueError("No valid images processing for PDF.")
-            
+
+            # Convert to PDF
+            report_progress(95, "Saving PDF..." if HAS_IMG2PDF else "Saving PDF (Internal Engine)...")
+            write_pdf(page_files, pdf_path, file_id)
+
+            parts = []
+            attachment_limit = (split_max_bytes or 0) - MESSAGE_OVERHEAD
+            if split_max_bytes and encoded_size(os.path.getsize(pdf_path)) > attachment_limit:
+                page_sizes = [os.path.getsize(f) for f in page_files]
+                ratio = 1.0
+                for attempt in range(3):
+                    groups = plan_parts(page_sizes, split_max_bytes, ratio)
+                    report_progress(97, f"Splitting into {len(groups)} parts for email...")
+                    parts = [part_path(pdf_path, i + 1, len(groups)) for i in range(len(groups))]
+                    for number, (path, group) in enumerate(zip(parts, groups), 1):
+                        part_id = file_id and hashlib.sha256(file_id + f"{number}/{len(groups)}".encode()).digest()[:16]
+                        write_pdf([page_files[i] for i in group], path, part_id)
+
+                    # A single page that is too big cannot be split further
+                    worst = max((encoded_size(os.path.getsize(path)) / attachment_limit
+                                 for path, group in zip(parts, groups) if len(group) > 1), default=0)
+                    if worst <= 1 or attempt == 2:
+                        break
+                    # Estimate was low (e.g. Pillow re-encoded the pages): re-plan with it corrected
+                    for path in parts:
+                        os.remove(path)
+                    ratio *= worst * 1.02
+
+            if stats is not None:
+                stats['pages'] = len(page_files)
+                stats['input_bytes'] = os.path.getsize(input_path)
+                stats['output_bytes'] = os.path.getsize(pdf_path)
+                stats['parts'] = parts
+                stats['passthrough_pages'] = passthrough_pages
+                stats['normalized_pages'] = normalized_pages
+                stats['cropped_pages'] = len(crop_boxes)
+                stats['duplicate_pages'] = len(duplicates)
+
             report_progress(100, f"Created: {os.path.basename(pdf_path)}")
             return True
 
+    except ConversionCancelled:
+        # Partial output would look like a finished book; the temp dir goes with the context manager
+        for path in written:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
     except Exception as e:
         # Re-raise nicely
         raise e
+    finally:
+        # Deliver any held update now, so none arrives after we return
+        report_progress.close()
@@ -0,0 +1,63 @@
+"""Helpers shared by the conversion tests: synthetic pages and a scratch CBZ/PDF pair."""
+import io
+import os
+import re
+import random
+import zipfile
+import tempfile
+import unittest
+from PIL import Image, ImageDraw, ImageFilter
+import cbz_to_pdf
+
+def noise(size, mode="RGB"):
+    """A page of random pixels in any Pillow mode."""
+    return Image.frombytes(mode, size, os.urandom(size[0] * size[1] * len(mode)))
+
+def comic_page(size, seed):
+    """A comic-like page: flat panels, line art and some grain, saved as a high-quality JPEG."""
+    rng = random.Random(seed)
+    page = Image.new("RGB", size, (250, 248, 240))
+    draw = ImageDraw.Draw(page)
+    width, height = size
+    for _ in range(6):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(width // 8, width // 2), y0 + rng.randrange(height // 8, height // 3)
+        fill = tuple(rng.randrange(256) for _ in range(3))
+        draw.rectangle((x0, y0, x1, y1), fill=fill, outline=(0, 0, 0), width=max(2, width // 200))
+    for _ in range(80):
+        points = [(rng.randrange(width), rng.randrange(height)) for _ in range(2)]
+        draw.line(points, fill=(20, 20, 20), width=rng.randrange(1, 4))
+    grain = Image.effect_noise(size, 24).convert("RGB")
+    page = Image.blend(page, grain, 0.08).filter(ImageFilter.SMOOTH)
+    return encode(page, "JPEG", quality=95)
+
+def encode(img, fmt, **params):
+    """An image saved to bytes, as it would sit in an archive."""
+    data = io.BytesIO()
+    img.save(data, fmt, **params)
+    return data.getvalue()
+
+def page_count(pdf):
+    return len(re.findall(rb"/Type\s*/Page\b", pdf))
+
+class ConversionTestCase(unittest.TestCase):
+    """Gives each test a temporary directory with self.cbz and self.pdf paths in it."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.cbz = os.path.join(self.temp_dir.name, "book.cbz")
+        self.pdf = os.path.join(self.temp_dir.name, "book.pdf")
+
+    def make_cbz(self, pages):
+        """Writes self.cbz from (member name or ZipInfo, bytes) pairs."""
+        with zipfile.ZipFile(self.cbz, "w") as archive:
+            for name, data in pages:
+                archive.writestr(name, data)
+
+    def convert(self, **options):
+        """Converts self.cbz to self.pdf; returns the PDF's bytes and the stats dict."""
+        stats = {}
+        self.assertTrue(cbz_to_pdf.convert_cbz_to_pdf(self.cbz, self.pdf, stats=stats, **options))
+        with open(self.pdf, "rb") as f:
+            return f.read(), stats
@@ -1,42 +1,333 @@
 import smtplib
 import os
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email.mime.text import MIMEText
-from email import encoders
+import time
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from email.policy import SMTP as SMTP_POLICY
+from email.utils import make_msgid
+
+# Read attachments in multiples of 57 bytes: each 57 encodes to exactly one 76-char line
+CHUNK_SIZE = 57 * 1024
+# Bytes gathered before each socket write
+SEND_BUFFER = 64 * 1024
+
+# Largest message Gmail accepts, and the largest Send to Kindle accepts from anyone
+GMAIL_LIMIT = 25 * 1024 * 1024
+KINDLE_LIMIT = 50 * 1024 * 1024
+
+# Allowance for email headers and the text part around an attachment
+MESSAGE_OVERHEAD = 16 * 1024
+
+# SMTP connections kept open per account (and outbox threads sending over them)
+POOL_SIZE = 2
+
+def attachment_limit(smtp_server):
+    """Largest message (after encoding) worth sending through smtp_server to a Kindle."""
+    return GMAIL_LIMIT if "gmail" in smtp_server.lower() else KINDLE_LIMIT
+
+def encoded_size(file_size):
+    """Exact size of a file once base64-encoded into a message (76-char lines + CRLF)."""
+    b64_size = (file_size + 2) // 3 * 4
+    return b64_size + 2 * ((b64_size + 75) // 76)
+
+def header_block(headers):
+    """Folds (name, value) pairs into an RFC 5322 header block, encoding non-ASCII values."""
+    msg = EmailMessage(policy=SMTP_POLICY)
+    for name, value in headers:
+        if isinstance(value, tuple):
+            msg.add_header(name, value[0], **value[1])
+        else:
+            msg[name] = value
+    return b"".join(SMTP_POLICY.fold_binary(name, value) for name, value in msg.items()) + b"\r\n"
+
+class MessageStream:
+    """
+    A multipart message with file attachments, produced as a sequence of byte
+    chunks. Attachments are base64-encoded CHUNK_SIZE bytes at a time, so
+    memory use does not depend on attachment size. `size` is the exact
+    length of the output, known before anything is read.
+    """
+
+    def __init__(self, file_paths, sender_email, recipient_email, attachment_names=None):
+        if attachment_names is None:
+            attachment_names = [None] * len(file_paths)
+        self.file_paths = list(file_paths)
+        filenames = [name if name else os.path.basename(path) for path, name in zip(file_paths, attachment_names)]
+        boundary = "===============" + make_msgid().strip("<>").replace("@", ".") + "=="
+
+        self.head = header_block([
+            ('From', sender_email),
+            ('To', recipient_email),
+            ('Subject', f"Convert: {', '.join(filenames)}"), # "Convert" subject is often required for Kindle
+            ('MIME-Version', '1.0'),
+            ('Content-Type', ('multipart/mixed', {'boundary': boundary})),
+        ])
+        body = "Please find the converted PDF attached." if len(filenames) == 1 else "Please find the converted PDFs attached."
+        self.head += (f"--{boundary}\r\n".encode() +
+                      header_block([('Content-Type', 'text/plain; charset="us-ascii"'),
+                                    ('Content-Transfer-Encoding', '7bit')]) +
+                      body.encode() + b"\r\n")
+        self.part_heads = [
+            f"--{boundary}\r\n".encode() + header_block([
+                ('Content-Type', 'application/octet-stream'),
+                ('Content-Transfer-Encoding', 'base64'),
+                ('Content-Disposition', ('attachment', {'filename': filename})),
+            ])
+            for filename in filenames
+        ]
+        self.tail = f"--{boundary}--\r\n".encode()
+
+        self.size = len(self.head) + len(self.tail) + sum(
+            len(part_head) + encoded_size(os.path.getsize(path))
+            for part_head, path in zip(self.part_heads, self.file_paths))
+
+    def chunks(self):
+        yield self.head
+        for part_head, path in zip(self.part_heads, self.file_paths):
+            yield part_head
+            with open(path, "rb") as attachment:
+                for data in iter(lambda: attachment.read(CHUNK_SIZE), b""):
+                    yield base64.encodebytes(data).replace(b"\n", b"\r\n")
+        yield self.tail
+
+    def as_bytes(self):
+        return b"".join(self.chunks())
+
+def stream_message(server, sender_email, recipient_email, message):
+    """
+    Sends a MessageStream over an open smtplib.SMTP connection, writing the
+    DATA phase chunk by chunk instead of building the message in memory.
+    """
+    options = []
+    if server.does_esmtp and server.has_extn('size'):
+        limit = server.esmtp_features['size'].strip()
+        if limit.isdigit() and 0 < int(limit) < message.size:
+            raise smtplib.SMTPDataError(552, f"Message of {message.size} bytes exceeds server limit of {limit} bytes")
+        options.append(f"SIZE={message.size}")
+
+    code, resp = server.mail(sender_email, options)
+    if code != 250:
+        server.rset()
+        raise smtplib.SMTPSenderRefused(code, resp, sender_email)
+    code, resp = server.rcpt(recipient_email)
+    if code not in (250, 251):
+        server.rset()
+        raise smtplib.SMTPRecipientsRefused({recipient_email: (code, resp)})
+    server.putcmd("data")
+    code, resp = server.getreply()
+    if code != 354:
+        server.rset()
+        raise smtplib.SMTPDataError(code, resp)
+
+    # Every line we generate is a header, fixed text or base64, so none starts
+    # with "." and no dot-stuffing is needed
+    buffered = []
+    buffered_size = 0
+    for chunk in message.chunks():
+        buffered.append(chunk)
+        buffered_size += len(chunk)
+        if buffered_size >= SEND_BUFFER:
+            server.send(b"".join(buffered))
+            buffered, buffered_size = [], 0
+    buffered.append(b".\r\n")
+    server.send(b"".join(buffered))
+
+    code, resp = server.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, resp)
+
+class SMTPSession:
+    """
+    One authenticated SMTP connection, reused for many sends.
+
+    The connection is opened on first use, replaced when it has been idle
+    longer than idle_timeout (servers drop idle clients), and re-opened once
+    if the server hung up between sends. use_tls=False skips STARTTLS, for
+    local test servers only.
+    """
+
+    def __init__(self, smtp_server, smtp_port, sender_email, sender_password, idle_timeout=60, use_tls=True):
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.sender_email = sender_email
+        self.sender_password = sender_password
+        self.idle_timeout = idle_timeout
+        self.use_tls = use_tls
+        self.server = None
+        self.last_used = 0.0
+
+    def connect(self):
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+        if self.use_tls:
+            server.starttls()
+        server.login(self.sender_email, self.sender_password)
+        self.server = server
+
+    def close(self):
+        if self.server:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.server = None
+
+    def is_expired(self):
+        return self.server is not None and time.monotonic() - self.last_used > self.idle_timeout
+
+    def send_files(self, file_paths, recipient_email, attachment_names=None):
+        message = MessageStream(file_paths, self.sender_email, recipient_email, attachment_names)
+        if self.is_expired():
+            self.close()
+        if self.server is None:
+            self.connect()
+        try:
+            stream_message(self.server, self.sender_email, recipient_email, message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # Stale connection: reconnect and send again from the start of the files
+            self.server = None
+            self.connect()
+            stream_message(self.server, self.sender_email, recipient_email, message)
+        self.last_used = time.monotonic()
+
+class DeliveryPool:
+    """
+    Up to `size` SMTPSessions for one account, shared by every sender thread.
+
+    Sessions stay logged in between sends so a queue of volumes pays for one
+    TLS handshake and login per connection instead of per file.
+    """
+
+    def __init__(self, smtp_server, smtp_port, sender_email, sender_password, size=POOL_SIZE, idle_timeout=60, use_tls=True):
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.sender_email = sender_email
+        self.sender_password = sender_password
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.use_tls = use_tls
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.idle = []
+
+    def acquire(self):
+        self.slots.acquire()
+        with self.lock:
+            while self.idle:
+                session = self.idle.pop()
+                if not session.is_expired():
+                    return session
+                session.close()
+        return SMTPSession(self.smtp_server, self.smtp_port, self.sender_email, self.sender_password,
+                           self.idle_timeout, self.use_tls)
+
+    def release(self, session):
+        with self.lock:
+            if session.server is not None:
+                self.idle.append(session)
+        self.slots.release()
+
+    def send(self, file_path, recipient_email, attachment_name=None):
+        """Sends one file. Returns (success, message) like send_email."""
+        return self.send_files([file_path], recipient_email, [attachment_name])
+
+    def deliver(self, file_paths, recipient_email, attachment_names=None):
+        """Sends several files as attachments of one message, raising on failure."""
+        session = self.acquire()
+        try:
+            session.send_files(file_paths, recipient_email, attachment_names)
+        except Exception:
+            # Don't hand a connection in an unknown state to the next sender
+            session.close()
+            raise
+        finally:
+            self.release(session)
+
+    def send_files(self, file_paths, recipient_email, attachment_names=None):
+        """Sends several files as attachments of one message. Returns (success, message)."""
+        try:
+            self.deliver(file_paths, recipient_email, attachment_names)
+            return True, "Email sent successfully"
+        except Exception as e:
+            return False, str(e)
+
+    def send_parallel(self, file_paths, recipient_email, attachment_names=None):
+        """
+        Sends each file as its own message, up to `size` at a time over the pool.
+        Returns one (success, message) per file, in order.
+        """
+        if attachment_names is None:
+            attachment_names = [None] * len(file_paths)
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(lambda args: self.send(args[0], recipient_email, args[1]),
+                                     zip(file_paths, attachment_names)))
+
+    def send_batch(self, file_paths, recipient_email, attachment_names=None, max_message_bytes=25 * 1024 * 1024):
+        """
+        Sends files packed into as few messages as fit under max_message_bytes.
+        Returns one (success, message) per file, in order.
+        """
+        if attachment_names is None:
+            attachment_names = [None] * len(file_paths)
+
+        budget = max_message_bytes - MESSAGE_OVERHEAD
+        groups = []
+        current, current_size = [], 0
+        for index, path in enumerate(file_paths):
+            size = encoded_size(os.path.getsize(path))
+            if current and current_size + size > budget:
+                groups.append(current)
+                current, current_size = [], 0
+            current.append(index)
+            current_size += size
+        if current:
+            groups.append(current)
+
+        results = [None] * len(file_paths)
+        for group in groups:
+            result = self.send_files([file_paths[i] for i in group], recipient_email,
+                                     [attachment_names[i] for i in group])
+            for i in group:
+                results[i] = result
+        return results
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for session in idle:
+            session.close()
+
+pools = {}
+pools_lock = threading.Lock()
+
+def get_pool(sender_email, sender_password, smtp_server="smtp.gmail.com", smtp_port=587):
+    """Returns the process-wide DeliveryPool for an account, creating it on first use."""
+    key = (smtp_server, int(smtp_port), sender_email, sender_password)
+    with pools_lock:
+        pool = pools.get(key)
+        if pool is None:
+            pool = pools[key] = DeliveryPool(smtp_server, int(smtp_port), sender_email, sender_password)
+        return pool
+
+def is_permanent_failure(error):
+    """True for errors that retrying will not fix: 5xx replies and bad credentials."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values()) if error.recipients else True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return isinstance(error, (smtplib.SMTPNotSupportedError, FileNotFoundError))
 
 def send_email(file_path, sender_email, sender_password, recipient_email, smtp_server="smtp.gmail.com", smtp_port=587, attachment_name=None):
     """
     Sends an email with the specified file as an attachment.
+    Opens and closes its own connection; use get_pool() for repeated sends.
     """
-    msg = MIMEMultipart()
-    msg['From'] = sender_email
-    msg['To'] = recipient_email
-    msg['Subject'] = f"Convert: {attachment_name if attachment_name else os.path.basename(file_path)}" # "Convert" subject is often required for Kindle
-    
-    body = "Please find the converted PDF attached."
-    msg.attach(MIMEText(body, 'plain'))
-    
-    filename = attachment_name if attachment_name else os.path.basename(file_path)
-    
+    session = SMTPSession(smtp_server, smtp_port, sender_email, sender_password)
     try:
-        with open(file_path, "rb") as attachment:
-            part = MIMEBase('application', 'octet-stream')
-            part.set_payload(attachment.read())
-            
-        encoders.encode_base64(part)
-        part.add_header(
-            "Content-Disposition",
-            f"attachment; filename= {filename}",
-        )
-        msg.attach(part)
-        
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        text = msg.as_string()
-        server.sendmail(sender_email, recipient_email, text)
-        server.quit()
+        session.send_files([file_path], recipient_email, [attachment_name])
         return True, "Email sent successfully"
     except Exception as e:
         return False, str(e)
+    finally:
+        session.close()
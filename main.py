@@ -66,6 +66,7 @@ def main(page):
         selected_file = ft.Ref[str]()
         status_txt = ft.Text("Ready.", color="green", size=16)
         progress_bar = ft.ProgressBar(width=300, visible=False)
+        cancel_token = ft.Ref()
         
         def on_progress(p, msg):
             progress_bar.value = p/100
@@ -81,8 +82,13 @@ def main(page):
             src = selected_file.current
             dst = src.replace(".cbz", ".pdf")
             
+            from cancellation import CancelToken, ConversionCancelled
+            token = CancelToken()
+            cancel_token.current = token
+
             status_txt.value = "Starting..."
             progress_bar.visible = True
+            cancel_btn.visible = True
             page.update()
             
             # Run conversion in thread to avoid freezing UI *during* conversion
@@ -90,15 +96,23 @@ def main(page):
             import threading
             def worker():
                 try:
-                    conversion_engine(src, dst, progress_callback=on_progress)
+                    conversion_engine(src, dst, progress_callback=on_progress, cancel_token=token)
                     status_txt.value = "Done!"
-                    page.update()
+                except ConversionCancelled:
+                    status_txt.value = "Cancelled."
                 except Exception as e:
                     status_txt.value = f"Error: {e}"
-                    page.update()
+                cancel_btn.visible = False
+                page.update()
             
             threading.Thread(target=worker).start()
 
+        def cancel_convert(e):
+            if cancel_token.current:
+                cancel_token.current.cancel()
+                status_txt.value = "Cancelling..."
+                page.update()
+
         def on_pick(e):
             if e.files:
                 path = e.files[0].path
@@ -106,6 +120,8 @@ def main(page):
                 status_txt.value = f"Selected: {path}"
                 page.update()
 
+        cancel_btn = ft.ElevatedButton("Cancel", icon=ft.icons.CANCEL, on_click=cancel_convert, visible=False)
+
         picker = ft.FilePicker()
         picker.on_result = on_pick
         page.overlay.append(picker)
@@ -114,6 +130,7 @@ def main(page):
             ft.Column([
                 ft.ElevatedButton("Select CBZ File", icon=ft.icons.FOLDER, on_click=lambda _: picker.pick_files(allow_multiple=False, allowed_extensions=["cbz"])),
                 ft.ElevatedButton("Convert to PDF", icon=ft.icons.PICTURE_AS_PDF, on_click=run_convert),
+                cancel_btn,
                 progress_bar,
                 status_txt
             ])
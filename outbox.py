@@ -0,0 +1,209 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+import email_sender
+import metrics
+
+EMAIL_SECONDS = metrics.histogram('cbz_email_send_seconds', 'Time spent sending one email.')
+EMAIL_SENDS = metrics.counter('cbz_email_sends_total', 'Kindle email attempts by result.', ('result',))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_path TEXT NOT NULL,
+    attachment_name TEXT,
+    recipient TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+)
+"""
+
+def default_path():
+    return os.path.join(os.path.expanduser("~"), ".cbztopdf", "outbox.sqlite3")
+
+class Outbox:
+    """
+    Persistent queue of Kindle emails with background sender threads.
+
+    Items survive restarts in a SQLite file. A failed send is retried with
+    exponential backoff (base_delay, doubling up to max_delay) until it
+    succeeds, fails permanently (5xx, bad credentials) or runs out of
+    max_attempts. Item status moves pending -> sending -> sent | failed.
+
+    SMTP credentials are not stored: config_provider() is called before each
+    send and returns the email config dict ('sender', 'password',
+    'smtp_server', 'smtp_port'), or None if email is not set up.
+    """
+
+    def __init__(self, db_path, config_provider, workers=1, max_attempts=6, base_delay=30, max_delay=3600):
+        self.db_path = db_path
+        self.config_provider = config_provider
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.stopping = False
+        self.threads = []
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self.connect() as db:
+            db.execute(SCHEMA)
+            # Anything caught mid-send by a crash or shutdown goes out again
+            db.execute("UPDATE outbox SET status = 'pending' WHERE status = 'sending'")
+
+    @contextmanager
+    def connect(self):
+        """One transaction on a short-lived connection, so any thread can use it."""
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            self.stopping = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self.run, name=f"outbox-{i}", daemon=True)
+                self.threads.append(thread)
+                thread.start()
+
+    def stop(self, timeout=None):
+        with self.wakeup:
+            self.stopping = True
+            self.wakeup.notify_all()
+            threads, self.threads = self.threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def add_listener(self, callback):
+        """callback(item) runs on a sender thread whenever an item changes status."""
+        self.listeners.append(callback)
+
+    def enqueue(self, file_path, recipient, attachment_name=None):
+        """Adds one file to send. Returns the item id."""
+        now = time.time()
+        with self.wakeup:
+            with self.connect() as db:
+                cursor = db.execute(
+                    "INSERT INTO outbox (file_path, attachment_name, recipient, created, updated) VALUES (?, ?, ?, ?, ?)",
+                    (file_path, attachment_name, recipient, now, now))
+                item_id = cursor.lastrowid
+            self.wakeup.notify()
+        return item_id
+
+    def get(self, item_id):
+        """Returns the item as a dict, or None."""
+        with self.connect() as db:
+            row = db.execute("SELECT * FROM outbox WHERE id = ?", (item_id,)).fetchone()
+        return dict(row) if row else None
+
+    def items(self, status=None):
+        with self.connect() as db:
+            if status:
+                rows = db.execute("SELECT * FROM outbox WHERE status = ? ORDER BY id", (status,)).fetchall()
+            else:
+                rows = db.execute("SELECT * FROM outbox ORDER BY id").fetchall()
+        return [dict(row) for row in rows]
+
+    def retry(self, item_id):
+        """Puts a failed item back in the queue."""
+        with self.wakeup:
+            with self.connect() as db:
+                db.execute("UPDATE outbox SET status = 'pending', attempts = 0, next_attempt = 0, updated = ? "
+                           "WHERE id = ? AND status = 'failed'", (time.time(), item_id))
+            self.wakeup.notify()
+
+    def claim(self):
+        """Marks the next due item as sending and returns it, or returns the seconds until one is due."""
+        now = time.time()
+        with self.connect() as db:
+            row = db.execute("SELECT * FROM outbox WHERE status = 'pending' ORDER BY next_attempt, id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            if row['next_attempt'] > now:
+                return row['next_attempt'] - now
+            db.execute("UPDATE outbox SET status = 'sending', updated = ? WHERE id = ?", (now, row['id']))
+        item = dict(row)
+        item['status'] = 'sending'
+        return item
+
+    def run(self):
+        while True:
+            with self.wakeup:
+                while True:
+                    if self.stopping:
+                        return
+                    claimed = self.claim()
+                    if isinstance(claimed, dict):
+                        break
+                    # Sleep until the next retry is due or something is enqueued
+                    self.wakeup.wait(claimed)
+            self.notify(claimed)
+            self.send(claimed)
+
+    def send(self, item):
+        error = None
+        config = self.config_provider()
+        if config is None:
+            error = "Email settings missing."
+            permanent = False
+        else:
+            started = time.monotonic()
+            try:
+                pool = email_sender.get_pool(config['sender'], config['password'],
+                                             config['smtp_server'], int(config['smtp_port']))
+                pool.deliver([item['file_path']], item['recipient'], [item['attachment_name']])
+            except Exception as e:
+                error = str(e)
+                permanent = email_sender.is_permanent_failure(e)
+            EMAIL_SECONDS.observe(time.monotonic() - started)
+            EMAIL_SENDS.inc(result='sent' if error is None else 'failed')
+
+        attempts = item['attempts'] + 1
+        now = time.time()
+        if error is None:
+            status, next_attempt = 'sent', 0
+        elif permanent or attempts >= self.max_attempts:
+            status, next_attempt = 'failed', 0
+        else:
+            status = 'pending'
+            next_attempt = now + min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+
+        with self.connect() as db:
+            db.execute("UPDATE outbox SET status = ?, attempts = ?, next_attempt = ?, last_error = ?, updated = ? "
+                       "WHERE id = ?", (status, attempts, next_attempt, error, now, item['id']))
+        self.notify(dict(item, status=status, attempts=attempts, next_attempt=next_attempt, last_error=error))
+
+    def notify(self, item):
+        for callback in list(self.listeners):
+            try:
+                callback(item)
+            except Exception as e:
+                print(f"Outbox listener failed: {e}")
+
+_default = None
+_default_lock = threading.Lock()
+
+def get_outbox(config_provider):
+    """Returns the process-wide outbox (shared by the GUI and the web server), starting it on first use."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            # One sender per pooled connection, so a book's parts go out side by side
+            _default = Outbox(default_path(), config_provider, workers=email_sender.POOL_SIZE)
+            _default.start()
+        return _default
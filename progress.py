@@ -0,0 +1,71 @@
+import time
+import threading
+
+# Most progress updates a job passes on per second
+MAX_RATE = 10.0
+
+class ProgressThrottle:
+    """
+    Wraps a progress callback(percentage, message) so a job calls it at most
+    max_rate times a second, and never twice with the same update.
+
+    An update that arrives too soon is held, and replaced by any newer one;
+    the latest is delivered by a timer once the interval is up, so the UI
+    never stays behind. Updates at 0% or 100% (start, errors, done) go
+    straight through. close() delivers anything still held and must be
+    called when the job ends, so no update arrives after it returns.
+
+    With echo=True each delivered update is also printed to the console.
+    """
+
+    def __init__(self, callback=None, max_rate=MAX_RATE, echo=False):
+        self.callback = callback
+        self.interval = 1.0 / max_rate if max_rate else 0.0
+        self.echo = echo
+        self.lock = threading.RLock()
+        self.last_sent = None
+        self.last_time = float('-inf')
+        self.pending = None
+        self.timer = None
+        self.closed = False
+
+    def __call__(self, percentage, message):
+        with self.lock:
+            if self.closed:
+                return
+            update = (percentage, message)
+            wait = self.last_time + self.interval - time.monotonic()
+            if wait <= 0 or percentage <= 0 or percentage >= 100:
+                self.pending = None
+                self.send(update)
+            else:
+                self.pending = update
+                if self.timer is None:
+                    self.timer = threading.Timer(wait, self.flush)
+                    self.timer.daemon = True
+                    self.timer.start()
+
+    def flush(self):
+        """Delivers the held update, if any."""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if self.pending is not None:
+                update, self.pending = self.pending, None
+                self.send(update)
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.closed = True
+
+    def send(self, update):
+        if update == self.last_sent:
+            return
+        self.last_sent = update
+        self.last_time = time.monotonic()
+        if self.callback:
+            self.callback(*update)
+        if self.echo:
+            print(f"[{update[0]}%] {update[1]}")
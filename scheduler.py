@@ -0,0 +1,132 @@
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+def recommended_workers(per_job_mb: int = 512) -> int:
+    """Number of conversions to run at once: one per core, capped so each gets per_job_mb of RAM."""
+    cores = os.cpu_count() or 1
+    try:
+        total_mb = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        # Windows has no sysconf; fall back to cores only
+        return max(1, cores)
+    return max(1, min(cores, total_mb // per_job_mb))
+
+class JobScheduler:
+    """Bounded pool for conversion jobs.
+
+    Jobs beyond max_workers wait instead of all decoding images at once.
+    Each client (the desktop queue, one web user, the folder watcher) has
+    its own FIFO queue and free slots go round-robin between clients with
+    work waiting, so a 40-volume batch from one of them cannot hold back a
+    single upload from another. pending/active counts are kept for status
+    reporting.
+
+    A job submitted with a cancel_token can be stopped from outside by
+    cancel_all(), e.g. when the app closes, whichever frontend queued it.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or recommended_workers()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="conversion")
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        # client -> deque of (future, fn, args, kwargs); order is whose turn is next
+        self.queues = OrderedDict()
+        self.running = 0
+        self.closed = False
+        self.pending = 0
+        self.active = 0
+        # Future -> CancelToken of jobs queued or running that were given one
+        self.tokens = {}
+
+    def submit(self, fn, *args, client=None, cancel_token=None, **kwargs):
+        """Queues fn(*args, **kwargs) for client and returns its Future.
+
+        cancel_token is the job's own CancelToken (fn still gets it through its
+        arguments); cancel_all() cancels it while the job waits or runs.
+        """
+        future = Future()
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("cannot schedule new jobs after shutdown")
+            if cancel_token is not None:
+                self.tokens[future] = cancel_token
+            self.queues.setdefault(client, deque()).append((future, fn, args, kwargs))
+            self.pending += 1
+            self.dispatch()
+        return future
+
+    def queued(self, client):
+        """Jobs of one client still waiting for a slot."""
+        with self.lock:
+            return len(self.queues.get(client, ()))
+
+    def dispatch(self):
+        """Hands waiting jobs to free slots, one client at a time. Called with the lock held."""
+        while self.running < self.max_workers and self.queues:
+            client, queue = self.queues.popitem(last=False)
+            job = queue.popleft()
+            if queue:
+                # Back of the line until every other client has had a turn
+                self.queues[client] = queue
+            self.running += 1
+            self.pending -= 1
+            self.executor.submit(self.run, *job)
+
+    def run(self, future, fn, args, kwargs):
+        if future.set_running_or_notify_cancel():
+            with self.lock:
+                self.active += 1
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self.lock:
+                    self.active -= 1
+        with self.lock:
+            self.tokens.pop(future, None)
+            self.running -= 1
+            self.dispatch()
+            if not self.running:
+                self.idle.notify_all()
+
+    def cancel_all(self):
+        """Cancels the tokens of every job queued or running, from any client."""
+        with self.lock:
+            tokens = list(self.tokens.values())
+        for token in tokens:
+            token.cancel()
+
+    def shutdown(self, wait=True):
+        """Stops taking jobs. wait finishes everything queued; otherwise queued jobs are cancelled."""
+        with self.lock:
+            self.closed = True
+            if not wait:
+                for queue in self.queues.values():
+                    for future, _, _, _ in queue:
+                        future.cancel()
+                        self.tokens.pop(future, None)
+                self.pending -= sum(len(queue) for queue in self.queues.values())
+                self.queues.clear()
+            else:
+                while self.running or self.queues:
+                    self.idle.wait()
+        self.executor.shutdown(wait=wait)
+
+_default = None
+_default_lock = threading.Lock()
+
+def get_scheduler():
+    """
+    Returns the process-wide scheduler. The desktop queue, the embedded web
+    server and the folder watcher all submit here, so together they never
+    run more than max_workers conversions.
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = JobScheduler()
+        return _default
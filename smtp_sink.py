@@ -0,0 +1,211 @@
+import time
+import base64
+import threading
+import socketserver
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough ESMTP for smtplib: EHLO, AUTH PLAIN, MAIL, RCPT, DATA, RSET, NOOP, QUIT."""
+
+    def reply(self, code, text):
+        self.server.sink.pause()
+        self.wfile.write(f"{code} {text}\r\n".encode())
+        self.wfile.flush()
+
+    def injected(self, command):
+        """Sends an injected reply for command if one is queued. Returns True if it did."""
+        failure = self.server.sink.take_failure(command)
+        if failure is None:
+            return False
+        code, text = failure
+        if code is None:
+            raise ConnectionAbortedError(f"Injected disconnect on {command}")
+        self.reply(code, text)
+        return True
+
+    def handle(self):
+        sink = self.server.sink
+        sink.count('connections')
+        mail_from, recipients, declared_size = None, [], None
+        try:
+            self.reply(220, "localhost SMTP sink ready")
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                command, _, argument = line.decode("ascii", "replace").strip().partition(" ")
+                command = command.upper()
+
+                if command in ("EHLO", "HELO"):
+                    if self.injected(command):
+                        continue
+                    # A bare SIZE means no fixed limit (RFC 1870)
+                    extensions = ["localhost", "8BITMIME", "AUTH PLAIN",
+                                  f"SIZE {sink.max_size}" if sink.max_size else "SIZE"]
+                    if command == "HELO":
+                        self.reply(250, "localhost")
+                    else:
+                        for extension in extensions[:-1]:
+                            self.wfile.write(f"250-{extension}\r\n".encode())
+                        self.reply(250, extensions[-1])
+                elif command == "AUTH":
+                    if self.injected(command):
+                        continue
+                    mechanism, _, response = argument.partition(" ")
+                    if mechanism.upper() != "PLAIN":
+                        self.reply(504, "Unrecognized authentication type")
+                        continue
+                    if not response:
+                        self.reply(334, "")
+                        response = self.rfile.readline().decode("ascii").strip()
+                    _, user, password = base64.b64decode(response).decode().split("\0")
+                    if sink.username is not None and (user, password) != (sink.username, sink.password):
+                        self.reply(535, "Authentication credentials invalid")
+                    else:
+                        self.reply(235, "Authentication successful")
+                elif command == "MAIL":
+                    if self.injected(command):
+                        continue
+                    declared = [p for p in argument.split() if p.upper().startswith("SIZE=")]
+                    if sink.max_size and declared and int(declared[0][5:]) > sink.max_size:
+                        self.reply(552, "Message size exceeds fixed maximum message size")
+                        continue
+                    mail_from, recipients = argument[5:].split()[0].strip("<>"), []
+                    declared_size = int(declared[0][5:]) if declared else None
+                    self.reply(250, "OK")
+                elif command == "RCPT":
+                    if self.injected(command):
+                        continue
+                    recipients.append(argument[3:].strip().strip("<>"))
+                    self.reply(250, "OK")
+                elif command == "DATA":
+                    if self.injected(command):
+                        continue
+                    if mail_from is None or not recipients:
+                        self.reply(503, "Bad sequence of commands")
+                        continue
+                    self.reply(354, "End data with <CR><LF>.<CR><LF>")
+                    data, size = self.read_data(sink.keep_messages)
+                    if self.injected("."):
+                        mail_from, recipients = None, []
+                        continue
+                    if sink.max_size and size > sink.max_size:
+                        self.reply(552, "Message size exceeds fixed maximum message size")
+                    else:
+                        sink.accept(mail_from, recipients, data, size, declared_size)
+                        self.reply(250, "OK: queued")
+                    mail_from, recipients = None, []
+                elif command == "RSET":
+                    mail_from, recipients = None, []
+                    self.reply(250, "OK")
+                elif command == "NOOP":
+                    self.reply(250, "OK")
+                elif command == "QUIT":
+                    self.reply(221, "Bye")
+                    return
+                else:
+                    self.reply(502, "Command not implemented")
+        except (ConnectionError, OSError):
+            pass
+
+    def read_data(self, keep):
+        """Reads the DATA phase up to the lone '.', undoing dot-stuffing. Returns (bytes or None, size)."""
+        lines = []
+        size = 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                raise ConnectionAbortedError("Client hung up during DATA")
+            if line == b".\r\n":
+                return (b"".join(lines) if keep else None), size
+            if line.startswith(b"."):
+                line = line[1:]
+            size += len(line)
+            if keep:
+                lines.append(line)
+
+class SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class SMTPSink:
+    """
+    An SMTP server on localhost that accepts and records mail, for tests and
+    benchmarks that need a real socket without touching the network.
+
+    latency is slept before every reply, max_size is advertised as the SIZE
+    extension and enforced, and username/password (if set) are required for
+    AUTH PLAIN. inject() queues failures. With keep_messages=False only
+    sizes are recorded, so long runs do not hold every message in memory.
+    There is no STARTTLS: connect with use_tls=False.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, max_size=0, username=None, password=None,
+                 keep_messages=True):
+        self.latency = latency
+        self.max_size = max_size
+        self.username = username
+        self.password = password
+        self.keep_messages = keep_messages
+        self.messages = []
+        self.stats = {'connections': 0, 'messages': 0, 'bytes': 0}
+        self.failures = {}
+        self.lock = threading.Lock()
+        self.server = SinkServer((host, port), SinkHandler)
+        self.server.sink = self
+        self.thread = None
+
+    @property
+    def host(self):
+        return self.server.server_address[0]
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05},
+                                       name="smtp-sink", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def inject(self, command, code=421, text="Injected failure", times=1):
+        """
+        Answers the next `times` uses of command (EHLO, AUTH, MAIL, RCPT, DATA,
+        or "." for the end of the message) with code instead of the normal
+        reply. code=None drops the connection instead.
+        """
+        with self.lock:
+            self.failures.setdefault(command.upper(), []).extend([(code, text)] * times)
+
+    def take_failure(self, command):
+        with self.lock:
+            queued = self.failures.get(command)
+            return queued.pop(0) if queued else None
+
+    def pause(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def accept(self, mail_from, recipients, data, size, declared_size=None):
+        with self.lock:
+            self.stats['messages'] += 1
+            self.stats['bytes'] += size
+            if self.keep_messages:
+                self.messages.append({'from': mail_from, 'to': list(recipients), 'data': data,
+                                      'declared_size': declared_size})
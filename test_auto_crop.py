@@ -0,0 +1,96 @@
+import unittest
+import io
+import os
+import re
+import time
+import tempfile
+from PIL import Image, ImageDraw
+import cbz_to_pdf
+from conversion_fixtures import ConversionTestCase, comic_page, encode
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def bordered_page(size=(800, 1200), border=(255, 255, 255), margin=(80, 120)):
+    """A busy synthetic page pasted onto a plain border."""
+    inner = (size[0] - 2 * margin[0], size[1] - 2 * margin[1])
+    with Image.open(io.BytesIO(comic_page(inner, 0))) as content:
+        page = Image.new("RGB", size, border)
+        page.paste(content, margin)
+    return page
+
+@unittest.skipUnless(numpy, "NumPy not installed")
+class TestContentBox(unittest.TestCase):
+    def assertBoxNear(self, box, expected, tolerance):
+        for got, want in zip(box, expected):
+            self.assertAlmostEqual(got, want, delta=tolerance)
+
+    def test_white_border(self):
+        box = cbz_to_pdf.content_box(bordered_page())
+        # Padding keeps a sliver of the margin
+        self.assertBoxNear(box, (80, 120, 720, 1080), 25)
+        self.assertLessEqual(box[0], 80)
+        self.assertGreaterEqual(box[3], 1080)
+
+    def test_black_border(self):
+        box = cbz_to_pdf.content_box(bordered_page(border=(0, 0, 0), margin=(100, 60)))
+        self.assertBoxNear(box, (100, 60, 700, 1140), 25)
+
+    def test_nothing_to_trim(self):
+        full_bleed = Image.open(io.BytesIO(comic_page((800, 1200), 1)))
+        self.assertIsNone(cbz_to_pdf.content_box(full_bleed))
+        self.assertIsNone(cbz_to_pdf.content_box(Image.new("RGB", (800, 1200), "white")))
+        # Page numbers in the corner are not a margin worth keeping
+        page = Image.new("L", (800, 1200), 255)
+        ImageDraw.Draw(page).rectangle((0, 0, 799, 1199), outline=0, width=4)
+        self.assertIsNone(cbz_to_pdf.content_box(page))
+
+    def test_fast_on_full_size_pages(self):
+        path = os.path.join(tempfile.gettempdir(), f"crop_{os.getpid()}.jpg")
+        bordered_page((1600, 2400), margin=(160, 240)).save(path, quality=90)
+        self.addCleanup(os.remove, path)
+        started = time.perf_counter()
+        for _ in range(10):
+            with Image.open(path) as img:
+                cbz_to_pdf.content_box(img)
+        # Draft decoding plus a small thumbnail keeps this to a few ms per page
+        self.assertLess((time.perf_counter() - started) / 10, 0.05)
+
+@unittest.skipUnless(numpy, "NumPy not installed")
+class TestAutoCropConversion(ConversionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.full_bleed = comic_page((800, 1200), 1)
+        self.make_cbz([("p1.jpg", encode(bordered_page(), "JPEG", quality=90)),
+                       ("p2.png", encode(bordered_page(border=(0, 0, 0)), "PNG")),
+                       ("p3.jpg", self.full_bleed)])
+
+    def page_widths(self, pdf):
+        return [int(w) for w in re.findall(rb"/Width (\d+)", pdf)]
+
+    def test_off_by_default(self):
+        pdf, stats = self.convert()
+        self.assertEqual(self.page_widths(pdf), [800, 800, 800])
+        self.assertEqual(stats['cropped_pages'], 0)
+
+    def test_lossless(self):
+        pdf, stats = self.convert(auto_crop=True)
+        self.assertEqual(stats['cropped_pages'], 2)
+        widths = self.page_widths(pdf)
+        self.assertLess(widths[0], 700)
+        self.assertLess(widths[1], 700)
+        # Untouched pages are still embedded as they are
+        self.assertEqual(widths[2], 800)
+        self.assertIn(self.full_bleed, pdf)
+
+    def test_with_compress_and_size_limit(self):
+        for options in ({'compress': True}, {'max_size_mb': 1}):
+            pdf, stats = self.convert(auto_crop=True, **options)
+            self.assertEqual(stats['cropped_pages'], 2, options)
+            widths = self.page_widths(pdf)
+            self.assertLess(max(widths[:2]), 700, options)
+
+if __name__ == '__main__':
+    unittest.main()
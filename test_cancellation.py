@@ -0,0 +1,179 @@
+import unittest
+from unittest.mock import patch
+import io
+import os
+import time
+import zipfile
+import tempfile
+import threading
+from PIL import Image
+import cbz_to_pdf
+from cancellation import CancelToken, ConversionCancelled
+from webapp import app as webapp
+
+def make_cbz(path, pages, size=(300, 300)):
+    with zipfile.ZipFile(path, "w") as archive:
+        for i in range(pages):
+            image = Image.frombytes("RGB", size, os.urandom(size[0] * size[1] * 3))
+            data = io.BytesIO()
+            image.save(data, "JPEG", quality=90)
+            archive.writestr(f"page_{i:03d}.jpg", data.getvalue())
+
+class TestEngineCancellation(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.cbz = os.path.join(self.temp_dir.name, "book.cbz")
+        self.pdf = os.path.join(self.temp_dir.name, "book.pdf")
+
+    def test_cancelled_before_start(self):
+        make_cbz(self.cbz, 2)
+        token = CancelToken()
+        token.cancel()
+        with self.assertRaises(ConversionCancelled):
+            cbz_to_pdf.convert_cbz_to_pdf(self.cbz, self.pdf, cancel_token=token)
+        self.assertFalse(os.path.exists(self.pdf))
+
+    def test_stops_within_a_second(self):
+        make_cbz(self.cbz, 150, size=(800, 800))
+        token = CancelToken()
+        compressing = threading.Event()
+        errors = []
+
+        def progress(percentage, message):
+            if message.startswith("Compressing"):
+                compressing.set()
+
+        def run():
+            try:
+                cbz_to_pdf.convert_cbz_to_pdf(self.cbz, self.pdf, progress_callback=progress,
+                                              compress=True, cancel_token=token)
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.assertTrue(compressing.wait(30))
+        started = time.monotonic()
+        token.cancel()
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], ConversionCancelled)
+        self.assertEqual(os.listdir(self.temp_dir.name), ["book.cbz"])
+
+    def test_partial_output_removed(self):
+        make_cbz(self.cbz, 6)
+        token = CancelToken()
+        plan_parts = cbz_to_pdf.plan_parts
+
+        def cancel_while_splitting(*args):
+            # The whole book is already on disk by the time parts are planned
+            self.assertTrue(os.path.exists(self.pdf))
+            token.cancel()
+            return plan_parts(*args)
+
+        with patch('cbz_to_pdf.plan_parts', side_effect=cancel_while_splitting), \
+             self.assertRaises(ConversionCancelled):
+            cbz_to_pdf.convert_cbz_to_pdf(self.cbz, self.pdf, split_max_bytes=200 * 1024, cancel_token=token)
+        self.assertEqual(os.listdir(self.temp_dir.name), ["book.cbz"])
+
+class TestCancelEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.upload_dir = tempfile.TemporaryDirectory()
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.original_config = dict(webapp.app.config)
+        webapp.app.config['UPLOAD_FOLDER'] = self.upload_dir.name
+        webapp.app.config['OUTPUT_FOLDER'] = self.output_dir.name
+        webapp.tasks.clear()
+        webapp.jobs_by_key.clear()
+
+        self.running = threading.Event()
+
+        def fake_convert(input_path, output_path, cancel_token=None, **kwargs):
+            # Stands in for the engine: works page by page until cancelled
+            self.running.set()
+            deadline = time.time() + 5
+            while time.time() < deadline:
+                cancel_token.check()
+                time.sleep(0.01)
+            return True
+
+        patcher = patch('cbz_to_pdf.convert_cbz_to_pdf', side_effect=fake_convert)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = webapp.app.test_client()
+
+    def tearDown(self):
+        for token in list(webapp.cancel_tokens.values()):
+            token.cancel()
+        webapp.app.config.update(self.original_config)
+        self.upload_dir.cleanup()
+        self.output_dir.cleanup()
+
+    def upload(self, content):
+        response = self.client.post('/upload', data={'file': (io.BytesIO(content), "book.cbz")},
+                                    content_type='multipart/form-data')
+        return response.get_json()['task_id']
+
+    def wait_for(self, task_id):
+        deadline = time.time() + 5
+        while webapp.tasks[task_id]['status'] == 'processing' and time.time() < deadline:
+            time.sleep(0.01)
+        return webapp.tasks[task_id]
+
+    def test_cancel_running_task(self):
+        task_id = self.upload(b"volume")
+        self.assertTrue(self.running.wait(5))
+
+        response = self.client.post(f'/cancel/{task_id}')
+        self.assertEqual(response.status_code, 202)
+        task = self.wait_for(task_id)
+        self.assertEqual(task['status'], 'cancelled')
+        self.assertNotIn(task_id, webapp.cancel_tokens)
+        # The upload is cleaned up with the task
+        self.assertEqual(os.listdir(self.upload_dir.name), [])
+
+        # Too late to cancel now
+        self.assertEqual(self.client.post(f'/cancel/{task_id}').status_code, 409)
+        # Uploading it again converts afresh instead of reusing the cancelled task
+        self.assertNotEqual(self.upload(b"volume"), task_id)
+
+    def test_cancel_shared_task_detaches_first(self):
+        task_id = self.upload(b"volume")
+        # Someone else uploads the same book and shares the conversion
+        self.assertEqual(self.upload(b"volume"), task_id)
+        self.assertTrue(self.running.wait(5))
+
+        response = self.client.post(f'/cancel/{task_id}')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.get_json()['status'], 'detached')
+        time.sleep(0.05)
+        self.assertEqual(webapp.tasks[task_id]['status'], 'processing')
+
+        # The last one attached stops it
+        self.assertEqual(self.client.post(f'/cancel/{task_id}').get_json()['status'], 'cancelling')
+        self.assertEqual(self.wait_for(task_id)['status'], 'cancelled')
+
+    def test_cancel_unknown_task(self):
+        self.assertEqual(self.client.post('/cancel/nope').status_code, 404)
+
+    def test_cancel_batch(self):
+        response = self.client.post('/upload_batch', data={
+            'files': [(io.BytesIO(b"one"), "one.cbz"), (io.BytesIO(b"two"), "two.cbz")],
+        }, content_type='multipart/form-data')
+        batch = response.get_json()
+
+        response = self.client.post(f"/cancel_batch/{batch['batch_id']}")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(sorted(response.get_json()['cancelled']), sorted(batch['task_ids']))
+        for task_id in batch['task_ids']:
+            self.assertEqual(self.wait_for(task_id)['status'], 'cancelled')
+
+        status = self.client.get(f"/batch_status/{batch['batch_id']}").get_json()
+        self.assertEqual(status['counts']['cancelled'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
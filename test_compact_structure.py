@@ -0,0 +1,59 @@
+import unittest
+from unittest.mock import patch
+import os
+import shutil
+from PIL import Image
+import cbz_to_pdf
+from conversion_fixtures import ConversionTestCase, encode
+
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
+def small_page(shade, size=(40, 60)):
+    return encode(Image.new("L", size, shade), "JPEG")
+
+@unittest.skipUnless(pikepdf, "pikepdf not installed")
+class TestCompactStructure(ConversionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_cbz([(f"p{i:03d}.jpg", small_page(i)) for i in range(200)] +
+                      [("p999.jpg", small_page(0, (60, 40)))])
+
+    def test_object_and_xref_streams(self):
+        plain, _ = self.convert()
+        data, _ = self.convert(compact=True)
+        self.assertLess(len(data), len(plain) * 0.9)
+
+        self.assertIn(b"/ObjStm", data)
+        self.assertIn(b"/XRef", data)
+        self.assertNotIn(b"\nxref\n", data)
+        with pikepdf.open(self.pdf) as pdf:
+            self.assertGreaterEqual(pdf.pdf_version, "1.5")
+            self.assertEqual(len(pdf.pages), 201)
+            # Pages of the same size draw through one content stream
+            contents = {page.obj.Contents.objgen for page in pdf.pages}
+            self.assertEqual(len(contents), 2)
+            self.assertEqual(bytes(pdf.pages[150].Resources.XObject.Im0.read_raw_bytes()), small_page(150))
+
+    def test_rewrite_is_deterministic(self):
+        self.convert()
+        copies = []
+        for name in ("a.pdf", "b.pdf"):
+            path = os.path.join(self.temp_dir.name, name)
+            shutil.copy(self.pdf, path)
+            cbz_to_pdf.finish_pdf(path, list(range(201)), linearize=True, compact=True)
+            with open(path, "rb") as f:
+                copies.append(f.read())
+        self.assertEqual(copies[0], copies[1])
+
+    def test_pillow_fallback(self):
+        with patch('img2pdf.convert', side_effect=RuntimeError("boom")):
+            data, _ = self.convert(compact=True)
+        with pikepdf.open(self.pdf) as pdf:
+            self.assertEqual(len(pdf.pages), 201)
+        self.assertIn(b"/ObjStm", data)
+
+if __name__ == '__main__':
+    unittest.main()
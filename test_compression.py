@@ -11,10 +11,10 @@ def test_compression():
         return
 
     print("Converting without compression...")
-    cbz_to_pdf.convert_cbz_to_pdf(input_file, output_normal, compress=False)
+    cbz_to_pdf.convert_cbz_to_pdf(input_file, output_normal, compress=False, verbose=True)
     
     print("Converting with compression...")
-    cbz_to_pdf.convert_cbz_to_pdf(input_file, output_compressed, compress=True)
+    cbz_to_pdf.convert_cbz_to_pdf(input_file, output_compressed, compress=True, verbose=True)
 
     size_normal = os.path.getsize(output_normal)
     size_compressed = os.path.getsize(output_compressed)
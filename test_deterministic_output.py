@@ -0,0 +1,84 @@
+import unittest
+from unittest.mock import patch
+import io
+import time
+import zipfile
+from conversion_fixtures import ConversionTestCase, comic_page
+
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
+def dated(name, date_time):
+    """A zip member with a fixed timestamp, assigned as is (no validation)."""
+    info = zipfile.ZipInfo(name)
+    info.date_time = date_time
+    return info
+
+@unittest.skipUnless(pikepdf, "pikepdf not installed")
+class TestDeterministicOutput(ConversionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_cbz([(dated(f"p{i}.jpg", (2021, 5, 6 + i, 7, 8, 10)), comic_page((400, 600), i))
+                       for i in range(4)])
+
+    def test_same_input_same_bytes(self):
+        for options in ({}, {'compress': True, 'auto_crop': True},
+                        {'linearize': True, 'compact': True}, {'max_size_mb': 1}):
+            first, _ = self.convert(deterministic=True, **options)
+            # Past the next second, so the clock would show up in the dates
+            time.sleep(1.05)
+            second, _ = self.convert(deterministic=True, **options)
+            self.assertEqual(first, second, options)
+
+    def test_dates_and_id(self):
+        data, _ = self.convert(deterministic=True)
+        other, _ = self.convert(deterministic=True, compress=True)
+        with pikepdf.open(io.BytesIO(data)) as pdf, pikepdf.open(io.BytesIO(other)) as other_pdf:
+            self.assertEqual(str(pdf.docinfo.CreationDate), "D:20210509070810Z")
+            self.assertEqual(str(pdf.docinfo.ModDate), "D:20210509070810Z")
+            document_id = bytes(pdf.trailer.ID[0])
+            self.assertEqual(len(document_id), 16)
+            # Other options, other document
+            self.assertNotEqual(bytes(other_pdf.trailer.ID[0]), document_id)
+
+    def test_email_parts(self):
+        runs = []
+        for _ in range(2):
+            _, stats = self.convert(deterministic=True, split_max_bytes=400 * 1024)
+            self.assertGreater(len(stats['parts']), 1)
+            contents = []
+            ids = set()
+            for path in stats['parts']:
+                with open(path, "rb") as f:
+                    contents.append(f.read())
+                with pikepdf.open(path) as pdf:
+                    ids.add(bytes(pdf.trailer.ID[0]))
+            runs.append(contents)
+            self.assertEqual(len(ids), len(stats['parts']))
+        self.assertEqual(runs[0], runs[1])
+
+    def test_zeroed_and_odd_dates(self):
+        # Some writers store a zeroed DOS timestamp, others 62 seconds
+        self.make_cbz([(dated(f"p{i}.jpg", date_time), comic_page((100, 150), i))
+                       for i, date_time in enumerate(((1980, 0, 0, 0, 0, 0), (2022, 3, 4, 5, 6, 62)))])
+        self.convert(deterministic=True)
+        with pikepdf.open(self.pdf) as pdf:
+            self.assertEqual(str(pdf.docinfo.CreationDate), "D:20220304050659Z")
+
+        self.make_cbz([(dated("p0.jpg", (1980, 0, 0, 0, 0, 0)), comic_page((100, 150), 0))])
+        self.convert(deterministic=True)
+        with pikepdf.open(self.pdf) as pdf:
+            self.assertEqual(str(pdf.docinfo.CreationDate), "D:19800101000000Z")
+
+    def test_pillow_fallback(self):
+        with patch('img2pdf.convert', side_effect=RuntimeError("boom")):
+            first, _ = self.convert(deterministic=True)
+            time.sleep(1.05)
+            second, _ = self.convert(deterministic=True)
+        self.assertEqual(first, second)
+        self.assertIn(b"D:20210509070810Z", first)
+
+if __name__ == '__main__':
+    unittest.main()
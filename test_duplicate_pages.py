@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import patch
+import io
+import os
+import re
+from PIL import Image
+import cbz_to_pdf
+from conversion_fixtures import ConversionTestCase, comic_page, encode, page_count
+
+def image_count(pdf):
+    return len(re.findall(rb"/Subtype\s*/Image", pdf))
+
+def reencode(data, quality):
+    with Image.open(io.BytesIO(data)) as img:
+        return encode(img, "JPEG", quality=quality)
+
+class TestFindDuplicates(ConversionTestCase):
+    def write(self, name, data):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_exact_and_near(self):
+        banner = comic_page((400, 600), 7)
+        paths = [self.write("a.jpg", banner),
+                 self.write("b.jpg", comic_page((400, 600), 8)),
+                 self.write("c.jpg", banner),
+                 self.write("d.jpg", reencode(banner, 60))]
+
+        self.assertEqual(cbz_to_pdf.find_duplicates(paths), {paths[2]: paths[0]})
+        self.assertEqual(cbz_to_pdf.find_duplicates(paths, similar=True),
+                         {paths[2]: paths[0], paths[3]: paths[0]})
+
+    def test_different_pages_stay_apart(self):
+        pages = [comic_page((400, 600), seed) for seed in range(6)]
+        paths = [self.write(f"{i}.jpg", page) for i, page in enumerate(pages)]
+        self.assertEqual(cbz_to_pdf.find_duplicates(paths, similar=True), {})
+        # Same picture at another size is a different page
+        with Image.open(io.BytesIO(pages[0])) as img:
+            paths.append(self.write("small.jpg", encode(img.resize((200, 300)), "JPEG")))
+        self.assertEqual(cbz_to_pdf.find_duplicates(paths, similar=True), {})
+
+class TestSharedImages(ConversionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.credits = comic_page((400, 600), 99)
+        pages = []
+        for i in range(4):
+            pages.append((f"p{i}a.jpg", comic_page((400, 600), i)))
+            pages.append((f"p{i}b.jpg", self.credits))
+        self.make_cbz(pages)
+
+    def test_repeats_stored_once(self):
+        pdf, stats = self.convert()
+        self.assertEqual(stats['pages'], 8)
+        self.assertEqual(stats['duplicate_pages'], 3)
+        self.assertEqual(page_count(pdf), 8)
+        self.assertEqual(image_count(pdf), 5)
+        self.assertEqual(pdf.count(self.credits), 1)
+
+    def test_repeats_processed_once(self):
+        with patch('cbz_to_pdf.jpeg_quality', wraps=cbz_to_pdf.jpeg_quality) as estimate:
+            pdf, stats = self.convert(compress=True, quality=50)
+        self.assertEqual(estimate.call_count, 5)
+        self.assertEqual(image_count(pdf), 5)
+
+    def test_pillow_fallback_shares_too(self):
+        with patch('img2pdf.convert', side_effect=RuntimeError("boom")):
+            pdf, stats = self.convert()
+        self.assertEqual(page_count(pdf), 8)
+        self.assertEqual(image_count(pdf), 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+from unittest.mock import patch
+import os
+import time
+import email
+import smtplib
+import tempfile
+import tracemalloc
+import email_sender
+import outbox
+import benchmark_email
+from smtp_sink import SMTPSink
+
+SENDER = "sender@example.com"
+
+class TestDeliveryAgainstSink(unittest.TestCase):
+    """email_sender over a real socket to the local SMTP sink."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        # Registered first so it runs last, after the outbox threads are stopped
+        self.addCleanup(self.temp_dir.cleanup)
+        self.sink = SMTPSink(username=SENDER, password="password").start()
+        self.addCleanup(self.sink.stop)
+
+    def make_file(self, name, size):
+        return benchmark_email.make_file(self.temp_dir.name, name, size)
+
+    def session(self, password="password"):
+        session = email_sender.SMTPSession(self.sink.host, self.sink.port, SENDER, password, use_tls=False)
+        self.addCleanup(session.close)
+        return session
+
+    def test_large_attachment_arrives_intact(self):
+        path = self.make_file("Big Book.pdf", 3 * 1024 * 1024 + 7)
+        self.session().send_files([path], "kindle@kindle.com")
+
+        self.assertEqual(len(self.sink.messages), 1)
+        received = self.sink.messages[0]
+        self.assertEqual(received['to'], ["kindle@kindle.com"])
+        message = email.message_from_bytes(received['data'])
+        attachment = message.get_payload()[1]
+        self.assertEqual(attachment.get_filename(), "Big Book.pdf")
+        with open(path, "rb") as f:
+            self.assertEqual(attachment.get_payload(decode=True), f.read())
+        # The SIZE declared up front is exactly what went over the wire
+        self.assertEqual(received['declared_size'], len(received['data']))
+
+    def test_memory_does_not_grow_with_attachment(self):
+        self.sink.keep_messages = False
+        path = self.make_file("book.pdf", 4 * 1024 * 1024)
+        session = self.session()
+        session.send_files([path], "kindle@kindle.com")
+
+        tracemalloc.start()
+        try:
+            session.send_files([path], "kindle@kindle.com")
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 1024 * 1024)
+
+    def test_size_limit_refused_before_data(self):
+        self.sink.max_size = 100 * 1024
+        path = self.make_file("book.pdf", 200 * 1024)
+        with self.assertRaises(smtplib.SMTPDataError) as raised:
+            self.session().send_files([path], "kindle@kindle.com")
+        self.assertEqual(raised.exception.smtp_code, 552)
+        self.assertEqual(self.sink.stats['bytes'], 0)
+
+    def test_bad_credentials(self):
+        with self.assertRaises(smtplib.SMTPAuthenticationError) as raised:
+            self.session(password="wrong").send_files([self.make_file("book.pdf", 10)], "kindle@kindle.com")
+        self.assertTrue(email_sender.is_permanent_failure(raised.exception))
+
+    def test_reconnects_after_dropped_connection(self):
+        session = self.session()
+        path = self.make_file("book.pdf", 1024)
+        session.send_files([path], "kindle@kindle.com")
+        self.sink.inject("MAIL", code=None)
+        session.send_files([path], "kindle@kindle.com")
+
+        self.assertEqual(self.sink.stats['messages'], 2)
+        self.assertEqual(self.sink.stats['connections'], 2)
+
+    def test_pool_reuses_connections(self):
+        pool = email_sender.DeliveryPool(self.sink.host, self.sink.port, SENDER, "password", size=2, use_tls=False)
+        self.addCleanup(pool.close)
+        paths = [self.make_file(f"part_{i}.pdf", 2048) for i in range(8)]
+        results = pool.send_parallel(paths, "kindle@kindle.com")
+
+        self.assertTrue(all(ok for ok, _ in results))
+        self.assertEqual(self.sink.stats['messages'], 8)
+        self.assertLessEqual(self.sink.stats['connections'], 2)
+
+    def test_outbox_retries_until_delivered(self):
+        self.sink.inject(".", 451, "Local error", times=2)
+        pool = email_sender.DeliveryPool(self.sink.host, self.sink.port, SENDER, "password", use_tls=False)
+        self.addCleanup(pool.close)
+        config = {'sender': SENDER, 'password': "password",
+                  'smtp_server': self.sink.host, 'smtp_port': self.sink.port}
+        box = outbox.Outbox(os.path.join(self.temp_dir.name, "outbox.sqlite3"), lambda: config, base_delay=0.01)
+        self.addCleanup(box.stop, 5)
+
+        with patch('email_sender.get_pool', return_value=pool):
+            box.start()
+            item_id = box.enqueue(self.make_file("book.pdf", 4096), "kindle@kindle.com")
+            deadline = time.time() + 5
+            while box.get(item_id)['status'] != 'sent' and time.time() < deadline:
+                time.sleep(0.01)
+
+        item = box.get(item_id)
+        self.assertEqual(item['status'], 'sent')
+        self.assertEqual(item['attempts'], 3)
+        self.assertEqual(self.sink.stats['messages'], 1)
+
+class TestBenchmark(unittest.TestCase):
+    def test_benchmark_runs(self):
+        results = benchmark_email.run_benchmark(size_mb=1, count=4, size_kb=16, failures=1)
+        self.assertGreater(results['large']['mb_per_second'], 0)
+        self.assertEqual(results['many']['failures'], 0)
+        self.assertEqual(results['retry']['status'], 'sent')
+        self.assertEqual(results['retry']['attempts'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,27 @@
 import unittest
 from unittest.mock import patch, MagicMock
 import os
+import email
+import email.policy
+import itertools
 import tempfile
 import email_sender
 
+def accept_mail(mock_smtp):
+    """Makes the mocked SMTP connection accept every message."""
+    server = mock_smtp.return_value
+    server.does_esmtp = False
+    server.mail.return_value = (250, b"OK")
+    server.rcpt.return_value = (250, b"OK")
+    # 354 after DATA, 250 once the message is in
+    server.getreply.side_effect = itertools.cycle([(354, b"Go ahead"), (250, b"OK")])
+    return server
+
+def sent_messages(server):
+    """Parses everything streamed over the mocked connection back into messages."""
+    data = b"".join(call.args[0] for call in server.send.call_args_list)
+    return [email.message_from_bytes(raw) for raw in data.split(b"\r\n.\r\n") if raw]
+
 class TestEmailSender(unittest.TestCase):
     def setUp(self):
         # Create a dummy file to attach
@@ -17,8 +35,7 @@ class TestEmailSender(unittest.TestCase):
     @patch('smtplib.SMTP')
     def test_send_email_success(self, mock_smtp):
         # Setup mock
-        server_instance = mock_smtp.return_value
-        server_instance.sendmail.return_value = {}
+        server_instance = accept_mail(mock_smtp)
         
         # Call function
         success, msg = email_sender.send_email(
@@ -38,9 +55,16 @@ class TestEmailSender(unittest.TestCase):
         mock_smtp.assert_called_with("smtp.example.com", 587)
         server_instance.starttls.assert_called_once()
         server_instance.login.assert_called_with("sender@example.com", "password")
-        server_instance.sendmail.assert_called_once()
+        server_instance.mail.assert_called_once()
         server_instance.quit.assert_called_once()
 
+        # The attachment arrives intact through the streamed DATA phase
+        messages = sent_messages(server_instance)
+        self.assertEqual(len(messages), 1)
+        self.assertTrue(messages[0]['Subject'].startswith("Convert: "))
+        attachment = messages[0].get_payload()[1]
+        self.assertEqual(attachment.get_payload(decode=True), b"dummy content")
+
     @patch('smtplib.SMTP')
     def test_send_email_failure(self, mock_smtp):
         # Setup mock to raise exception
@@ -58,5 +82,152 @@ class TestEmailSender(unittest.TestCase):
         self.assertFalse(success)
         self.assertEqual(msg, "Connection failed")
 
+class TestDeliveryPool(unittest.TestCase):
+    def setUp(self):
+        self.files = []
+        for size in (10, 10, 10):
+            f = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+            f.write(b"x" * size)
+            f.close()
+            self.files.append(f.name)
+
+    def tearDown(self):
+        for name in self.files:
+            os.remove(name)
+
+    @patch('smtplib.SMTP')
+    def test_connection_reused_across_sends(self, mock_smtp):
+        accept_mail(mock_smtp)
+        pool = email_sender.DeliveryPool("smtp.example.com", 587, "sender@example.com", "password")
+        for name in self.files:
+            success, _ = pool.send(name, "kindle@kindle.com")
+            self.assertTrue(success)
+
+        mock_smtp.assert_called_once_with("smtp.example.com", 587)
+        server_instance = mock_smtp.return_value
+        server_instance.login.assert_called_once()
+        self.assertEqual(server_instance.mail.call_count, 3)
+        server_instance.quit.assert_not_called()
+
+        pool.close()
+        server_instance.quit.assert_called_once()
+
+    @patch('smtplib.SMTP')
+    def test_reconnects_when_server_hung_up(self, mock_smtp):
+        import smtplib
+        server_instance = accept_mail(mock_smtp)
+        pool = email_sender.DeliveryPool("smtp.example.com", 587, "sender@example.com", "password")
+        pool.send(self.files[0], "kindle@kindle.com")
+
+        server_instance.mail.side_effect = [smtplib.SMTPServerDisconnected("gone"), (250, b"OK")]
+        success, _ = pool.send(self.files[1], "kindle@kindle.com")
+
+        self.assertTrue(success)
+        self.assertEqual(mock_smtp.call_count, 2)
+
+    @patch('smtplib.SMTP')
+    def test_idle_connection_is_replaced(self, mock_smtp):
+        accept_mail(mock_smtp)
+        pool = email_sender.DeliveryPool("smtp.example.com", 587, "sender@example.com", "password", idle_timeout=0)
+        pool.send(self.files[0], "kindle@kindle.com")
+        pool.send(self.files[1], "kindle@kindle.com")
+
+        self.assertEqual(mock_smtp.call_count, 2)
+        mock_smtp.return_value.quit.assert_called_once()
+
+    @patch('smtplib.SMTP')
+    def test_failed_send_reports_and_drops_connection(self, mock_smtp):
+        import smtplib
+        accept_mail(mock_smtp).rcpt.return_value = (550, b"No such user")
+        pool = email_sender.DeliveryPool("smtp.example.com", 587, "sender@example.com", "password")
+        success, _ = pool.send(self.files[0], "kindle@kindle.com")
+
+        self.assertFalse(success)
+        self.assertEqual(pool.idle, [])
+
+    @patch('smtplib.SMTP')
+    def test_batch_packs_small_files_under_limit(self, mock_smtp):
+        server_instance = accept_mail(mock_smtp)
+        pool = email_sender.DeliveryPool("smtp.example.com", 587, "sender@example.com", "password")
+        limit = email_sender.MESSAGE_OVERHEAD + 2 * email_sender.encoded_size(10)
+        results = pool.send_batch(self.files, "kindle@kindle.com", max_message_bytes=limit)
+
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(success for success, _ in results))
+        # Two attachments fit in the first message, the third goes alone
+        self.assertEqual(server_instance.mail.call_count, 2)
+        first_message = sent_messages(server_instance)[0]
+        self.assertEqual(len(first_message.get_payload()), 3)
+
+    @patch('smtplib.SMTP')
+    def test_parallel_sends_one_message_per_file(self, mock_smtp):
+        server_instance = accept_mail(mock_smtp)
+        pool = email_sender.DeliveryPool("smtp.example.com", 587, "sender@example.com", "password", size=1)
+        results = pool.send_parallel(self.files, "kindle@kindle.com", ["a.pdf", "b.pdf", "c.pdf"])
+
+        self.assertEqual([success for success, _ in results], [True, True, True])
+        subjects = sorted(message['Subject'] for message in sent_messages(server_instance))
+        self.assertEqual(subjects, ["Convert: a.pdf", "Convert: b.pdf", "Convert: c.pdf"])
+
+    def test_get_pool_is_shared_per_account(self):
+        a = email_sender.get_pool("a@example.com", "pw", "smtp.example.com", "587")
+        b = email_sender.get_pool("a@example.com", "pw", "smtp.example.com", 587)
+        c = email_sender.get_pool("b@example.com", "pw", "smtp.example.com", 587)
+        self.assertIs(a, b)
+        self.assertIsNot(a, c)
+
+class TestMessageStream(unittest.TestCase):
+    def test_size_is_exact_and_attachments_round_trip(self):
+        contents = [os.urandom(n) for n in (0, 1, 56, 57, 58, 100_000)]
+        paths = []
+        try:
+            for data in contents:
+                f = tempfile.NamedTemporaryFile(delete=False)
+                f.write(data)
+                f.close()
+                paths.append(f.name)
+
+            names = ["Ränma ½ vol 1.pdf"] + [None] * (len(paths) - 1)
+            message = email_sender.MessageStream(paths, "a@example.com", "b@kindle.com", names)
+            raw = message.as_bytes()
+            self.assertEqual(len(raw), message.size)
+
+            parsed = email.message_from_bytes(raw, policy=email.policy.default)
+            attachments = list(parsed.iter_attachments())
+            self.assertEqual(attachments[0].get_filename(), "Ränma ½ vol 1.pdf")
+            self.assertEqual([a.get_content() for a in attachments], contents)
+            self.assertTrue(all(len(line) <= 78 for line in raw.split(b"\r\n")))
+        finally:
+            for path in paths:
+                os.remove(path)
+
+    def test_chunks_are_bounded(self):
+        f = tempfile.NamedTemporaryFile(delete=False)
+        f.write(os.urandom(3 * 1024 * 1024))
+        f.close()
+        try:
+            message = email_sender.MessageStream([f.name], "a@example.com", "b@kindle.com")
+            largest = max(len(chunk) for chunk in message.chunks())
+            self.assertLess(largest, 2 * email_sender.CHUNK_SIZE)
+        finally:
+            os.remove(f.name)
+
+    def test_server_size_limit_checked_before_sending(self):
+        import smtplib
+        server = MagicMock()
+        server.does_esmtp = True
+        server.has_extn.return_value = True
+        server.esmtp_features = {'size': '1000'}
+        f = tempfile.NamedTemporaryFile(delete=False)
+        f.write(b"x" * 2000)
+        f.close()
+        try:
+            message = email_sender.MessageStream([f.name], "a@example.com", "b@kindle.com")
+            with self.assertRaises(smtplib.SMTPDataError):
+                email_sender.stream_message(server, "a@example.com", "b@kindle.com", message)
+            server.send.assert_not_called()
+        finally:
+            os.remove(f.name)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import io
+import os
+import re
+from PIL import Image
+import cbz_to_pdf
+import benchmark_conversion
+from conversion_fixtures import ConversionTestCase, comic_page
+
+def jpeg_streams(pdf):
+    """The JPEG data of every page image in a PDF written by img2pdf."""
+    return re.findall(rb"stream\r?\n(\xff\xd8.*?)\r?\nendstream", pdf, re.S)
+
+class TestEncoderPresets(ConversionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_cbz([(f"p{i}.jpg", comic_page((400, 600), i)) for i in range(2)])
+
+    def test_presets_set_encoder_flags(self):
+        for preset, progressive in (('fast', False), ('balanced', False), ('smallest', True)):
+            streams = jpeg_streams(self.convert(preset=preset, compress=True)[0])
+            self.assertEqual(len(streams), 2)
+            for data in streams:
+                with Image.open(io.BytesIO(data)) as img:
+                    self.assertEqual(bool(img.info.get('progressive')), progressive, preset)
+
+    def test_resize_gives_same_dimensions(self):
+        # Over the limit, so every page is resized; the fast preset decodes JPEGs at reduced scale first
+        self.make_cbz([(f"p{i}.jpg", comic_page((1600, 2400), i)) for i in range(3)])
+        self.assertGreater(os.path.getsize(self.cbz), 1024 * 1024)
+        sizes = set()
+        for preset in cbz_to_pdf.ENCODER_PRESETS:
+            pdf, _ = self.convert(preset=preset, max_size_mb=1)
+            self.assertLess(len(pdf), 1024 * 1024)
+            with Image.open(io.BytesIO(jpeg_streams(pdf)[0])) as img:
+                sizes.add(img.size)
+        self.assertEqual(len(sizes), 1)
+        self.assertLess(sizes.pop()[0], 1600)
+
+    def test_default_is_original_path(self):
+        settings = cbz_to_pdf.encoder_settings(cbz_to_pdf.DEFAULT_PRESET)
+        self.assertEqual((settings['resample'], settings['optimize'], settings['progressive']),
+                         ('LANCZOS', True, False))
+
+    def test_unknown_preset(self):
+        with self.assertRaises(ValueError):
+            cbz_to_pdf.convert_cbz_to_pdf(self.cbz, self.pdf, preset="tiny")
+
+class TestConversionBenchmark(unittest.TestCase):
+    def test_benchmark_runs(self):
+        results = benchmark_conversion.run_benchmark(pages=2, width=400, height=600)
+        for mode in ('compress', 'max_size'):
+            self.assertEqual(sorted(results[mode]), sorted(cbz_to_pdf.ENCODER_PRESETS))
+            for result in results[mode].values():
+                self.assertGreater(result['pages_per_second'], 0)
+                self.assertGreater(result['output_bytes'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import gc
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import time
+import threading
+import tempfile
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import Qt
+import cbz_converter_app
+import thumbnails
+from scheduler import JobScheduler
+
+app = QApplication.instance() or QApplication([])
+
+class TestConcurrentQueue(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        for patcher in (patch('outbox.get_outbox', return_value=MagicMock()),
+                        patch('thumbnails.get_service', return_value=MagicMock())):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.window = cbz_converter_app.MainWindow()
+        self.window.scheduler = JobScheduler(2)
+        self.window.output_dir = self.temp_dir.name
+        self.addCleanup(self.window.scheduler.shutdown)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+        # Free this window's Qt objects now, while no pool thread is busy,
+        # rather than whenever a later test happens to trigger a collection
+        del self.window
+        gc.collect()
+
+    def add_files(self, *names):
+        for name in names:
+            self.window.add_to_queue(os.path.join(self.temp_dir.name, name))
+
+    def run_queue(self):
+        self.window.start_conversion()
+        deadline = time.time() + 10
+        while self.window.is_processing and time.time() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+        self.assertFalse(self.window.is_processing)
+
+    def texts(self):
+        return [self.window.list_widget.item(i).text() for i in range(self.window.list_widget.count())]
+
+    def test_items_convert_concurrently(self):
+        # Both conversions must be inside the engine at once to get past the barrier
+        barrier = threading.Barrier(2, timeout=5)
+        slot_threads = set()
+        mark_finished = self.window.mark_finished
+
+        def record_thread(*args):
+            slot_threads.add(threading.current_thread())
+            mark_finished(*args)
+        self.window.mark_finished = record_thread
+
+        def fake_convert(input_path, output_path, progress_callback=None, **kwargs):
+            progress_callback(50, "Halfway")
+            barrier.wait()
+            return True
+
+        with patch('cbz_to_pdf.convert_cbz_to_pdf', side_effect=fake_convert):
+            self.add_files("a.cbz", "b.cbz", "c.cbz", "d.cbz")
+            self.window.start_conversion()
+            # Only as many rows as scheduler slots are started; the rest stay editable
+            self.assertEqual(len(self.window.jobs), 2)
+            self.assertEqual(self.window.list_widget.item(2).data(Qt.UserRole),
+                             os.path.join(self.temp_dir.name, "c.cbz"))
+            self.run_queue()
+
+        self.assertEqual(self.texts(), ["Done: Successfully created a.pdf", "Done: Successfully created b.pdf",
+                                        "Done: Successfully created c.pdf", "Done: Successfully created d.pdf"])
+        self.assertEqual(self.window.progress_bar.value(), 100)
+        self.assertEqual(self.window.status_label.text(), "Ready")
+        # Results come back through signals onto the GUI thread
+        self.assertEqual(slot_threads, {threading.current_thread()})
+
+    def test_failure_does_not_block_queue(self):
+        def fake_convert(input_path, output_path, progress_callback=None, **kwargs):
+            if input_path.endswith("bad.cbz"):
+                raise ValueError("No images found in archive")
+            return True
+
+        with patch('cbz_to_pdf.convert_cbz_to_pdf', side_effect=fake_convert), \
+             patch.object(cbz_converter_app.QMessageBox, 'critical') as critical:
+            self.add_files("bad.cbz", "good.cbz", "other.cbz")
+            self.run_queue()
+
+        critical.assert_not_called()
+        texts = self.texts()
+        self.assertEqual(texts[0], "Error: No images found in archive")
+        self.assertEqual(texts[1:], ["Done: Successfully created good.pdf", "Done: Successfully created other.pdf"])
+        self.assertEqual(self.window.status_label.text(), "Finished with 1 error(s)")
+
+    def test_stop_cancels_running_items(self):
+        running = threading.Semaphore(0)
+
+        def fake_convert(input_path, output_path, progress_callback=None, cancel_token=None, **kwargs):
+            running.release()
+            deadline = time.time() + 5
+            while time.time() < deadline:
+                cancel_token.check()
+                time.sleep(0.01)
+            return True
+
+        with patch('cbz_to_pdf.convert_cbz_to_pdf', side_effect=fake_convert):
+            self.add_files("a.cbz", "b.cbz", "c.cbz")
+            self.window.start_conversion()
+            self.assertTrue(running.acquire(timeout=5) and running.acquire(timeout=5))
+            self.window.stop_conversion()
+            deadline = time.time() + 5
+            while self.window.jobs and time.time() < deadline:
+                app.processEvents()
+                time.sleep(0.01)
+
+        self.assertEqual(self.window.jobs, {})
+        self.assertEqual(self.texts(), ["Cancelled: a", "Cancelled: b", "c.cbz"])
+        self.assertEqual(self.window.status_label.text(), "Stopped (2 cancelled)")
+
+    def test_close_stops_other_frontends_jobs(self):
+        from PySide6.QtGui import QCloseEvent
+        from cancellation import CancelToken
+
+        token = CancelToken()
+        started = threading.Event()
+
+        def web_conversion():
+            started.set()
+            while not token.cancelled:
+                time.sleep(0.01)
+            return "cancelled"
+
+        future = self.window.scheduler.submit(web_conversion, client="web 10.0.0.2", cancel_token=token)
+        self.assertTrue(started.wait(5))
+        self.window.closeEvent(QCloseEvent())
+        # Stopped, not left burning a pool thread after the window has gone
+        self.assertEqual(future.result(5), "cancelled")
+
+    def test_queue_items_get_thumbnails(self):
+        if not os.path.exists("test.cbz"):
+            self.skipTest("test.cbz not found. Run create_test_cbz.py first.")
+        service = thumbnails.ThumbnailService(os.path.join(self.temp_dir.name, "cache"))
+        self.addCleanup(service.executor.shutdown)
+        with patch('thumbnails.get_service', return_value=service):
+            self.window.add_to_queue(os.path.abspath("test.cbz"))
+        item = self.window.list_widget.item(0)
+
+        deadline = time.time() + 5
+        while item.icon().isNull() and time.time() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+        self.assertFalse(item.icon().isNull())
+        # Still an editable queue item
+        self.assertEqual(item.text(), "test.cbz")
+
+if __name__ == '__main__':
+    unittest.main()
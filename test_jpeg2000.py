@@ -0,0 +1,50 @@
+import unittest
+from unittest.mock import patch
+import os
+import re
+from PIL import Image, features
+import cbz_to_pdf
+from conversion_fixtures import ConversionTestCase, comic_page
+
+@unittest.skipUnless(features.check_codec('jpg_2000'), "Pillow built without OpenJPEG")
+class TestJpeg2000(ConversionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_cbz([(f"p{i}.jpg", comic_page((800, 1200), i)) for i in range(4)])
+
+    def test_page_hits_budget_in_one_pass(self):
+        path = os.path.join(self.temp_dir.name, "page.jpg")
+        with open(path, "wb") as f:
+            f.write(comic_page((800, 1200), 0))
+
+        with patch('PIL.Image.Image.save', autospec=True, side_effect=Image.Image.save) as save:
+            cbz_to_pdf.encode_jpeg2000(path, 30000)
+        self.assertEqual(save.call_count, 1)
+        self.assertLessEqual(os.path.getsize(path), 30000)
+        self.assertGreater(os.path.getsize(path), 27000)
+        with Image.open(path) as img:
+            self.assertEqual((img.format, img.size), ("JPEG2000", (800, 1200)))
+
+    def test_size_limit_met_at_full_resolution(self):
+        limit = 1
+        self.assertGreater(os.path.getsize(self.cbz), limit * 1024 * 1024)
+
+        pdf, _ = self.convert(max_size_mb=limit, jpeg2000=True)
+        self.assertLessEqual(len(pdf), limit * 1024 * 1024)
+        self.assertEqual(len(re.findall(rb"/JPXDecode", pdf)), 4)
+        self.assertIn(b"/Width 800", pdf)
+
+    def test_budgets_follow_page_sizes(self):
+        budgets = cbz_to_pdf.page_budgets([100, 300], 1024 * 1024)
+        self.assertAlmostEqual(budgets[1] / budgets[0], 3, places=2)
+        self.assertLessEqual(sum(budgets) + cbz_to_pdf.PDF_OVERHEAD + 2 * cbz_to_pdf.PAGE_OVERHEAD, 1024 * 1024)
+        # Never starved to nothing
+        self.assertEqual(cbz_to_pdf.page_budgets([1, 10 ** 9], 64 * 1024)[0], cbz_to_pdf.MIN_PAGE_BUDGET)
+
+    def test_without_openjpeg_falls_back_to_resize(self):
+        with patch('PIL.features.check_codec', return_value=False):
+            pdf, _ = self.convert(max_size_mb=1, jpeg2000=True)
+        self.assertNotIn(b"/JPXDecode", pdf)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import io
+from PIL import Image
+import cbz_to_pdf
+from conversion_fixtures import ConversionTestCase, noise, encode
+
+class TestJpegQuality(unittest.TestCase):
+    def test_estimates_saved_quality(self):
+        img = noise((64, 64))
+        for quality in (20, 50, 60, 75, 85, 95):
+            with Image.open(io.BytesIO(encode(img, "JPEG", quality=quality))) as jpeg:
+                self.assertEqual(cbz_to_pdf.jpeg_quality(jpeg), quality)
+
+    def test_not_a_jpeg(self):
+        with Image.open(io.BytesIO(encode(noise((8, 8)), "PNG"))) as png:
+            self.assertIsNone(cbz_to_pdf.jpeg_quality(png))
+
+class TestPassthrough(ConversionTestCase):
+    def test_only_pages_above_target_are_reencoded(self):
+        low = encode(noise((200, 300)), "JPEG", quality=60)
+        grey = encode(noise((200, 300), "L"), "JPEG", quality=40)
+        high = encode(noise((200, 300)), "JPEG", quality=95)
+        png = encode(noise((200, 300)), "PNG")
+        cmyk = encode(noise((200, 300), "CMYK"), "JPEG", quality=50)
+        self.make_cbz([("p1.jpg", low), ("p2.jpg", grey), ("p3.jpg", high), ("p4.png", png), ("p5.jpg", cmyk)])
+
+        pdf, stats = self.convert(compress=True, quality=75)
+
+        self.assertEqual(stats['passthrough_pages'], 2)
+        # Embedded byte for byte
+        self.assertIn(low, pdf)
+        self.assertIn(grey, pdf)
+        # Above the target, not a JPEG, or CMYK: transcoded as before
+        self.assertNotIn(high, pdf)
+        self.assertNotIn(png, pdf)
+        self.assertNotIn(cmyk, pdf)
+
+    def test_close_to_target_kept(self):
+        # Re-encoding 78 at 75 saves a few percent for a generation of loss; 82 at 75 saves more
+        near = encode(noise((200, 300)), "JPEG", quality=78)
+        above = encode(noise((200, 300)), "JPEG", quality=82)
+        self.make_cbz([("p1.jpg", near), ("p2.jpg", above)])
+
+        pdf, stats = self.convert(compress=True, quality=75)
+        self.assertEqual(stats['passthrough_pages'], 1)
+        self.assertIn(near, pdf)
+        self.assertNotIn(above, pdf)
+
+    def test_reencode_gain(self):
+        self.assertLessEqual(cbz_to_pdf.reencode_gain(60, 75), 0)
+        self.assertLess(cbz_to_pdf.reencode_gain(78, 75), cbz_to_pdf.MIN_REENCODE_GAIN)
+        self.assertGreater(cbz_to_pdf.reencode_gain(95, 75), 0.5)
+
+if __name__ == '__main__':
+    unittest.main()
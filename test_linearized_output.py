@@ -0,0 +1,61 @@
+import unittest
+from unittest.mock import patch
+from conversion_fixtures import ConversionTestCase, comic_page
+
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
+@unittest.skipUnless(pikepdf, "pikepdf not installed")
+class TestLinearizedOutput(ConversionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pages = [comic_page((400, 600), i) for i in range(6)]
+        self.members = [(f"p{i}.jpg", page) for i, page in enumerate(self.pages)]
+        self.make_cbz(self.members)
+
+    def test_pillow_fallback(self):
+        with patch('img2pdf.convert', side_effect=RuntimeError("boom")):
+            self.convert()
+            with pikepdf.open(self.pdf) as pdf:
+                self.assertFalse(pdf.is_linearized)
+
+            self.convert(linearize=True)
+            with pikepdf.open(self.pdf) as pdf:
+                self.assertTrue(pdf.is_linearized)
+                pdf.check_linearization()
+
+    def test_first_page_comes_first(self):
+        data, _ = self.convert(linearize=True)
+        with pikepdf.open(self.pdf) as pdf:
+            self.assertTrue(pdf.is_linearized)
+            self.assertEqual(len(pdf.pages), 6)
+            pdf.check_linearization()
+        # Linearization dictionary in the first kilobyte, page 1's image before page 2's
+        self.assertIn(b"/Linearized", data[:1024])
+        self.assertLess(data.index(self.pages[0]), data.index(self.pages[1]))
+
+    def test_email_parts_linearized(self):
+        _, stats = self.convert(linearize=True, split_max_bytes=400 * 1024)
+        self.assertGreater(len(stats['parts']), 1)
+        for path in stats['parts']:
+            with pikepdf.open(path) as pdf:
+                self.assertTrue(pdf.is_linearized, path)
+
+    def test_sharing_keeps_linearization(self):
+        self.make_cbz(self.members + [("p9.jpg", self.pages[0])])
+        self.convert(linearize=True)
+        with pikepdf.open(self.pdf) as pdf:
+            self.assertTrue(pdf.is_linearized)
+            self.assertEqual(len(pdf.pages), 7)
+
+    def test_without_pikepdf(self):
+        with patch.dict('sys.modules', {'pikepdf': None}), \
+                patch('img2pdf.convert', side_effect=RuntimeError("boom")):
+            self.convert(linearize=True)
+        with pikepdf.open(self.pdf) as pdf:
+            self.assertFalse(pdf.is_linearized)
+
+if __name__ == '__main__':
+    unittest.main()
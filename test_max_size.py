@@ -14,7 +14,7 @@ def test_max_size():
         return
 
     print(f"Converting with max size limit: {max_size_mb}MB...")
-    cbz_to_pdf.convert_cbz_to_pdf(input_file, output_limited, max_size_mb=max_size_mb)
+    cbz_to_pdf.convert_cbz_to_pdf(input_file, output_limited, max_size_mb=max_size_mb, verbose=True)
 
     size_limited = os.path.getsize(output_limited)
     print(f"Limited size: {size_limited} bytes ({size_limited/1024/1024:.2f} MB)")
@@ -0,0 +1,66 @@
+import unittest
+import os
+import tempfile
+import metrics
+import cbz_to_pdf
+
+class TestMetrics(unittest.TestCase):
+    def test_exposition_format(self):
+        registry = metrics.Registry()
+        requests = registry.register(metrics.Counter('requests_total', 'Requests.', ('code',)))
+        latency = registry.register(metrics.Histogram('latency_seconds', 'Latency.', buckets=(1, 5)))
+        registry.register(metrics.Gauge('queue_depth', 'Queue.', function=lambda: 3))
+
+        requests.inc(code=200)
+        requests.inc(2, code=200)
+        requests.inc(code=500)
+        latency.observe(0.5)
+        latency.observe(3)
+        latency.observe(10)
+
+        text = registry.render()
+        self.assertIn('# TYPE requests_total counter', text)
+        self.assertIn('requests_total{code="200"} 3', text)
+        self.assertIn('requests_total{code="500"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="1"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="5"} 2', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn('latency_seconds_sum 13.5', text)
+        self.assertIn('latency_seconds_count 3', text)
+        self.assertIn('queue_depth 3', text)
+
+    def test_labels_must_match(self):
+        counter = metrics.Counter('x_total', 'X.', ('mode',))
+        with self.assertRaises(ValueError):
+            counter.inc(kind='a')
+
+    def test_reregistering_returns_existing(self):
+        registry = metrics.Registry()
+        first = registry.register(metrics.Counter('a_total', 'A.'))
+        self.assertIs(registry.register(metrics.Counter('a_total', 'A.')), first)
+        with self.assertRaises(ValueError):
+            registry.register(metrics.Gauge('a_total', 'A.'))
+
+    def test_engine_fills_stats(self):
+        if not os.path.exists("test.cbz"):
+            self.skipTest("test.cbz not found. Run create_test_cbz.py first.")
+        with tempfile.TemporaryDirectory() as output_dir:
+            output = os.path.join(output_dir, "out.pdf")
+            stats = {}
+            self.assertTrue(cbz_to_pdf.convert_cbz_to_pdf("test.cbz", output, stats=stats))
+            self.assertEqual(stats['pages'], 3)
+            self.assertEqual(stats['input_bytes'], os.path.getsize("test.cbz"))
+            self.assertEqual(stats['output_bytes'], os.path.getsize(output))
+
+    def test_metrics_endpoint(self):
+        from webapp.app import app
+        response = app.test_client().get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        for name in ('cbz_queue_depth', 'cbz_active_workers', 'process_resident_memory_bytes',
+                     'cbz_conversion_seconds', 'cbz_email_send_seconds'):
+            self.assertIn(f'# TYPE {name}', text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import unittest
+from unittest.mock import patch
+import os
+import time
+import smtplib
+import tempfile
+import threading
+import email_sender
+import outbox
+
+CONFIG = {'sender': 'sender@example.com', 'password': 'pw', 'smtp_server': 'smtp.example.com', 'smtp_port': '587'}
+
+class FakePool:
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.delivered = []
+
+    def deliver(self, file_paths, recipient_email, attachment_names=None):
+        if self.failures:
+            raise self.failures.pop(0)
+        self.delivered.append((file_paths[0], recipient_email, attachment_names[0]))
+
+class TestOutbox(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        # Registered first so it runs last, after the outbox threads are stopped
+        self.addCleanup(self.temp_dir.cleanup)
+        self.db_path = os.path.join(self.temp_dir.name, "outbox.sqlite3")
+        self.pdf = os.path.join(self.temp_dir.name, "book.pdf")
+        with open(self.pdf, "wb") as f:
+            f.write(b"%PDF")
+        self.pool = FakePool()
+        patcher = patch('email_sender.get_pool', return_value=self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_outbox(self, **kwargs):
+        kwargs.setdefault('base_delay', 0.01)
+        box = outbox.Outbox(self.db_path, lambda: CONFIG, **kwargs)
+        self.addCleanup(box.stop, 5)
+        return box
+
+    def wait_for(self, box, item_id, statuses=('sent', 'failed')):
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            item = box.get(item_id)
+            if item['status'] in statuses:
+                return item
+            time.sleep(0.01)
+        self.fail(f"item stuck in {box.get(item_id)['status']}")
+
+    def test_sends_in_background(self):
+        box = self.make_outbox()
+        updates = []
+        box.add_listener(lambda item: updates.append(item['status']))
+        box.start()
+
+        item_id = box.enqueue(self.pdf, "kindle@kindle.com", "Book.pdf")
+        item = self.wait_for(box, item_id)
+        # Listeners hear about the change just after it is stored
+        deadline = time.time() + 5
+        while len(updates) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(item['status'], 'sent')
+        self.assertEqual(item['attempts'], 1)
+        self.assertEqual(self.pool.delivered, [(self.pdf, "kindle@kindle.com", "Book.pdf")])
+        self.assertEqual(updates, ['sending', 'sent'])
+
+    def test_transient_failures_back_off_and_retry(self):
+        self.pool.failures = [smtplib.SMTPServerDisconnected("gone"),
+                              smtplib.SMTPResponseException(421, b"Try later")]
+        box = self.make_outbox()
+        box.start()
+
+        item = self.wait_for(box, box.enqueue(self.pdf, "kindle@kindle.com"))
+        self.assertEqual(item['status'], 'sent')
+        self.assertEqual(item['attempts'], 3)
+        self.assertEqual(len(self.pool.delivered), 1)
+
+    def test_backoff_schedule(self):
+        self.pool.failures = [ConnectionError("down")]
+        box = self.make_outbox(base_delay=30)
+        box.start()
+
+        before = time.time()
+        item = self.wait_for(box, box.enqueue(self.pdf, "kindle@kindle.com"), statuses=('pending',))
+        deadline = time.time() + 5
+        while item['attempts'] == 0 and time.time() < deadline:
+            item = box.get(item['id'])
+            time.sleep(0.01)
+        self.assertEqual(item['attempts'], 1)
+        self.assertEqual(item['last_error'], "down")
+        self.assertAlmostEqual(item['next_attempt'] - before, 30, delta=2)
+
+    def test_permanent_failure_stops_retrying(self):
+        self.pool.failures = [smtplib.SMTPAuthenticationError(535, b"Bad credentials")]
+        box = self.make_outbox()
+        box.start()
+
+        item = self.wait_for(box, box.enqueue(self.pdf, "kindle@kindle.com"))
+        self.assertEqual(item['status'], 'failed')
+        self.assertEqual(item['attempts'], 1)
+
+        box.retry(item['id'])
+        self.assertEqual(self.wait_for(box, item['id'])['status'], 'sent')
+
+    def test_gives_up_after_max_attempts(self):
+        self.pool.failures = [ConnectionError("down")] * 10
+        box = self.make_outbox(max_attempts=3)
+        box.start()
+
+        item = self.wait_for(box, box.enqueue(self.pdf, "kindle@kindle.com"))
+        self.assertEqual(item['status'], 'failed')
+        self.assertEqual(item['attempts'], 3)
+
+    def test_queue_survives_restart(self):
+        box = self.make_outbox()
+        item_id = box.enqueue(self.pdf, "kindle@kindle.com")
+        # Simulate a crash mid-send
+        box.claim()
+        self.assertEqual(box.get(item_id)['status'], 'sending')
+
+        restarted = self.make_outbox()
+        self.assertEqual(restarted.get(item_id)['status'], 'pending')
+        restarted.start()
+        self.assertEqual(self.wait_for(restarted, item_id)['status'], 'sent')
+
+    def test_parts_sent_in_parallel(self):
+        # Each delivery waits until the other has started, so one thread would time out
+        started = threading.Barrier(email_sender.POOL_SIZE, timeout=2)
+        self.pool.deliver = lambda *args: started.wait()
+        box = self.make_outbox(workers=email_sender.POOL_SIZE, max_attempts=1)
+        box.start()
+
+        ids = [box.enqueue(self.pdf, "kindle@kindle.com", f"Book (Part {i + 1}).pdf")
+               for i in range(email_sender.POOL_SIZE)]
+        for item_id in ids:
+            self.assertEqual(self.wait_for(box, item_id)['status'], 'sent')
+
+    def test_shared_outbox_uses_every_connection(self):
+        with patch('outbox.default_path', return_value=self.db_path), patch('outbox._default', None):
+            box = outbox.get_outbox(lambda: CONFIG)
+            self.addCleanup(box.stop, 5)
+            self.assertEqual(len(box.threads), email_sender.POOL_SIZE)
+
+if __name__ == '__main__':
+    unittest.main()
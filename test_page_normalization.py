@@ -0,0 +1,82 @@
+import unittest
+import io
+import os
+from PIL import Image
+import cbz_to_pdf
+from conversion_fixtures import ConversionTestCase, noise, encode, page_count
+
+class TestPageNormalization(ConversionTestCase):
+    def test_odd_pages_converted_rest_embedded(self):
+        jpeg = encode(noise((120, 180)), "JPEG", quality=90)
+        frames = [noise((120, 180)).convert("P") for _ in range(3)]
+        animated = encode(frames[0], "GIF", save_all=True, append_images=frames[1:])
+        self.make_cbz([
+            ("p1.jpg", jpeg),
+            ("p2.webp", encode(noise((120, 180), "RGBA"), "WEBP")),
+            ("p3.gif", animated),
+            ("p4.png", encode(noise((120, 180)), "PNG")),
+        ])
+
+        pdf, stats = self.convert()
+
+        self.assertEqual(stats['normalized_pages'], 2)
+        # Still on the img2pdf path (the Pillow fallback re-encodes every page)
+        self.assertIn(jpeg, pdf)
+        # One page per archive member, not one per GIF frame
+        self.assertEqual(page_count(pdf), 4)
+
+    def test_unreadable_page_left_out(self):
+        good = [encode(noise((60, 90)), "JPEG", quality=90) for _ in range(6)]
+        self.make_cbz([(f"p{i}.jpg", data) for i, data in enumerate(good)] + [("p3a.jpg", b"not an image")])
+
+        pdf, stats = self.convert()
+        self.assertEqual(stats['pages'], 6)
+        self.assertEqual(page_count(pdf), 6)
+        # The rest of the book stayed on the img2pdf path
+        for data in good:
+            self.assertIn(data, pdf)
+
+    def test_transparency_flattened_onto_white(self):
+        page = Image.new("RGBA", (40, 40), (0, 0, 0, 0))
+        page.paste((255, 0, 0, 255), (0, 0, 20, 40))
+        path = os.path.join(self.temp_dir.name, "page.webp")
+        page.save(path, "WEBP", lossless=True)
+
+        with Image.open(path) as img:
+            self.assertTrue(cbz_to_pdf.needs_normalizing(img))
+        cbz_to_pdf.normalize_page(path)
+        with Image.open(path) as img:
+            self.assertEqual((img.format, img.mode), ("PNG", "RGB"))
+            self.assertFalse(cbz_to_pdf.needs_normalizing(img))
+            self.assertEqual(img.getpixel((5, 5)), (255, 0, 0))
+            self.assertEqual(img.getpixel((35, 5)), (255, 255, 255))
+
+    def test_sixteen_bit_grey(self):
+        gradient = Image.linear_gradient('L').resize((64, 64)).convert('I').point(lambda v: v * 257).convert('I;16')
+        png = encode(gradient, "PNG")
+        with Image.open(io.BytesIO(png)) as img:
+            self.assertEqual(img.mode, 'I;16')
+            self.assertFalse(cbz_to_pdf.needs_normalizing(img))
+        self.make_cbz([("p1.png", png)])
+        pdf, stats = self.convert()
+        self.assertEqual(stats['normalized_pages'], 0)
+        self.assertEqual(page_count(pdf), 1)
+
+        # Other containers are transcoded, scaled to 8 bits instead of clipped to white
+        path = os.path.join(self.temp_dir.name, "page.tif")
+        gradient.save(path, "TIFF")
+        with Image.open(path) as img:
+            self.assertTrue(cbz_to_pdf.needs_normalizing(img))
+        cbz_to_pdf.normalize_page(path)
+        with Image.open(path) as img:
+            self.assertEqual(img.mode, 'L')
+            mean = sum(img.tobytes()) / (img.width * img.height)
+        self.assertAlmostEqual(mean, 127, delta=3)
+
+    def test_plain_pages_left_alone(self):
+        for fmt, mode in (("JPEG", "RGB"), ("JPEG", "L"), ("PNG", "RGB"), ("GIF", "P"), ("JPEG", "CMYK")):
+            with Image.open(io.BytesIO(encode(noise((16, 16), mode), fmt))) as img:
+                self.assertFalse(cbz_to_pdf.needs_normalizing(img), (fmt, mode))
+
+if __name__ == '__main__':
+    unittest.main()
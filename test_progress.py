@@ -0,0 +1,77 @@
+import unittest
+import io
+import os
+import time
+import tempfile
+from contextlib import redirect_stdout
+import cbz_to_pdf
+from progress import ProgressThrottle
+
+class TestProgressThrottle(unittest.TestCase):
+    def test_coalesces_rapid_updates(self):
+        updates = []
+        throttle = ProgressThrottle(lambda p, m: updates.append((p, m)), max_rate=1)
+        for i in range(1, 1000):
+            throttle(40 + i * 40 // 1000, f"Compressing {i}/1000...")
+        throttle.close()
+
+        # The first goes straight out, the rest collapse into the latest one
+        self.assertEqual(updates, [(40, "Compressing 1/1000..."), (79, "Compressing 999/1000...")])
+
+    def test_held_update_arrives_without_further_calls(self):
+        updates = []
+        throttle = ProgressThrottle(lambda p, m: updates.append(p), max_rate=20)
+        throttle(10, "Extracting archive...")
+        throttle(30, "Scanning for images...")
+        self.assertEqual(updates, [10])
+
+        deadline = time.time() + 2
+        while len(updates) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(updates, [10, 30])
+        throttle.close()
+
+    def test_only_changes_are_sent(self):
+        updates = []
+        throttle = ProgressThrottle(lambda p, m: updates.append(p), max_rate=0)
+        for _ in range(5):
+            throttle(50, "Halfway")
+        throttle(60, "Further")
+        self.assertEqual(updates, [50, 60])
+
+    def test_start_and_finish_are_not_delayed(self):
+        updates = []
+        throttle = ProgressThrottle(lambda p, m: updates.append(p), max_rate=1)
+        throttle(5, "Processing")
+        throttle(50, "Halfway")
+        throttle(100, "Created")
+        self.assertEqual(updates, [5, 100])
+
+        # Nothing is delivered once closed, even a held update
+        throttle(0, "Late")
+        throttle.close()
+        throttle(0, "Later")
+        self.assertEqual(updates, [5, 100, 0])
+
+class TestEngineProgress(unittest.TestCase):
+    def setUp(self):
+        if not os.path.exists("test.cbz"):
+            self.skipTest("test.cbz not found. Run create_test_cbz.py first.")
+
+    def test_quiet_by_default(self):
+        updates = []
+        with tempfile.TemporaryDirectory() as output_dir, redirect_stdout(io.StringIO()) as out:
+            cbz_to_pdf.convert_cbz_to_pdf("test.cbz", os.path.join(output_dir, "out.pdf"), compress=True,
+                                          progress_callback=lambda p, m: updates.append((p, m)))
+        self.assertEqual(out.getvalue(), "")
+        self.assertEqual(updates[0], (5, "Processing: test.cbz"))
+        self.assertEqual(updates[-1], (100, "Created: out.pdf"))
+        self.assertEqual(len(updates), len(set(updates)))
+
+    def test_verbose_prints_progress(self):
+        with tempfile.TemporaryDirectory() as output_dir, redirect_stdout(io.StringIO()) as out:
+            cbz_to_pdf.convert_cbz_to_pdf("test.cbz", os.path.join(output_dir, "out.pdf"), verbose=True)
+        self.assertIn("[100%] Created: out.pdf", out.getvalue())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,10 +2,10 @@ import os
 import shutil
 import tempfile
 from PySide6.QtWidgets import QApplication
-from worker import ConversionThread
+from worker import ConversionJob
 
-# Mock QApplication to avoid issues with QThread
-app = QApplication([])
+# Signals need a QApplication
+app = QApplication.instance() or QApplication([])
 
 def test_save_location():
     # Create a dummy CBZ file
@@ -15,7 +15,7 @@ def test_save_location():
     
     try:
         # Test 1: Default behavior (no output_dir)
-        thread = ConversionThread(input_path)
+        thread = ConversionJob(input_path)
         # We can't easily run the thread because it calls cbz_to_pdf which does real work.
         # But we can check the logic in run() by mocking or inspecting.
         # Actually, let's just check if the logic *would* produce the right path.
@@ -35,7 +35,7 @@ def test_save_location():
         cbz_to_pdf.convert_cbz_to_pdf = mock_convert
         
         # Test 1: Default
-        thread1 = ConversionThread(input_path)
+        thread1 = ConversionJob(input_path)
         thread1.run()
         expected_default = os.path.splitext(input_path)[0] + ".pdf"
         print(f"Test 1 (Default): Expected {expected_default}, Got {captured_output_paths[0]}")
@@ -43,7 +43,7 @@ def test_save_location():
         
         # Test 2: Custom output dir
         with tempfile.TemporaryDirectory() as output_dir:
-            thread2 = ConversionThread(input_path, output_dir=output_dir)
+            thread2 = ConversionJob(input_path, output_dir=output_dir)
             thread2.run()
             base_name = os.path.splitext(os.path.basename(input_path))[0]
             expected_custom = os.path.join(output_dir, base_name + ".pdf")
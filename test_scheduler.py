@@ -0,0 +1,94 @@
+import unittest
+import time
+import threading
+import scheduler
+from scheduler import JobScheduler
+from cancellation import CancelToken
+
+class TestJobScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = JobScheduler(1)
+        self.addCleanup(self.scheduler.shutdown, False)
+        # Holds the single slot until released so the queue order can be set up
+        self.release = threading.Event()
+        self.blocker = self.scheduler.submit(self.release.wait, 5, client="setup")
+
+    def test_clients_take_turns(self):
+        order = []
+        for i in range(4):
+            self.scheduler.submit(order.append, f"batch {i}", client="desktop")
+        self.scheduler.submit(order.append, "upload", client="web 10.0.0.2")
+        self.scheduler.submit(order.append, "other upload", client="web 10.0.0.3")
+        self.assertEqual(self.scheduler.pending, 6)
+        self.assertEqual(self.scheduler.queued("desktop"), 4)
+
+        self.release.set()
+        self.scheduler.shutdown(wait=True)
+        # One large batch doesn't hold back the single uploads queued after it
+        self.assertEqual(order, ["batch 0", "upload", "other upload", "batch 1", "batch 2", "batch 3"])
+        self.assertEqual((self.scheduler.pending, self.scheduler.active), (0, 0))
+
+    def test_results_and_errors(self):
+        ok = self.scheduler.submit(lambda a, b: a + b, 2, b=3)
+        failed = self.scheduler.submit(lambda: 1 / 0)
+        self.release.set()
+        self.assertEqual(ok.result(5), 5)
+        with self.assertRaises(ZeroDivisionError):
+            failed.result(5)
+
+    def test_cancel_waiting_job(self):
+        ran = []
+        future = self.scheduler.submit(ran.append, 1)
+        self.assertTrue(future.cancel())
+        self.release.set()
+        self.scheduler.submit(ran.append, 2).result(5)
+        self.assertEqual(ran, [2])
+        self.assertEqual(self.scheduler.pending, 0)
+
+    def test_cancel_all_stops_every_client(self):
+        tokens = [CancelToken() for _ in range(3)]
+        started = threading.Event()
+
+        def convert(token):
+            started.set()
+            while not token.cancelled:
+                time.sleep(0.01)
+            return "stopped"
+
+        # One running (after the blocker) and two waiting, from different frontends
+        self.release.set()
+        running = self.scheduler.submit(convert, tokens[0], client="web 10.0.0.2", cancel_token=tokens[0])
+        self.assertTrue(started.wait(5))
+        self.scheduler.submit(convert, tokens[1], client="watch", cancel_token=tokens[1])
+        self.scheduler.submit(convert, tokens[2], client="desktop", cancel_token=tokens[2])
+
+        self.scheduler.cancel_all()
+        self.assertEqual(running.result(5), "stopped")
+        self.assertTrue(all(token.cancelled for token in tokens))
+        self.scheduler.shutdown(wait=True)
+        self.assertEqual(self.scheduler.tokens, {})
+
+    def test_shutdown_without_wait_cancels_queue(self):
+        queued = [self.scheduler.submit(print, i) for i in range(3)]
+        self.scheduler.shutdown(wait=False)
+        self.release.set()
+        self.assertTrue(all(future.cancelled() for future in queued))
+        self.assertTrue(self.blocker.result(5))
+        self.assertEqual(self.scheduler.pending, 0)
+        with self.assertRaises(RuntimeError):
+            self.scheduler.submit(print, "late")
+
+class TestSharedScheduler(unittest.TestCase):
+    def test_frontends_share_one_pool(self):
+        from webapp import app as webapp
+        import cbz_converter_app
+        import watcher
+
+        shared = scheduler.get_scheduler()
+        self.assertIs(scheduler.get_scheduler(), shared)
+        self.assertIs(webapp.scheduler, shared)
+        self.assertIs(cbz_converter_app.get_scheduler(), shared)
+        self.assertIs(watcher.get_scheduler(), shared)
+
+if __name__ == '__main__':
+    unittest.main()
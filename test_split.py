@@ -0,0 +1,57 @@
+import unittest
+import os
+import re
+import zipfile
+import tempfile
+from PIL import Image
+import cbz_to_pdf
+import email_sender
+
+def count_pages(pdf_path):
+    with open(pdf_path, "rb") as f:
+        return len(re.findall(rb"/Type\s*/Page(?![a-zA-Z])", f.read()))
+
+class TestVolumeSplitting(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cbz = os.path.join(self.temp_dir.name, "book.cbz")
+        # Noise does not compress, so every page is roughly 60 KB of JPEG
+        with zipfile.ZipFile(self.cbz, "w") as archive:
+            for i in range(12):
+                path = os.path.join(self.temp_dir.name, f"page_{i:03d}.jpg")
+                Image.frombytes("RGB", (150, 150), os.urandom(150 * 150 * 3)).save(path, quality=95)
+                archive.write(path, os.path.basename(path))
+                os.remove(path)
+        self.pdf = os.path.join(self.temp_dir.name, "book.pdf")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_parts_fit_the_attachment_limit(self):
+        limit = 300 * 1024
+        stats = {}
+        cbz_to_pdf.convert_cbz_to_pdf(self.cbz, self.pdf, stats=stats, split_max_bytes=limit)
+
+        parts = stats['parts']
+        self.assertGreater(len(parts), 1)
+        self.assertEqual(os.path.basename(parts[0]), f"book (Part 1 of {len(parts)}).pdf")
+        for part in parts:
+            self.assertLessEqual(email_sender.encoded_size(os.path.getsize(part)),
+                                 limit - email_sender.MESSAGE_OVERHEAD)
+        # Every page lands in exactly one part, and the whole book is still written
+        self.assertEqual(sum(count_pages(part) for part in parts), 12)
+        self.assertEqual(count_pages(self.pdf), 12)
+
+    def test_no_parts_when_book_fits(self):
+        stats = {}
+        cbz_to_pdf.convert_cbz_to_pdf(self.cbz, self.pdf, stats=stats, split_max_bytes=25 * 1024 * 1024)
+        self.assertEqual(stats['parts'], [])
+        self.assertEqual(sorted(os.listdir(self.temp_dir.name)), ["book.cbz", "book.pdf"])
+
+    def test_plan_keeps_page_order(self):
+        groups = cbz_to_pdf.plan_parts([100_000] * 10, 600_000)
+        self.assertEqual([i for group in groups for i in group], list(range(10)))
+        self.assertTrue(all(groups))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+from unittest.mock import patch
+import io
+import os
+import time
+import shutil
+import zipfile
+import tempfile
+import threading
+from PIL import Image
+import thumbnails
+from webapp import app as webapp
+
+def jpeg_bytes(size, color):
+    data = io.BytesIO()
+    Image.new("RGB", size, color).save(data, "JPEG", quality=90)
+    return data.getvalue()
+
+class TestThumbnailService(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.cache_dir = os.path.join(self.temp_dir.name, "cache")
+        self.service = thumbnails.ThumbnailService(self.cache_dir)
+        self.addCleanup(self.service.executor.shutdown)
+
+    def make_cbz(self, name, pages):
+        path = os.path.join(self.temp_dir.name, name)
+        with zipfile.ZipFile(path, "w") as archive:
+            for member, data in pages:
+                archive.writestr(member, data)
+        return path
+
+    def test_first_page_scaled_down(self):
+        # Member order in the zip differs from page order
+        path = self.make_cbz("book.cbz", [
+            ("p002.jpg", jpeg_bytes((3000, 4500), (0, 0, 255))),
+            ("ComicInfo.xml", b"<ComicInfo/>"),
+            ("p001.jpg", jpeg_bytes((3000, 4500), (255, 0, 0))),
+        ])
+
+        started = time.perf_counter()
+        key, data = self.service.get(path)
+        elapsed = time.perf_counter() - started
+
+        self.assertLess(elapsed, 0.5)
+        with Image.open(io.BytesIO(data)) as thumb:
+            self.assertEqual(thumb.format, "JPEG")
+            self.assertLessEqual(thumb.width, thumbnails.THUMBNAIL_SIZE[0])
+            self.assertLessEqual(thumb.height, thumbnails.THUMBNAIL_SIZE[1])
+            red, green, blue = thumb.convert("RGB").getpixel((thumb.width // 2, thumb.height // 2))
+            self.assertGreater(red, 200)
+            self.assertLess(blue, 50)
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir, f"{key}.jpg")))
+
+    def test_cached_by_content(self):
+        pages = [("p001.jpg", jpeg_bytes((1200, 1800), (10, 200, 10)))]
+        first = self.make_cbz("one.cbz", pages)
+        copy = os.path.join(self.temp_dir.name, "renamed copy.cbz")
+        shutil.copy(first, copy)
+        other = self.make_cbz("other.cbz", [("p001.jpg", jpeg_bytes((1200, 1800), (0, 0, 0)))])
+
+        key, data = self.service.get(first)
+        with patch('thumbnails.render_thumbnail', side_effect=AssertionError("decoded again")):
+            self.assertEqual(self.service.get(copy), (key, data))
+            # A new service (next app start) finds it on disk
+            restarted = thumbnails.ThumbnailService(self.cache_dir)
+            self.addCleanup(restarted.executor.shutdown)
+            self.assertEqual(restarted.get(first), (key, data))
+        self.assertNotEqual(self.service.get(other)[0], key)
+
+    def test_archive_without_images(self):
+        path = self.make_cbz("empty.cbz", [("notes.txt", b"no pages")])
+        self.assertIsNone(self.service.get(path)[1])
+
+    def test_request_runs_in_background(self):
+        paths = [self.make_cbz(f"vol{i}.cbz", [("p001.jpg", jpeg_bytes((2000, 3000), (i, i, i)))])
+                 for i in range(20)]
+        paths.append(os.path.join(self.temp_dir.name, "missing.cbz"))
+        results = {}
+        done = threading.Event()
+
+        def callback(path, data):
+            results[path] = data
+            if len(results) == len(paths):
+                done.set()
+
+        for path in paths:
+            self.service.request(path, callback)
+        self.assertTrue(done.wait(10))
+        self.assertIsNone(results.pop(paths[-1]))
+        self.assertTrue(all(data.startswith(b"\xff\xd8") for data in results.values()))
+
+class TestThumbnailEndpoint(unittest.TestCase):
+    def setUp(self):
+        if not os.path.exists("test.cbz"):
+            self.skipTest("test.cbz not found. Run create_test_cbz.py first.")
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        service = thumbnails.ThumbnailService(os.path.join(self.temp_dir.name, "cache"))
+        self.addCleanup(service.executor.shutdown)
+        for patcher in (patch('thumbnails.get_service', return_value=service),
+                        patch('cbz_to_pdf.convert_cbz_to_pdf', return_value=False),
+                        patch.dict(webapp.app.config, {'UPLOAD_FOLDER': self.temp_dir.name,
+                                                       'OUTPUT_FOLDER': self.temp_dir.name})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        webapp.jobs_by_key.clear()
+        self.client = webapp.app.test_client()
+
+    def test_upload_has_thumbnail(self):
+        with open("test.cbz", "rb") as f:
+            response = self.client.post('/upload', data={'file': (f, "test.cbz")},
+                                        content_type='multipart/form-data')
+        task_id = response.get_json()['task_id']
+        task = self.client.get(f"/status/{task_id}").get_json()
+        self.assertTrue(task['thumbnail_url'].startswith("/thumbnail/"))
+
+        thumb = self.client.get(task['thumbnail_url'])
+        self.assertEqual(thumb.status_code, 200)
+        self.assertEqual(thumb.mimetype, "image/jpeg")
+        self.assertIn("immutable", thumb.headers['Cache-Control'])
+
+        # Let the (patched) conversion finish before the patch goes away
+        deadline = time.time() + 5
+        while webapp.tasks[task_id]['status'] == 'processing' and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_unknown_thumbnail(self):
+        self.assertEqual(self.client.get("/thumbnail/" + "0" * 64).status_code, 404)
+        self.assertEqual(self.client.get("/thumbnail/../../etc").status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
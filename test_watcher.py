@@ -0,0 +1,143 @@
+import unittest
+from unittest.mock import patch
+import os
+import time
+import zipfile
+import tempfile
+import watcher
+from scheduler import JobScheduler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestFolderWatcher(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.input_dir = os.path.join(self.temp_dir.name, "comics")
+        self.output_dir = os.path.join(self.temp_dir.name, "pdfs")
+        os.makedirs(os.path.join(self.input_dir, "series"))
+        self.db_path = os.path.join(self.temp_dir.name, "library.sqlite3")
+
+        self.converted = []
+
+        def fake_convert(input_path, pdf_path, **kwargs):
+            self.converted.append(os.path.relpath(input_path, self.input_dir))
+            with open(pdf_path, "wb") as f:
+                f.write(b"%PDF-1.4 fake")
+            return True
+
+        patcher = patch('cbz_to_pdf.convert_cbz_to_pdf', side_effect=fake_convert)
+        self.convert = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.scheduler = JobScheduler(2)
+        self.addCleanup(self.scheduler.shutdown)
+        self.clock = FakeClock()
+
+    def make_watcher(self):
+        return watcher.FolderWatcher([self.input_dir], self.output_dir, watcher.LibraryIndex(self.db_path),
+                                     self.scheduler, settle=2.0, clock=self.clock)
+
+    def make_cbz(self, relative, content=b"page"):
+        path = os.path.join(self.input_dir, relative)
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.writestr("page_000.jpg", content)
+        return path
+
+    def settle(self, folder_watcher):
+        """Two scans a settle period apart; returns the results of what was converted."""
+        folder_watcher.scan()
+        self.clock.now += 3
+        return sorted(future.result() for future in folder_watcher.scan())
+
+    def test_new_archives_converted_once(self):
+        self.make_cbz("one.cbz")
+        self.make_cbz(os.path.join("series", "two.cbz"))
+        folder_watcher = self.make_watcher()
+
+        self.assertEqual(self.settle(folder_watcher), ['converted', 'converted'])
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "one.pdf")))
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "series", "two.pdf")))
+        self.assertFalse([name for name in os.listdir(self.output_dir) if name.endswith(".part")])
+
+        # Rescans and a restart leave everything alone without reading the archives
+        self.assertEqual(self.settle(folder_watcher), [])
+        with patch('watcher.file_hash', side_effect=AssertionError("hashed again")):
+            self.assertEqual(self.settle(self.make_watcher()), [])
+        self.assertEqual(sorted(self.converted), ["one.cbz", os.path.join("series", "two.cbz")])
+
+    def test_waits_for_file_to_settle(self):
+        path = os.path.join(self.input_dir, "copying.cbz")
+        with open(path, "wb") as f:
+            f.write(b"PK\x03\x04 partial")
+        folder_watcher = self.make_watcher()
+        folder_watcher.scan()
+
+        # Still growing: the timer restarts
+        self.clock.now += 3
+        with open(path, "ab") as f:
+            f.write(b"more")
+        self.assertEqual(folder_watcher.scan(), [])
+        self.clock.now += 1
+        self.assertEqual(folder_watcher.scan(), [])
+
+        # Quiet for long enough but the zip directory isn't written yet
+        self.clock.now += 3
+        self.assertEqual(folder_watcher.scan(), [])
+
+        self.make_cbz("copying.cbz")
+        self.assertEqual(self.settle(folder_watcher), ['converted'])
+        self.assertEqual(self.converted, ["copying.cbz"])
+
+    def test_changed_content_converted_again(self):
+        path = self.make_cbz("one.cbz")
+        folder_watcher = self.make_watcher()
+        self.settle(folder_watcher)
+
+        # Touched but identical: hashed, not converted
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(self.settle(folder_watcher), ['unchanged'])
+
+        self.make_cbz("one.cbz", b"new page")
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10 ** 9))
+        self.assertEqual(self.settle(folder_watcher), ['converted'])
+        self.assertEqual(self.converted, ["one.cbz", "one.cbz"])
+
+        # Different options are a different library
+        other = watcher.FolderWatcher([self.input_dir], self.output_dir, watcher.LibraryIndex(self.db_path),
+                                      self.scheduler, compress=True, settle=2.0, clock=self.clock)
+        self.assertEqual(self.settle(other), ['converted'])
+
+    def test_failure_not_retried_until_changed(self):
+        self.convert.side_effect = ValueError("Invalid CBZ file.")
+        path = self.make_cbz("bad.cbz")
+        folder_watcher = self.make_watcher()
+
+        self.assertEqual(self.settle(folder_watcher), ['failed'])
+        self.assertEqual(self.settle(folder_watcher), [])
+        failed = folder_watcher.index.items('failed')
+        self.assertEqual([(item['path'], item['error']) for item in failed], [(path, "Invalid CBZ file.")])
+        self.assertEqual(os.listdir(self.output_dir), [])
+
+    def test_background_thread_stops(self):
+        self.make_cbz("one.cbz")
+        folder_watcher = watcher.FolderWatcher([self.input_dir], self.output_dir,
+                                               watcher.LibraryIndex(self.db_path), self.scheduler,
+                                               interval=0.05, settle=0.05)
+        folder_watcher.start()
+        output = os.path.join(self.output_dir, "one.pdf")
+        deadline = time.time() + 5
+        while not os.path.exists(output) and time.time() < deadline:
+            time.sleep(0.02)
+        folder_watcher.stop(5)
+
+        self.assertTrue(os.path.exists(output))
+        self.assertIsNone(folder_watcher.thread)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import time
+import socket
+import threading
+import http.client
+from web_server_thread import create_server
+
+class TestServingMode(unittest.TestCase):
+    def start(self, wsgi_app, **kwargs):
+        server = create_server('127.0.0.1', 0, wsgi_app, **kwargs)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+            thread.join(5)
+        self.addCleanup(stop)
+        return server.server_port
+
+    def test_slow_request_does_not_block_others(self):
+        slow_started = threading.Event()
+        release = threading.Event()
+
+        def wsgi_app(environ, start_response):
+            if environ['PATH_INFO'] == '/slow':
+                slow_started.set()
+                release.wait(5)
+            start_response('200 OK', [('Content-Type', 'text/plain'), ('Content-Length', '2')])
+            return [b'ok']
+
+        port = self.start(wsgi_app)
+        slow = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        threading.Thread(target=lambda: slow.request('GET', '/slow')).start()
+        self.assertTrue(slow_started.wait(5))
+
+        fast = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        fast.request('GET', '/fast')
+        self.assertEqual(fast.getresponse().read(), b'ok')
+
+        release.set()
+        self.assertEqual(slow.getresponse().read(), b'ok')
+        fast.close()
+        slow.close()
+
+    def test_idle_connection_is_dropped(self):
+        def wsgi_app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain'), ('Content-Length', '2')])
+            return [b'ok']
+
+        port = self.start(wsgi_app, max_connections=1, request_timeout=0.2)
+        idle = socket.create_connection(('127.0.0.1', port))
+        time.sleep(0.5)
+
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        conn.request('GET', '/')
+        self.assertEqual(conn.getresponse().status, 200)
+        conn.close()
+        idle.close()
+
+    def test_connections_over_limit_get_503(self):
+        def wsgi_app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain'), ('Content-Length', '2')])
+            return [b'ok']
+
+        port = self.start(wsgi_app, max_connections=1)
+        # An idle connection holds the only slot
+        holder = socket.create_connection(('127.0.0.1', port))
+        time.sleep(0.2)
+
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        conn.request('GET', '/')
+        response = conn.getresponse()
+        self.assertEqual(response.status, 503)
+        self.assertEqual(response.getheader('Retry-After'), '1')
+        conn.close()
+        holder.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+from unittest.mock import patch
+import io
+import time
+import zipfile
+import tempfile
+from webapp import app as webapp
+
+class TestBatchUpload(unittest.TestCase):
+    def setUp(self):
+        self.upload_dir = tempfile.TemporaryDirectory()
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.original_config = dict(webapp.app.config)
+        webapp.app.config['UPLOAD_FOLDER'] = self.upload_dir.name
+        webapp.app.config['OUTPUT_FOLDER'] = self.output_dir.name
+        webapp.tasks.clear()
+        webapp.jobs_by_key.clear()
+        webapp.batches.clear()
+
+        def fake_convert(input_path, output_path, **kwargs):
+            with open(input_path, "rb") as src, open(output_path, "wb") as dst:
+                dst.write(b"%PDF " + src.read())
+            return True
+
+        patcher = patch('cbz_to_pdf.convert_cbz_to_pdf', side_effect=fake_convert)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.client = webapp.app.test_client()
+
+    def tearDown(self):
+        webapp.app.config.update(self.original_config)
+        self.upload_dir.cleanup()
+        self.output_dir.cleanup()
+
+    def wait_for_batch(self, batch_id):
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            status = self.client.get(f"/batch_status/{batch_id}").get_json()
+            if status['status'] != 'processing':
+                return status
+            time.sleep(0.01)
+        self.fail("batch did not finish")
+
+    def test_many_files_in_one_request(self):
+        files = [(io.BytesIO(f"volume {i}".encode()), f"vol{i:02d}.cbz") for i in range(5)]
+        files.append((io.BytesIO(b"notes"), "readme.txt"))
+        response = self.client.post('/upload_batch', data={'files': files}, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(len(data['task_ids']), 5)
+
+        status = self.wait_for_batch(data['batch_id'])
+        self.assertEqual(status['counts'], {'processing': 0, 'completed': 5, 'failed': 0, 'cancelled': 0})
+        self.assertEqual(status['progress'], 100)
+
+        # Each PDF is still downloadable on its own
+        single = self.client.get(status['tasks'][0]['download_url'])
+        self.assertEqual(single.data, b"%PDF volume 0")
+        single.close()
+
+        bundle = self.client.get(status['download_url'])
+        self.assertEqual(bundle.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(bundle.data)) as archive:
+            self.assertEqual(sorted(archive.namelist()), [f"vol{i:02d}.pdf" for i in range(5)])
+            self.assertEqual(archive.read("vol03.pdf"), b"%PDF volume 3")
+
+    def test_zip_of_archives(self):
+        payload = io.BytesIO()
+        with zipfile.ZipFile(payload, 'w') as archive:
+            archive.writestr("series/a.cbz", b"first")
+            archive.writestr("series/b.cbz", b"second")
+            archive.writestr("series/cover.jpg", b"not a comic")
+        payload.seek(0)
+
+        response = self.client.post('/upload_batch', data={'files': [(payload, "series.zip")]},
+                                    content_type='multipart/form-data')
+        data = response.get_json()
+        self.assertEqual(len(data['task_ids']), 2)
+        status = self.wait_for_batch(data['batch_id'])
+        self.assertEqual(sorted(t['filename'] for t in status['tasks']), ["a.pdf", "b.pdf"])
+
+    def test_bad_zip_rejects_batch_before_converting(self):
+        payload = io.BytesIO()
+        with zipfile.ZipFile(payload, 'w') as archive:
+            archive.writestr("a.cbz", b"first")
+        payload.seek(0)
+        files = [(io.BytesIO(b"volume"), "vol.cbz"), (payload, "good.zip"), (io.BytesIO(b"junk"), "bad.zip")]
+
+        with patch.object(webapp.scheduler, 'submit') as submit:
+            response = self.client.post('/upload_batch', data={'files': files}, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("bad.zip", response.get_json()['error'])
+        submit.assert_not_called()
+        self.assertEqual(webapp.tasks, {})
+
+    def test_status_of_batch_without_results(self):
+        for result, expected in (('failed', 'failed'), ('cancelled', 'cancelled')):
+            webapp.tasks.update({
+                'a': {'status': 'cancelled', 'progress': 0},
+                'b': {'status': result, 'progress': 0},
+            })
+            webapp.batches['batch'] = ['a', 'b']
+            status = self.client.get("/batch_status/batch").get_json()
+            self.assertEqual(status['status'], expected)
+            self.assertIsNone(status['download_url'])
+
+    def test_rejects_batch_without_archives(self):
+        response = self.client.post('/upload_batch', data={'files': [(io.BytesIO(b"x"), "a.txt")]},
+                                    content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get("/batch_status/unknown").status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
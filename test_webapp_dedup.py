@@ -0,0 +1,128 @@
+import unittest
+from unittest.mock import patch
+import io
+import os
+import time
+import tempfile
+import threading
+from webapp import app as webapp
+
+class TestUploadDedup(unittest.TestCase):
+    def setUp(self):
+        self.upload_dir = tempfile.TemporaryDirectory()
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.original_config = dict(webapp.app.config)
+        webapp.app.config['UPLOAD_FOLDER'] = self.upload_dir.name
+        webapp.app.config['OUTPUT_FOLDER'] = self.output_dir.name
+        webapp.tasks.clear()
+        webapp.jobs_by_key.clear()
+
+        self.release = threading.Event()
+        self.conversions = []
+        self.presets = []
+        self.jpeg2000 = []
+        self.splits = []
+
+        def fake_convert(input_path, output_path, **kwargs):
+            self.conversions.append(input_path)
+            self.presets.append(kwargs.get('preset'))
+            self.jpeg2000.append(kwargs.get('jpeg2000'))
+            self.splits.append(kwargs.get('split_max_bytes'))
+            self.release.wait(5)
+            with open(output_path, "wb") as f:
+                f.write(b"%PDF-1.4 fake")
+            return True
+
+        patcher = patch('cbz_to_pdf.convert_cbz_to_pdf', side_effect=fake_convert)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.client = webapp.app.test_client()
+
+    def tearDown(self):
+        self.release.set()
+        webapp.app.config.update(self.original_config)
+        self.upload_dir.cleanup()
+        self.output_dir.cleanup()
+
+    def upload(self, content, name="book.cbz", **form):
+        data = {'file': (io.BytesIO(content), name)}
+        data.update(form)
+        response = self.client.post('/upload', data=data, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def wait_for(self, task_id):
+        deadline = time.time() + 5
+        while webapp.tasks[task_id]['status'] == 'processing' and time.time() < deadline:
+            time.sleep(0.01)
+        return webapp.tasks[task_id]
+
+    def test_concurrent_duplicate_attaches_to_running_task(self):
+        first = self.upload(b"same volume")
+        second = self.upload(b"same volume", name="copy.cbz")
+
+        self.assertEqual(second['task_id'], first['task_id'])
+        self.assertTrue(second['deduplicated'])
+
+        self.release.set()
+        self.assertEqual(self.wait_for(first['task_id'])['status'], 'completed')
+        self.assertEqual(len(self.conversions), 1)
+        # The duplicate's upload is dropped straight away, the original after converting
+        self.assertEqual(os.listdir(self.upload_dir.name), [])
+
+    def test_completed_duplicate_is_served_without_converting(self):
+        self.release.set()
+        first = self.upload(b"same volume")
+        done = self.wait_for(first['task_id'])
+
+        second = self.upload(b"same volume")
+        self.assertNotEqual(second['task_id'], first['task_id'])
+        task = webapp.tasks[second['task_id']]
+        self.assertEqual(task['status'], 'completed')
+        self.assertEqual(task['download_url'], done['download_url'])
+        self.assertEqual(len(self.conversions), 1)
+
+    def test_different_content_or_options_convert_separately(self):
+        self.release.set()
+        first = self.upload(b"volume one")
+        second = self.upload(b"volume two")
+        third = self.upload(b"volume one", compress='true')
+        fourth = self.upload(b"volume one", preset='fast')
+        # Unknown presets fall back to the default, which is the first upload's
+        fifth = self.upload(b"volume one", preset='bogus')
+
+        for task_id in (first['task_id'], second['task_id'], third['task_id'], fourth['task_id']):
+            self.wait_for(task_id)
+        self.assertEqual(len(self.conversions), 4)
+        self.assertNotIn('deduplicated', third)
+        self.assertNotIn('deduplicated', fourth)
+        self.assertTrue(fifth['deduplicated'])
+        self.assertEqual(sorted(self.presets), ['balanced', 'balanced', 'balanced', 'fast'])
+
+    def test_kindle_upload_does_not_reuse_unsplit_pdf(self):
+        self.release.set()
+        config = {'smtp_server': 'smtp.gmail.com', 'kindle_email': 'me@kindle.com'}
+        with patch.object(webapp, 'load_email_config', return_value=config), \
+                patch.object(webapp, 'deliver_to_kindle', return_value='Sending...'):
+            plain = self.upload(b"volume one")
+            self.wait_for(plain['task_id'])
+            kindle = self.upload(b"volume one", kindle='true')
+            self.wait_for(kindle['task_id'])
+            again = self.upload(b"volume one", kindle='true')
+
+        # The Kindle copy is converted with parts; later Kindle uploads reuse that one
+        self.assertNotIn('deduplicated', kindle)
+        self.assertTrue(again['deduplicated'])
+        self.assertEqual(self.splits, [None, webapp.email_sender.GMAIL_LIMIT])
+
+    def test_jpeg2000_only_with_size_limit(self):
+        self.release.set()
+        limited = self.upload(b"volume one", max_size_mb='25', jpeg2000='true')
+        unlimited = self.upload(b"volume one", jpeg2000='true')
+        for task_id in (limited['task_id'], unlimited['task_id']):
+            self.wait_for(task_id)
+        self.assertEqual(sorted(self.jpeg2000), [False, True])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import os
+import tempfile
+import hashlib
+from webapp.app import app
+
+class TestDownload(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.original_output = app.config['OUTPUT_FOLDER']
+        app.config['OUTPUT_FOLDER'] = self.output_dir.name
+
+        self.content = bytes(range(256)) * 64
+        self.filename = "1234_book.pdf"
+        with open(os.path.join(self.output_dir.name, self.filename), "wb") as f:
+            f.write(self.content)
+
+        self.client = app.test_client()
+
+    def tearDown(self):
+        app.config['OUTPUT_FOLDER'] = self.original_output
+        self.output_dir.cleanup()
+
+    def test_full_download_has_content_etag(self):
+        response = self.client.get(f"/download/{self.filename}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, self.content)
+        self.assertEqual(response.headers['ETag'], f'"{hashlib.sha256(self.content).hexdigest()}"')
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        self.assertIn('filename=book.pdf', response.headers['Content-Disposition'])
+        response.close()
+
+    def test_range_resume(self):
+        response = self.client.get(f"/download/{self.filename}", headers={'Range': 'bytes=1000-'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, self.content[1000:])
+        response.close()
+
+    def test_if_none_match_returns_not_modified(self):
+        etag = self.client.get(f"/download/{self.filename}").headers['ETag']
+        response = self.client.get(f"/download/{self.filename}", headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+
+    def test_stale_if_range_sends_whole_file(self):
+        response = self.client.get(f"/download/{self.filename}",
+                                   headers={'Range': 'bytes=1000-', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, self.content)
+        response.close()
+
+    def test_missing_and_traversal(self):
+        self.assertEqual(self.client.get("/download/0000_missing.pdf").status_code, 404)
+        self.assertEqual(self.client.get("/download/..%2Fapp.py").status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
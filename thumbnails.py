@@ -0,0 +1,134 @@
+import io
+import os
+import hashlib
+import zipfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from cbz_to_pdf import is_image
+
+# Bounding box of a thumbnail, portrait like a comic page
+THUMBNAIL_SIZE = (160, 240)
+
+def default_cache_dir():
+    return os.path.join(os.path.expanduser("~"), ".cbztopdf", "thumbnails")
+
+def archive_key(archive):
+    """
+    Content key of an open ZipFile: a hash of its central directory (names,
+    CRC-32s and sizes of every member). Identical archives share a key, any
+    change to a page changes it, and nothing beyond the directory is read.
+    """
+    digest = hashlib.sha256()
+    for member in archive.infolist():
+        digest.update(f"{member.filename}\0{member.CRC:08x}\0{member.file_size}\n".encode("utf-8", "surrogateescape"))
+    return digest.hexdigest()
+
+def first_image(archive):
+    """The member the engine would put on page 1, or None."""
+    names = sorted(member.filename for member in archive.infolist()
+                   if not member.is_dir() and is_image(member.filename))
+    return names[0] if names else None
+
+def render_thumbnail(data, size=THUMBNAIL_SIZE):
+    """JPEG bytes of an image scaled to fit size, decoding as little of it as possible."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        # JPEG pages decode straight at 1/2, 1/4 or 1/8 scale
+        img.draft("RGB", size)
+        img = img.convert("RGB")
+        # reducing_gap lets other formats shrink by whole factors before resampling
+        img.thumbnail(size, reducing_gap=2.0)
+        out = io.BytesIO()
+        img.save(out, "JPEG", quality=80)
+        return out.getvalue()
+
+class ThumbnailService:
+    """
+    Cover thumbnails for CBZ archives, cached by archive content.
+
+    Only the zip directory and the first image member are read; nothing is
+    extracted. Results are kept in memory (the most recent memory_items) and
+    as <key>.jpg files in cache_dir, so the same archive costs one directory
+    read after the first time, across restarts. request() works on a small
+    pool of its own so previews never take conversion slots.
+    """
+
+    def __init__(self, cache_dir, size=THUMBNAIL_SIZE, workers=2, memory_items=256):
+        self.cache_dir = cache_dir
+        self.size = size
+        self.memory_items = memory_items
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def cache_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.jpg")
+
+    def cached(self, key):
+        """Thumbnail bytes for a key if already made, else None."""
+        with self.lock:
+            data = self.memory.get(key)
+            if data is not None:
+                self.memory.move_to_end(key)
+                return data
+        try:
+            with open(self.cache_path(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        self.remember(key, data)
+        return data
+
+    def remember(self, key, data):
+        with self.lock:
+            self.memory[key] = data
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_items:
+                self.memory.popitem(last=False)
+
+    def get(self, archive_path):
+        """Returns (key, JPEG bytes) for an archive, or (key, None) if it has no images."""
+        with zipfile.ZipFile(archive_path) as archive:
+            key = archive_key(archive)
+            data = self.cached(key)
+            if data is not None:
+                return key, data
+            member = first_image(archive)
+            if member is None:
+                return key, None
+            data = render_thumbnail(archive.read(member), self.size)
+
+        # Write then rename, so a reader never sees half a file
+        temp_path = self.cache_path(key) + f".{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, self.cache_path(key))
+        self.remember(key, data)
+        return key, data
+
+    def request(self, archive_path, callback):
+        """
+        Makes the thumbnail in the background and calls callback(archive_path,
+        data) on a pool thread. data is None for archives that cannot be read.
+        """
+        def run():
+            try:
+                _, data = self.get(archive_path)
+            except Exception:
+                data = None
+            callback(archive_path, data)
+        return self.executor.submit(run)
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_service():
+    """Returns the process-wide thumbnail service, shared by the GUI and the web server."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ThumbnailService(default_cache_dir())
+        return _service
@@ -1,5 +1,6 @@
 from PySide6.QtWidgets import (QLabel, QDialog, QFormLayout, QLineEdit, 
-                               QDialogButtonBox, QVBoxLayout, QFileDialog)
+                               QDialogButtonBox, QVBoxLayout, QFileDialog,
+                               QWidget, QHBoxLayout, QProgressBar)
 from PySide6.QtCore import Qt, Signal, QSettings
 from PySide6.QtGui import QDragEnterEvent, QDropEvent, QMouseEvent
 
@@ -53,6 +54,46 @@ class DropZone(QLabel):
             if f.lower().endswith(('.cbz', '.cbr')):
                 self.file_dropped.emit(f)
 
+class QueueItemWidget(QWidget):
+    """Name, status line and progress bar shown in the queue for an item being converted."""
+
+    def __init__(self, name, parent=None):
+        super().__init__(parent)
+        outer_layout = QHBoxLayout(self)
+        outer_layout.setContentsMargins(6, 4, 6, 4)
+        self.thumbnail_label = QLabel()
+        self.thumbnail_label.setFixedSize(32, 48)
+        self.thumbnail_label.hide()
+        outer_layout.addWidget(self.thumbnail_label)
+
+        layout = QVBoxLayout()
+        layout.setSpacing(2)
+        outer_layout.addLayout(layout)
+
+        top_layout = QHBoxLayout()
+        self.name_label = QLabel(name)
+        self.name_label.setStyleSheet("font-weight: bold;")
+        self.status_label = QLabel("Waiting...")
+        self.status_label.setStyleSheet("color: #888;")
+        top_layout.addWidget(self.name_label)
+        top_layout.addStretch()
+        top_layout.addWidget(self.status_label)
+        layout.addLayout(top_layout)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setValue(0)
+        self.progress_bar.setTextVisible(True)
+        layout.addWidget(self.progress_bar)
+
+    def set_thumbnail(self, pixmap):
+        self.thumbnail_label.setPixmap(pixmap.scaled(self.thumbnail_label.size(), Qt.AspectRatioMode.KeepAspectRatio,
+                                                     Qt.TransformationMode.SmoothTransformation))
+        self.thumbnail_label.show()
+
+    def set_progress(self, percentage, message):
+        self.progress_bar.setValue(percentage)
+        self.status_label.setText(message)
+
 class EmailConfigDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
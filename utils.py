@@ -10,3 +10,19 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
 
     return os.path.join(base_path, relative_path)
+
+def load_email_config():
+    """ Email settings saved by the desktop app, or None if they are incomplete """
+    from PySide6.QtCore import QSettings
+
+    settings = QSettings("Antigravity", "CBZtoPDF")
+    config = {
+        'sender': settings.value("sender_email", ""),
+        'password': settings.value("sender_password", ""),
+        'kindle_email': settings.value("kindle_email", ""),
+        'smtp_server': settings.value("smtp_server", "smtp.gmail.com"),
+        'smtp_port': settings.value("smtp_port", "587")
+    }
+    if not config['sender'] or not config['password'] or not config['kindle_email']:
+        return None
+    return config
@@ -0,0 +1,352 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import zipfile
+import argparse
+import threading
+from contextlib import contextmanager
+import cbz_to_pdf
+import metrics
+from cancellation import CancelToken, ConversionCancelled
+from scheduler import JobScheduler, get_scheduler
+
+WATCH_CONVERSIONS = metrics.counter('cbz_watch_conversions_total',
+                                    'Archives found by the folder watcher, by result.', ('result',))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS library (
+    path TEXT NOT NULL,
+    options TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    output_path TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (path, options)
+)
+"""
+
+def default_path():
+    return os.path.join(os.path.expanduser("~"), ".cbztopdf", "library.sqlite3")
+
+def options_key(compress=False, max_size_mb=None, preset=cbz_to_pdf.DEFAULT_PRESET, jpeg2000=False,
+                auto_crop=False, linearize=False, compact=False):
+    """The conversion options as a stable string, stored with every index row."""
+    return json.dumps({'compress': bool(compress), 'max_size_mb': max_size_mb, 'preset': preset,
+                       'jpeg2000': bool(jpeg2000), 'auto_crop': bool(auto_crop), 'linearize': bool(linearize),
+                       'compact': bool(compact)}, sort_keys=True)
+
+def file_hash(path):
+    """SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def is_complete_archive(path):
+    """
+    True once a zip's central directory is readable. It is written last, so a
+    copy still in progress fails this even when its size stops changing for a
+    moment.
+    """
+    try:
+        with zipfile.ZipFile(path):
+            return True
+    except (OSError, zipfile.BadZipFile):
+        return False
+
+class LibraryIndex:
+    """
+    What the watcher has already converted, in a SQLite file.
+
+    One row per (archive path, options) with the size, mtime and content hash
+    the archive had when it was converted, and the PDF it produced. Rows with
+    status 'failed' keep their error and are not retried until the archive
+    changes.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self.connect() as db:
+            db.execute(SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        """One transaction on a short-lived connection, so any thread can use it."""
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def get(self, path, options):
+        """Returns the row for an archive as a dict, or None."""
+        with self.connect() as db:
+            row = db.execute("SELECT * FROM library WHERE path = ? AND options = ?", (path, options)).fetchone()
+        return dict(row) if row else None
+
+    def signatures(self, options):
+        """{path: (size, mtime_ns)} of every indexed archive, for one query per scan."""
+        with self.connect() as db:
+            rows = db.execute("SELECT path, size, mtime_ns FROM library WHERE options = ?", (options,)).fetchall()
+        return {row['path']: (row['size'], row['mtime_ns']) for row in rows}
+
+    def record(self, path, options, size, mtime_ns, content_hash, output_path, status, error=None):
+        with self.connect() as db:
+            db.execute("INSERT OR REPLACE INTO library (path, options, size, mtime_ns, content_hash, output_path, "
+                       "status, error, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (path, options, size, mtime_ns, content_hash, output_path, status, error, time.time()))
+
+    def items(self, status=None):
+        with self.connect() as db:
+            if status:
+                rows = db.execute("SELECT * FROM library WHERE status = ? ORDER BY path", (status,)).fetchall()
+            else:
+                rows = db.execute("SELECT * FROM library ORDER BY path").fetchall()
+        return [dict(row) for row in rows]
+
+class FolderWatcher:
+    """
+    Keeps a folder of PDFs in sync with one or more folders of CBZ archives.
+
+    Every interval seconds the input folders are listed (a stat per file, no
+    reads). A new or changed archive is only converted once its size and
+    mtime have held still for settle seconds and its zip directory is
+    readable, so files still being copied in are left alone. Archives whose
+    size and mtime match the index are skipped without opening them; ones
+    that were merely touched are hashed and skipped if the content is the
+    same. Conversions run on the given JobScheduler (by default the
+    process-wide one) as client "watch".
+
+    Outputs mirror the input tree under output_dir (under a folder named
+    after each input folder when there are several) and are written under a
+    temporary name first, so a synced library never holds half a PDF.
+    """
+
+    def __init__(self, input_dirs, output_dir, index, scheduler=None, compress=False, max_size_mb=None,
+                 preset=cbz_to_pdf.DEFAULT_PRESET, jpeg2000=False, auto_crop=False, linearize=False,
+                 compact=False, interval=5.0, settle=2.0, clock=time.monotonic):
+        self.input_dirs = [os.path.abspath(path) for path in input_dirs]
+        self.output_dir = os.path.abspath(output_dir)
+        self.index = index
+        self.scheduler = scheduler or get_scheduler()
+        self.compress = compress
+        self.max_size_mb = max_size_mb
+        self.preset = preset
+        self.jpeg2000 = jpeg2000
+        self.auto_crop = auto_crop
+        self.linearize = linearize
+        self.compact = compact
+        self.options = options_key(compress, max_size_mb, preset, jpeg2000, auto_crop, linearize, compact)
+        self.interval = interval
+        self.settle = settle
+        self.clock = clock
+        self.lock = threading.Lock()
+        # path -> ((size, mtime_ns), time that signature was first seen)
+        self.candidates = {}
+        # path -> CancelToken of conversions submitted and not yet finished
+        self.in_flight = {}
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.thread = None
+
+    def output_path(self, archive_path):
+        for root in self.input_dirs:
+            if os.path.commonpath([root, archive_path]) == root:
+                relative = os.path.relpath(archive_path, root)
+                if len(self.input_dirs) > 1:
+                    relative = os.path.join(os.path.basename(root), relative)
+                return os.path.join(self.output_dir, os.path.splitext(relative)[0] + ".pdf")
+        raise ValueError(f"Not in a watched folder: {archive_path}")
+
+    def list_archives(self):
+        """{path: (size, mtime_ns)} of every CBZ under the input folders."""
+        found = {}
+        stack = list(self.input_dirs)
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            stack.append(entry.path)
+                        elif entry.name.lower().endswith('.cbz') and not entry.name.startswith('.'):
+                            stat = entry.stat()
+                            found[entry.path] = (stat.st_size, stat.st_mtime_ns)
+                    except OSError:
+                        # Deleted between listing and stat
+                        continue
+        return found
+
+    def scan(self):
+        """
+        Lists the input folders once and submits every archive that is new or
+        changed and has settled. Returns the Futures submitted.
+        """
+        now = self.clock()
+        found = self.list_archives()
+        indexed = self.index.signatures(self.options)
+        submitted = []
+        with self.lock:
+            for path in list(self.candidates):
+                if path not in found:
+                    del self.candidates[path]
+            for path, signature in found.items():
+                if path in self.in_flight or indexed.get(path) == signature:
+                    continue
+                seen = self.candidates.get(path)
+                if seen is None or seen[0] != signature:
+                    # New, or still growing: wait for it to hold still
+                    self.candidates[path] = (signature, now)
+                    continue
+                if now - seen[1] < self.settle or not is_complete_archive(path):
+                    continue
+                del self.candidates[path]
+                token = CancelToken()
+                self.in_flight[path] = token
+                submitted.append(self.scheduler.submit(self.process, path, signature, token, client="watch",
+                                                         cancel_token=token))
+        return submitted
+
+    def process(self, path, signature, cancel_token):
+        """Converts one archive unless its content is unchanged since the last conversion."""
+        size, mtime_ns = signature
+        output_path = self.output_path(path)
+        content_hash = ""
+        try:
+            content_hash = file_hash(path)
+            previous = self.index.get(path, self.options)
+            if (previous and previous['content_hash'] == content_hash and previous['status'] == 'done'
+                    and os.path.exists(previous['output_path'])):
+                # Touched or copied over with the same bytes
+                self.index.record(path, self.options, size, mtime_ns, content_hash,
+                                  previous['output_path'], 'done')
+                WATCH_CONVERSIONS.inc(result='unchanged')
+                return 'unchanged'
+
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            temp_path = output_path + ".part"
+            try:
+                success = cbz_to_pdf.convert_cbz_to_pdf(path, temp_path, compress=self.compress,
+                                                        max_size_mb=self.max_size_mb, preset=self.preset,
+                                                        jpeg2000=self.jpeg2000, auto_crop=self.auto_crop,
+                                                        linearize=self.linearize, compact=self.compact,
+                                                        deterministic=True,
+                                                        cancel_token=cancel_token)
+                if success:
+                    os.replace(temp_path, output_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+            if not success:
+                raise ValueError("Conversion failed.")
+            self.index.record(path, self.options, size, mtime_ns, content_hash, output_path, 'done')
+            WATCH_CONVERSIONS.inc(result='converted')
+            return 'converted'
+        except ConversionCancelled:
+            # Not recorded, so the next run picks it up again
+            WATCH_CONVERSIONS.inc(result='cancelled')
+            return 'cancelled'
+        except Exception as e:
+            self.index.record(path, self.options, size, mtime_ns, content_hash, None, 'failed', str(e))
+            WATCH_CONVERSIONS.inc(result='failed')
+            return 'failed'
+        finally:
+            with self.lock:
+                self.in_flight.pop(path, None)
+
+    def run(self):
+        while not self.stopping:
+            try:
+                self.scan()
+            except Exception as e:
+                print(f"Scan failed: {e}")
+            # Come back sooner while something is settling; otherwise sleep the full interval
+            with self.lock:
+                settling = bool(self.candidates)
+            self.wakeup.wait(min(self.interval, self.settle) if settling else self.interval)
+            self.wakeup.clear()
+
+    def start(self):
+        if self.thread is None:
+            self.stopping = False
+            self.thread = threading.Thread(target=self.run, name="folder-watcher", daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=None):
+        """Stops scanning and cancels conversions still running."""
+        self.stopping = True
+        self.wakeup.set()
+        with self.lock:
+            tokens = list(self.in_flight.values())
+        for token in tokens:
+            token.cancel()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Converts CBZ archives as they appear in watched folders.")
+    parser.add_argument("input_dirs", nargs="+", help="Folders to watch (subfolders included)")
+    parser.add_argument("-o", "--output", required=True, help="Folder the PDFs are written to")
+    parser.add_argument("--compress", action="store_true", help="Re-encode pages as JPEG")
+    parser.add_argument("--max-size", type=int, help="Target maximum PDF size in MB")
+    parser.add_argument("--preset", choices=sorted(cbz_to_pdf.ENCODER_PRESETS), default=cbz_to_pdf.DEFAULT_PRESET,
+                        help="Encoder speed/size trade-off for re-encoded pages")
+    parser.add_argument("--auto-crop", action="store_true", help="Trim plain white or black page margins")
+    parser.add_argument("--linearize", action="store_true", help="Write fast web view (linearized) PDFs")
+    parser.add_argument("--compact-pdf", action="store_true",
+                        help="Write object and xref streams (smaller, faster to open for long books)")
+    parser.add_argument("--jpeg2000", action="store_true",
+                        help="Meet --max-size with JPEG 2000 pages at full resolution instead of smaller JPEGs")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between folder scans")
+    parser.add_argument("--settle", type=float, default=2.0, help="Seconds a file must stay unchanged before converting")
+    parser.add_argument("--workers", type=int, help="Conversions run at once (default: from cores and memory)")
+    parser.add_argument("--index", default=default_path(), help="Library index file")
+    parser.add_argument("--once", action="store_true", help="Convert what is there now and exit")
+    args = parser.parse_args()
+
+    scheduler = JobScheduler(args.workers)
+    watcher = FolderWatcher(args.input_dirs, args.output, LibraryIndex(args.index), scheduler,
+                            compress=args.compress, max_size_mb=args.max_size, preset=args.preset,
+                            jpeg2000=args.jpeg2000, auto_crop=args.auto_crop,
+                            linearize=args.linearize, compact=args.compact_pdf,
+                            interval=args.interval, settle=args.settle)
+    try:
+        if args.once:
+            # Two scans a settle period apart: the first only notes what is there
+            watcher.scan()
+            time.sleep(args.settle)
+            results = [future.result() for future in watcher.scan()]
+            print(", ".join(f"{results.count(result)} {result}"
+                            for result in ('converted', 'unchanged', 'failed')))
+        else:
+            print(f"Watching {', '.join(watcher.input_dirs)} (Ctrl+C to stop)")
+            watcher.start()
+            while watcher.thread.is_alive():
+                watcher.thread.join(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+        scheduler.shutdown()
+    failed = watcher.index.items('failed')
+    for item in failed:
+        print(f"Failed: {item['path']}: {item['error']}", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
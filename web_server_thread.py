@@ -1,7 +1,7 @@
 import sys
 import os
 from PySide6.QtCore import QThread, Signal
-from werkzeug.serving import make_server
+from werkzeug.serving import ThreadedWSGIServer, BaseWSGIServer, WSGIRequestHandler
 import threading
 
 # Add the webapp directory to python path if needed, 
@@ -20,15 +20,67 @@ except ImportError:
     sys.path.append(os.path.abspath("webapp"))
     from app import app
 
+class BoundedThreadedWSGIServer(ThreadedWSGIServer):
+    """Thread-per-connection server that turns away connections beyond a limit.
+
+    Connections over max_connections get an immediate 503 instead of queueing
+    behind slow uploads, so the accept loop (and shutdown) never blocks.
+    """
+
+    def __init__(self, host, port, app, handler=None, max_connections=64, request_queue_size=128):
+        self.request_queue_size = request_queue_size
+        self.connection_slots = threading.BoundedSemaphore(max_connections)
+        super().__init__(host, port, app, handler=handler)
+
+    def process_request(self, request, client_address):
+        if not self.connection_slots.acquire(blocking=False):
+            try:
+                request.sendall(b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 1\r\n"
+                                b"Content-Length: 0\r\nConnection: close\r\n\r\n")
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self.connection_slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.connection_slots.release()
+
+def create_server(host, port, wsgi_app, threaded=True, max_connections=64, request_timeout=60):
+    """Builds the WSGI server used by WebServerThread.
+
+    Job state lives in this process (webapp.app.tasks), so concurrency comes from
+    threads rather than forked workers. A connection that sends nothing for
+    request_timeout seconds is dropped so stalled clients cannot pin a slot.
+    Werkzeug closes every connection after its response; HTTP keep-alive would
+    need a server that can drain request bodies safely.
+    """
+    handler = type("TimedRequestHandler", (WSGIRequestHandler,), {"timeout": request_timeout})
+
+    if threaded:
+        return BoundedThreadedWSGIServer(host, port, wsgi_app, handler=handler,
+                                         max_connections=max_connections)
+    return BaseWSGIServer(host, port, wsgi_app, handler=handler)
+
 class WebServerThread(QThread):
     server_started = Signal(str)  # Emits URL when started
     server_stopped = Signal()
     error_occurred = Signal(str)
 
-    def __init__(self, host='0.0.0.0', port=5000):
+    def __init__(self, host='0.0.0.0', port=5000, threaded=True, max_connections=64, request_timeout=60):
         super().__init__()
         self.host = host
         self.port = port
+        self.threaded = threaded
+        self.max_connections = max_connections
+        self.request_timeout = request_timeout
         self.server = None
         self.ctx = None
         self.is_running = False
@@ -37,7 +89,9 @@ class WebServerThread(QThread):
         try:
             # Use werkzeug's make_server to have control over the server loop
             # This allows us to shutdown the server cleanly
-            self.server = make_server(self.host, self.port, app)
+            self.server = create_server(self.host, self.port, app, threaded=self.threaded,
+                                        max_connections=self.max_connections,
+                                        request_timeout=self.request_timeout)
             self.ctx = app.app_context()
             self.ctx.push()
             
@@ -52,6 +106,9 @@ class WebServerThread(QThread):
         except Exception as e:
             self.error_occurred.emit(str(e))
         finally:
+            if self.server:
+                # Release the listening socket so the server can be restarted right away
+                self.server.server_close()
             self.is_running = False
             self.server_stopped.emit()
 
@@ -1,21 +1,31 @@
 import os
 import sys
+import time
 import uuid
+import hashlib
+import zipfile
 import threading
-from flask import Flask, render_template, request, jsonify, send_from_directory, current_app
-from PySide6.QtCore import QSettings
+from flask import Flask, Response, render_template, request, jsonify, send_file, abort, stream_with_context, current_app
+from werkzeug.security import safe_join
 
 # Add parent directory to path to import cbz_to_pdf
 # Add parent directory to path to import cbz_to_pdf
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import cbz_to_pdf
 import email_sender
-from utils import resource_path
+import metrics
+import outbox
+import thumbnails
+from cancellation import CancelToken, ConversionCancelled
+from scheduler import get_scheduler
+from utils import resource_path, load_email_config
 
 app = Flask(__name__, template_folder=resource_path(os.path.join("webapp", "templates")))
 app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 app.config['OUTPUT_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'downloads')
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB limit
+# Let a fronting nginx/Apache stream downloads itself (X-Sendfile) instead of Python
+app.config['USE_X_SENDFILE'] = os.environ.get('CBZ_USE_X_SENDFILE', '').lower() in ['1', 'true', 'on']
 
 # Ensure directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -23,68 +33,195 @@ os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 
 # Store task status in memory (for simplicity)
 tasks = {}
+# Batch id -> task ids of the files uploaded together
+batches = {}
+# Task id -> CancelToken of conversions not yet finished
+cancel_tokens = {}
+# Task id -> number of uploads sharing that running conversion
+attachments = {}
 
-def conversion_worker(task_id, input_path, output_path, compress, max_size_mb, send_to_kindle):
+# Conversions queue here instead of each starting its own thread, so a
+# 40-volume batch runs a few at a time. The pool is the process-wide one:
+# inside the desktop app it is shared with the local queue.
+scheduler = get_scheduler()
+
+CONVERSIONS = metrics.counter('cbz_conversions_total', 'Finished conversions by mode and result.', ('mode', 'result'))
+CONVERSION_SECONDS = metrics.histogram('cbz_conversion_seconds', 'Wall time of successful conversions.', ('mode',))
+PAGES = metrics.counter('cbz_pages_converted_total', 'Pages written to PDFs; rate() gives pages per second.')
+BYTES_IN = metrics.counter('cbz_input_bytes_total', 'Archive bytes converted.')
+BYTES_OUT = metrics.counter('cbz_output_bytes_total', 'PDF bytes produced.')
+UPLOAD_CACHE = metrics.counter('cbz_upload_cache_total', 'Uploads reusing an existing job (hit) or converted (miss).', ('result',))
+ETAG_CACHE = metrics.counter('cbz_etag_cache_total', 'Download ETag lookups served from cache (hit) or hashed (miss).', ('result',))
+metrics.gauge('cbz_queue_depth', 'Conversions waiting for a worker.', function=lambda: scheduler.pending)
+metrics.gauge('cbz_active_workers', 'Conversions currently running.', function=lambda: scheduler.active)
+metrics.gauge('cbz_worker_slots', 'Maximum conversions run at once.', function=lambda: scheduler.max_workers)
+metrics.gauge('process_resident_memory_bytes', 'Resident memory of the server process.',
+              function=metrics.process_memory_bytes)
+
+def conversion_mode(compress, max_size_mb):
+    if max_size_mb:
+        return 'max_size'
+    return 'compress' if compress else 'lossless'
+
+# Content hashes of finished PDFs, keyed by (path, size, mtime) so a rewritten
+# file never serves a stale ETag
+etag_cache = {}
+etag_lock = threading.Lock()
+
+def file_etag(path):
+    """Returns the SHA-256 of a file's content, hashing it at most once per version."""
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with etag_lock:
+        etag = etag_cache.get(key)
+    ETAG_CACHE.inc(result='miss' if etag is None else 'hit')
+    if etag is None:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        etag = digest.hexdigest()
+        with etag_lock:
+            etag_cache[key] = etag
+    return etag
+
+# Conversions by (upload content hash, options). Identical uploads attach to the
+# in-flight task or reuse the finished PDF instead of converting again.
+jobs_by_key = {}
+jobs_lock = threading.Lock()
+
+def save_upload(stream, path):
+    """Streams an upload to disk, returning the SHA-256 of its content."""
+    digest = hashlib.sha256()
+    with open(path, 'wb') as out:
+        for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+def thumbnail_url(input_path):
+    """Makes the cover thumbnail of an upload while it is on disk. Returns its URL, or None."""
+    try:
+        key, data = thumbnails.get_service().get(input_path)
+    except Exception:
+        # Not a readable zip (e.g. CBR); the conversion reports the real error
+        return None
+    return f"/thumbnail/{key}" if data else None
+
+def deliver_to_kindle(task_id, output_path):
+    """Queues a finished PDF (or its parts) in the outbox for Kindle delivery. Returns the status message."""
+    config = load_email_config()
+    if config is None:
+        return 'Conversion done, but Email settings missing.'
+
+    limit = email_sender.attachment_limit(config['smtp_server'])
+    output_dir = os.path.dirname(output_path)
+    parts = [os.path.join(output_dir, name) for name in tasks[task_id].get('parts', [])] or [output_path]
+    if len(parts) == 1 and email_sender.encoded_size(os.path.getsize(output_path)) > limit - email_sender.MESSAGE_OVERHEAD:
+        return f'Error: File too large to email (limit {limit // (1024 * 1024)}MB). Cannot send to Kindle.'
+
+    # Sending happens on the outbox's own threads, so this conversion slot is
+    # free as soon as the PDF is written
+    box = outbox.get_outbox(load_email_config)
+    tasks[task_id]['delivery_ids'] = [
+        # Original filenames (remove UUID prefix)
+        box.enqueue(path, config['kindle_email'], os.path.basename(path).split('_', 1)[1])
+        for path in parts
+    ]
+    return 'Conversion complete! Sending to Kindle in the background...'
+
+def delivery_status(delivery_ids):
+    """Summarises the outbox items of one task for /status."""
+    box = outbox.get_outbox(load_email_config)
+    items = [box.get(item_id) for item_id in delivery_ids]
+    items = [item for item in items if item]
+    statuses = {item['status'] for item in items}
+    if statuses == {'sent'}:
+        status = 'sent'
+    elif 'failed' in statuses:
+        status = 'failed'
+    else:
+        status = 'sending'
+    return {
+        'status': status,
+        'items': [{'name': item['attachment_name'], 'status': item['status'],
+                   'attempts': item['attempts'], 'last_error': item['last_error']} for item in items],
+    }
+
+def complete_task(task_id, output_path, message):
+    # Hash once here so the first download can already answer conditionally
+    tasks[task_id]['etag'] = file_etag(output_path)
+    tasks[task_id]['message'] = message
+    tasks[task_id]['status'] = 'completed'
+    tasks[task_id]['progress'] = 100
+    tasks[task_id]['download_url'] = f"/download/{os.path.basename(output_path)}"
+
+def conversion_worker(task_id, input_path, output_path, compress, max_size_mb, preset=cbz_to_pdf.DEFAULT_PRESET,
+                      jpeg2000=False, auto_crop=False, split_max_bytes=None):
     """Background worker for conversion."""
+    mode = conversion_mode(compress, max_size_mb)
     try:
         def progress_callback(percentage, message):
             tasks[task_id]['progress'] = percentage
             tasks[task_id]['message'] = message
 
+        stats = {}
+        started = time.monotonic()
         success = cbz_to_pdf.convert_cbz_to_pdf(
             input_path, 
             output_path, 
             progress_callback=progress_callback,
             compress=compress,
-            max_size_mb=max_size_mb
+            max_size_mb=max_size_mb,
+            stats=stats,
+            split_max_bytes=split_max_bytes,
+            cancel_token=cancel_tokens.get(task_id),
+            preset=preset,
+            jpeg2000=jpeg2000,
+            auto_crop=auto_crop,
+            # Served over /download (with Range support) and emailed to tablets
+            linearize=True,
+            compact=True,
+            # Same upload and options, same bytes (and so the same ETag)
+            deterministic=True
         )
 
         if success:
+            CONVERSIONS.inc(mode=mode, result='success')
+            CONVERSION_SECONDS.observe(time.monotonic() - started, mode=mode)
+            PAGES.inc(stats.get('pages', 0))
+            BYTES_IN.inc(stats.get('input_bytes', 0))
+            BYTES_OUT.inc(stats.get('output_bytes', 0))
+            # File names only: the task dict is what /status returns
+            tasks[task_id]['parts'] = [os.path.basename(path) for path in stats.get('parts', [])]
+
+            # Read from the task, not an argument: duplicate uploads that attach
+            # while we convert may ask for Kindle delivery too
+            with jobs_lock:
+                tasks[task_id]['converted'] = True
+                send_to_kindle = tasks[task_id].get('send_to_kindle')
             if send_to_kindle:
-                tasks[task_id]['message'] = 'Sending to Kindle...'
-                tasks[task_id]['progress'] = 99
-                
-                # Read settings
-                settings = QSettings("Antigravity", "CBZtoPDF")
-                sender = settings.value("sender_email", "")
-                password = settings.value("sender_password", "")
-                kindle_email = settings.value("kindle_email", "")
-                smtp_server = settings.value("smtp_server", "smtp.gmail.com")
-                smtp_port = settings.value("smtp_port", "587")
-
-                if not sender or not password or not kindle_email:
-                     tasks[task_id]['message'] = 'Conversion done, but Email settings missing.'
-                else:
-                    file_size = os.path.getsize(output_path)
-                    if file_size > 25 * 1024 * 1024 and "gmail" in smtp_server.lower():
-                        tasks[task_id]['message'] = 'Error: File > 25MB. Gmail limit is 25MB. Cannot send to Kindle.'
-                    else:
-                        # Extract original filename (remove UUID prefix)
-                        original_filename = os.path.basename(output_path).split('_', 1)[1]
-                        
-                        email_success, email_msg = email_sender.send_email(
-                            output_path, sender, password, kindle_email, smtp_server, int(smtp_port),
-                            attachment_name=original_filename
-                        )
-                        
-                        if email_success:
-                            tasks[task_id]['message'] = 'Conversion complete & Sent to Kindle!'
-                        else:
-                            tasks[task_id]['message'] = f'Conversion done, Email failed: {email_msg}'
+                message = deliver_to_kindle(task_id, output_path)
             else:
-                tasks[task_id]['message'] = 'Conversion complete!'
-            
-            tasks[task_id]['status'] = 'completed'
-            tasks[task_id]['progress'] = 100
-            tasks[task_id]['download_url'] = f"/download/{os.path.basename(output_path)}"
+                message = 'Conversion complete!'
+            complete_task(task_id, output_path, message)
         else:
+            CONVERSIONS.inc(mode=mode, result='failed')
             tasks[task_id]['status'] = 'failed'
             tasks[task_id]['message'] = 'Conversion failed.'
 
+    except ConversionCancelled:
+        CONVERSIONS.inc(mode=mode, result='cancelled')
+        tasks[task_id]['status'] = 'cancelled'
+        tasks[task_id]['message'] = 'Conversion cancelled.'
     except Exception as e:
+        CONVERSIONS.inc(mode=mode, result='failed')
         tasks[task_id]['status'] = 'failed'
         tasks[task_id]['message'] = str(e)
     finally:
+        with jobs_lock:
+            cancel_tokens.pop(task_id, None)
+            attachments.pop(task_id, None)
         # Cleanup input file
         if os.path.exists(input_path):
             try:
@@ -96,6 +233,118 @@ def conversion_worker(task_id, input_path, output_path, compress, max_size_mb, s
 def index():
     return render_template('index.html')
 
+def is_comic(filename):
+    return filename.lower().endswith(('.cbz', '.cbr'))
+
+def parse_options(form):
+    """Reads the conversion options shared by /upload and /upload_batch."""
+    compress = form.get('compress') == 'true'
+
+    kindle_val = form.get('kindle')
+    send_to_kindle = bool(kindle_val and kindle_val.lower() in ['true', 'on', '1'])
+
+    max_size_mb = form.get('max_size_mb')
+    if max_size_mb:
+        try:
+            max_size_mb = int(max_size_mb)
+        except ValueError:
+            max_size_mb = None
+    else:
+        max_size_mb = None
+
+    preset = form.get('preset', cbz_to_pdf.DEFAULT_PRESET)
+    if preset not in cbz_to_pdf.ENCODER_PRESETS:
+        preset = cbz_to_pdf.DEFAULT_PRESET
+
+    # Only used to meet a size limit
+    jpeg2000 = bool(max_size_mb) and form.get('jpeg2000') == 'true'
+
+    auto_crop = form.get('auto_crop') == 'true'
+
+    return compress, max_size_mb, send_to_kindle, preset, jpeg2000, auto_crop
+
+def start_job(stream, original_filename, compress, max_size_mb, send_to_kindle, preset=cbz_to_pdf.DEFAULT_PRESET,
+              jpeg2000=False, auto_crop=False):
+    """Saves one archive and queues its conversion. Returns (task_id, deduplicated)."""
+    task_id = str(uuid.uuid4())
+    filename = f"{task_id}_{original_filename}"
+    input_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    content_hash = save_upload(stream, input_path)
+
+    output_filename = os.path.splitext(original_filename)[0] + ".pdf"
+    output_path = os.path.join(app.config['OUTPUT_FOLDER'], f"{task_id}_{output_filename}")
+
+    # Reads one page of the zip, so the preview is there before converting starts
+    thumbnail = thumbnail_url(input_path)
+
+    # Books too big for one email are also written as parts in the same pass.
+    # Only a conversion made with the same limit has those parts to reuse.
+    split_max_bytes = None
+    if send_to_kindle:
+        config = load_email_config()
+        if config:
+            split_max_bytes = email_sender.attachment_limit(config['smtp_server'])
+
+    job_key = (content_hash, compress, max_size_mb, preset, jpeg2000, auto_crop, split_max_bytes)
+    with jobs_lock:
+        existing_id = jobs_by_key.get(job_key)
+        existing = tasks.get(existing_id)
+
+        # Once the PDF is written the task has decided whether to email it,
+        # so a late Kindle request cannot ride along any more
+        late_kindle = send_to_kindle and existing and existing.get('converted') and not existing.get('send_to_kindle')
+        if existing and existing['status'] == 'processing' and not late_kindle:
+            # Same book, same options, already converting: share that task
+            if send_to_kindle:
+                existing['send_to_kindle'] = True
+            attachments[existing_id] += 1
+            os.remove(input_path)
+            UPLOAD_CACHE.inc(result='hit')
+            return existing_id, True
+
+        existing_output = None
+        if existing and existing['status'] == 'completed':
+            existing_output = os.path.join(app.config['OUTPUT_FOLDER'],
+                                           os.path.basename(existing['download_url']))
+            if not os.path.exists(existing_output):
+                existing_output = None
+
+        if existing_output:
+            os.remove(input_path)
+            tasks[task_id] = {
+                'status': 'completed',
+                'progress': 100,
+                'message': 'Conversion complete!',
+                'filename': output_filename,
+                'send_to_kindle': send_to_kindle,
+                'download_url': existing['download_url'],
+                'etag': existing['etag'],
+                'parts': existing.get('parts', []),
+                'thumbnail_url': existing.get('thumbnail_url') or thumbnail,
+            }
+            if send_to_kindle:
+                tasks[task_id]['message'] = deliver_to_kindle(task_id, existing_output)
+            UPLOAD_CACHE.inc(result='hit')
+            return task_id, True
+
+        tasks[task_id] = {
+            'status': 'processing',
+            'progress': 0,
+            'message': 'Queued...',
+            'filename': output_filename,
+            'send_to_kindle': send_to_kindle,
+            'thumbnail_url': thumbnail,
+        }
+        jobs_by_key[job_key] = task_id
+        cancel_tokens[task_id] = CancelToken()
+        attachments[task_id] = 1
+
+    UPLOAD_CACHE.inc(result='miss')
+    # Each remote address gets its own turn, so one user's batch can't starve another's upload
+    scheduler.submit(conversion_worker, task_id, input_path, output_path, compress, max_size_mb, preset, jpeg2000,
+                     auto_crop, split_max_bytes, client=f"web {request.remote_addr}", cancel_token=cancel_tokens[task_id])
+    return task_id, False
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     if 'file' not in request.files:
@@ -105,53 +354,214 @@ def upload_file():
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
     
-    if file and (file.filename.lower().endswith('.cbz') or file.filename.lower().endswith('.cbr')):
-        task_id = str(uuid.uuid4())
-        filename = f"{task_id}_{file.filename}"
-        input_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(input_path)
-        
-        # Options
-        compress = request.form.get('compress') == 'true'
-        
-        kindle_val = request.form.get('kindle')
-        send_to_kindle = kindle_val and kindle_val.lower() in ['true', 'on', '1']
-        
-        max_size_mb = request.form.get('max_size_mb')
-        if max_size_mb:
+    if file and is_comic(file.filename):
+        task_id, deduplicated = start_job(file.stream, file.filename, *parse_options(request.form))
+        if deduplicated:
+            return jsonify({'task_id': task_id, 'deduplicated': True})
+        return jsonify({'task_id': task_id})
+    
+    return jsonify({'error': 'Invalid file type'}), 400
+
+@app.route('/upload_batch', methods=['POST'])
+def upload_batch():
+    """Accepts many archives (or ZIPs of archives) as 'files' and starts one job per archive."""
+    options = parse_options(request.form)
+    task_ids = []
+
+    # Every ZIP is opened before any job starts, so a bad one rejects the
+    # request without leaving the files before it converting
+    files = request.files.getlist('files')
+    bundles = {}
+    for index, file in enumerate(files):
+        if not is_comic(file.filename) and file.filename.lower().endswith('.zip'):
             try:
-                max_size_mb = int(max_size_mb)
-            except ValueError:
-                max_size_mb = None
-        else:
-            max_size_mb = None
+                bundles[index] = zipfile.ZipFile(file.stream)
+            except zipfile.BadZipFile:
+                for bundle in bundles.values():
+                    bundle.close()
+                return jsonify({'error': f'Invalid ZIP file: {file.filename}'}), 400
 
-        output_filename = os.path.splitext(file.filename)[0] + ".pdf"
-        output_path = os.path.join(app.config['OUTPUT_FOLDER'], f"{task_id}_{output_filename}")
+    for index, file in enumerate(files):
+        if is_comic(file.filename):
+            task_ids.append(start_job(file.stream, file.filename, *options)[0])
+        elif index in bundles:
+            with bundles[index] as bundle:
+                for member in bundle.infolist():
+                    name = os.path.basename(member.filename)
+                    if not member.is_dir() and is_comic(name):
+                        with bundle.open(member) as source:
+                            task_ids.append(start_job(source, name, *options)[0])
 
-        tasks[task_id] = {
-            'status': 'processing',
-            'progress': 0,
-            'message': 'Starting...',
-            'filename': output_filename,
-        }
-        thread = threading.Thread(target=conversion_worker, args=(task_id, input_path, output_path, compress, max_size_mb, send_to_kindle))
-        thread.start()
+    if not task_ids:
+        return jsonify({'error': 'No CBZ or CBR files found'}), 400
 
-        return jsonify({'task_id': task_id})
-    
-    return jsonify({'error': 'Invalid file type'}), 400
+    batch_id = str(uuid.uuid4())
+    batches[batch_id] = task_ids
+    return jsonify({'batch_id': batch_id, 'task_ids': task_ids})
 
 @app.route('/status/<task_id>')
 def get_status(task_id):
     task = tasks.get(task_id)
     if task:
+        if task.get('delivery_ids'):
+            task = dict(task, delivery=delivery_status(task['delivery_ids']))
         return jsonify(task)
     return jsonify({'error': 'Task not found'}), 404
 
+@app.route('/batch_status/<batch_id>')
+def get_batch_status(batch_id):
+    task_ids = batches.get(batch_id)
+    if task_ids is None:
+        return jsonify({'error': 'Batch not found'}), 404
+
+    items = [dict(tasks[task_id], task_id=task_id) for task_id in task_ids]
+    counts = {status: sum(1 for item in items if item['status'] == status)
+              for status in ('processing', 'completed', 'failed', 'cancelled')}
+    if counts['processing']:
+        status = 'processing'
+    elif counts['completed']:
+        status = 'completed'
+    else:
+        # Nothing to download: say why
+        status = 'failed' if counts['failed'] else 'cancelled'
+    return jsonify({
+        'status': status,
+        'progress': sum(item['progress'] for item in items) // len(items),
+        'counts': counts,
+        'tasks': items,
+        'download_url': f"/batch_download/{batch_id}" if counts['completed'] else None,
+    })
+
+def cancel_task(task_id):
+    """
+    Withdraws one upload from a running conversion. The conversion only stops
+    once no other upload of the same book is attached to it. Returns
+    'cancelling' or 'detached', or None if it has already finished.
+    """
+    with jobs_lock:
+        token = cancel_tokens.get(task_id)
+        if token is None or tasks[task_id]['status'] != 'processing':
+            return None
+        attachments[task_id] -= 1
+        if attachments[task_id] > 0:
+            return 'detached'
+        token.cancel()
+        tasks[task_id]['message'] = 'Cancelling...'
+        return 'cancelling'
+
+@app.route('/cancel/<task_id>', methods=['POST'])
+def cancel(task_id):
+    """
+    Cancels a queued or running conversion. While other uploads of the same
+    book are attached to the task it keeps running for them and this reports
+    'detached'. Otherwise the engine stops at its next page and removes
+    partial output; /status then reports 'cancelled'.
+    """
+    task = tasks.get(task_id)
+    if task is None:
+        return jsonify({'error': 'Task not found'}), 404
+    outcome = cancel_task(task_id)
+    if outcome is None:
+        return jsonify({'error': 'Task is not running', 'status': task['status']}), 409
+    return jsonify({'status': outcome}), 202
+
+@app.route('/cancel_batch/<batch_id>', methods=['POST'])
+def cancel_batch(batch_id):
+    """Cancels every conversion of a batch that has not finished yet."""
+    task_ids = batches.get(batch_id)
+    if task_ids is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    cancelled = [task_id for task_id in task_ids if cancel_task(task_id)]
+    return jsonify({'status': 'cancelling', 'cancelled': cancelled}), 202
+
+class StreamBuffer:
+    """Write-only sink for ZipFile; the response generator drains it as it fills."""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+@app.route('/batch_download/<batch_id>')
+def download_batch(batch_id):
+    """Streams every finished PDF of a batch as one ZIP, without building it on disk."""
+    task_ids = batches.get(batch_id)
+    if task_ids is None:
+        abort(404)
+
+    entries = []
+    names = set()
+    for task_id in task_ids:
+        task = tasks[task_id]
+        if task['status'] != 'completed':
+            continue
+        name = task['filename']
+        stem, ext = os.path.splitext(name)
+        counter = 1
+        while name in names:
+            counter += 1
+            name = f"{stem} ({counter}){ext}"
+        names.add(name)
+        entries.append((name, os.path.join(app.config['OUTPUT_FOLDER'], os.path.basename(task['download_url']))))
+
+    if not entries:
+        abort(404)
+
+    def generate():
+        buffer = StreamBuffer()
+        # PDFs are already compressed; storing them keeps this a plain copy
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as bundle:
+            for name, path in entries:
+                with open(path, 'rb') as source, bundle.open(name, 'w', force_zip64=True) as dest:
+                    for chunk in iter(lambda: source.read(1024 * 1024), b''):
+                        dest.write(chunk)
+                        yield from buffer.drain()
+        yield from buffer.drain()
+
+    return Response(stream_with_context(generate()), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="batch-{batch_id[:8]}.zip"'})
+
+@app.route('/thumbnail/<key>')
+def get_thumbnail(key):
+    # Keys are content hashes, so a URL always names the same image
+    if len(key) != 64 or any(c not in '0123456789abcdef' for c in key):
+        abort(404)
+    data = thumbnails.get_service().cached(key)
+    if data is None:
+        abort(404)
+    return Response(data, mimetype='image/jpeg',
+                    headers={'Cache-Control': 'public, max-age=31536000, immutable'})
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/download/<filename>')
 def download_file(filename):
-    return send_from_directory(app.config['OUTPUT_FOLDER'], filename, as_attachment=True, download_name=filename.split('_', 1)[1])
+    path = safe_join(app.config['OUTPUT_FOLDER'], filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    # conditional=True answers Range / If-Range / If-None-Match from the strong
+    # content ETag, so resumed and repeat downloads only send what is missing.
+    # The file itself goes out through wsgi.file_wrapper (sendfile on servers
+    # that offer it) or X-Sendfile when USE_X_SENDFILE is enabled.
+    return send_file(path, as_attachment=True, download_name=filename.split('_', 1)[1],
+                     etag=file_etag(path), conditional=True)
 
 if __name__ == '__main__':
     # Run on 0.0.0.0 to be accessible from other devices
@@ -1,17 +1,27 @@
 import os
 from pathlib import Path
 from typing import Optional, Dict
-from PySide6.QtCore import QThread, Signal
+from PySide6.QtCore import QObject, Signal
 import cbz_to_pdf
 import email_sender
+import outbox
+from cancellation import CancelToken
+from utils import load_email_config
 
-class ConversionThread(QThread):
+class ConversionJob(QObject):
+    """
+    One queue item's conversion. run() is handed to a JobScheduler, so it
+    executes on a pool thread; the signals are delivered to the GUI thread.
+    cancel() may be called from any thread and stops the engine at its next page.
+    """
     progress_signal = Signal(int, str)
     finished_signal = Signal(bool, str)
 
     def __init__(self, input_path: str, compress: bool = False, max_size_mb: Optional[int] = None, 
                  output_dir: Optional[str] = None, send_to_kindle: bool = False, email_config: Optional[Dict] = None,
-                 output_name: Optional[str] = None):
+                 output_name: Optional[str] = None, preset: str = cbz_to_pdf.DEFAULT_PRESET,
+                 jpeg2000: bool = False, auto_crop: bool = False, linearize: bool = False,
+                 compact: bool = False):
         super().__init__()
         self.input_path = Path(input_path)
         self.compress = compress
@@ -20,6 +30,15 @@ class ConversionThread(QThread):
         self.send_to_kindle = send_to_kindle
         self.email_config = email_config
         self.output_name = output_name
+        self.preset = preset
+        self.jpeg2000 = jpeg2000
+        self.auto_crop = auto_crop
+        self.linearize = linearize
+        self.compact = compact
+        self.cancel_token = CancelToken()
+
+    def cancel(self):
+        self.cancel_token.cancel()
 
     def run(self):
         try:
@@ -33,24 +52,29 @@ class ConversionThread(QThread):
             def callback(percentage, message):
                 self.progress_signal.emit(percentage, message)
 
+            # Books too big for one email are also written as parts in the same pass
+            split_max_bytes = None
+            if self.send_to_kindle and self.email_config:
+                split_max_bytes = email_sender.attachment_limit(self.email_config['smtp_server'])
+
             # Convert Path objects to strings for the underlying library if needed, 
             # but let's try to pass strings to ensure compatibility with existing cbz_to_pdf
+            stats = {}
             cbz_to_pdf.convert_cbz_to_pdf(str(self.input_path), str(output_path), progress_callback=callback, 
-                                        compress=self.compress, max_size_mb=self.max_size_mb)
+                                        compress=self.compress, max_size_mb=self.max_size_mb,
+                                        stats=stats, split_max_bytes=split_max_bytes,
+                                        cancel_token=self.cancel_token, preset=self.preset,
+                                        jpeg2000=self.jpeg2000, auto_crop=self.auto_crop,
+                                        linearize=self.linearize, compact=self.compact)
             
             if self.send_to_kindle and self.email_config:
-                self.progress_signal.emit(99, "Sending to Kindle...")
-                success, msg = email_sender.send_email(
-                    str(output_path),
-                    self.email_config['sender'],
-                    self.email_config['password'],
-                    self.email_config['kindle_email'],
-                    self.email_config['smtp_server'],
-                    int(self.email_config['smtp_port'])
-                )
-                if not success:
-                    raise Exception(f"Conversion successful, but email failed: {msg}")
-                self.progress_signal.emit(100, "Sent to Kindle")
+                # Hand the PDF to the outbox and finish; it sends (and retries)
+                # in the background while the next item converts
+                box = outbox.get_outbox(load_email_config)
+                parts = stats.get('parts') or [str(output_path)]
+                for part in parts:
+                    box.enqueue(part, self.email_config['kindle_email'])
+                self.progress_signal.emit(100, "Queued for Kindle" if len(parts) == 1 else f"Queued for Kindle in {len(parts)} parts")
 
             self.finished_signal.emit(True, f"Successfully created {output_path.name}")
         except Exception as e: